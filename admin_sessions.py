@@ -0,0 +1,154 @@
+"""Admin identities for Flask-Login without a query per request.
+
+``IdentityCache`` keeps a small snapshot of each logged-in admin (id, name,
+email) for ``ttl`` seconds, so ``@login_required`` pages stop looking the
+admin up by primary key on every request. The app invalidates an entry when
+the admin row is updated or deleted in this process; other processes see
+the change once their entry expires, which is why the TTL is short.
+
+``WriteCoalescer`` holds writes nobody reads back straight away (an admin's
+``last_login``) and applies the latest value per key in one batch every
+``interval`` seconds instead of committing on the request thread.
+"""
+import atexit
+import threading
+import time
+
+from flask_login import UserMixin
+
+
+class AdminIdentity(UserMixin):
+    """What a request needs to know about the logged-in admin - detached
+    from any session, so it can be shared between requests"""
+
+    __slots__ = ('id', 'admin_username', 'admin_email')
+
+    def __init__(self, id, admin_username, admin_email):
+        self.id = id
+        self.admin_username = admin_username
+        self.admin_email = admin_email
+
+    @classmethod
+    def of(cls, admin):
+        return cls(admin.id, admin.admin_username, admin.admin_email)
+
+    def __repr__(self):
+        return f'<AdminIdentity {self.admin_username}>'
+
+
+class IdentityCache:
+    """``get(admin_id)`` returns the cached identity while it is younger than
+    ``ttl``, otherwise calls ``load(admin_id)`` (an identity or None).
+
+    A load that overlaps an ``invalidate()`` of the same admin is returned
+    but not stored, so an identity read just before a change cannot outlive it.
+    Missing admins are not cached.
+    """
+
+    def __init__(self, load, ttl=30, clock=time.monotonic):
+        self.load = load
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._generation = 0
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, admin_id):
+        with self._lock:
+            entry = self._entries.get(admin_id)
+            if entry is not None and self.clock() - entry[1] <= self.ttl:
+                self.stats['hits'] += 1
+                return entry[0]
+            self.stats['misses'] += 1
+            generation = self._generation
+
+        identity = self.load(admin_id)
+        if identity is not None:
+            with self._lock:
+                if generation == self._generation:
+                    self._entries[admin_id] = (identity, self.clock())
+        return identity
+
+    def put(self, identity):
+        with self._lock:
+            self._entries[identity.id] = (identity, self.clock())
+
+    def invalidate(self, *admin_ids):
+        with self._lock:
+            self._generation += 1
+            for admin_id in admin_ids:
+                self._entries.pop(admin_id, None)
+            self.stats['invalidations'] += len(admin_ids)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class WriteCoalescer:
+    """Collects ``record(key, value)`` calls and hands the latest value per
+    key to ``flush(pending)`` from a background thread, at most every
+    ``interval`` seconds (sooner once ``max_pending`` keys are waiting).
+    Pending writes are flushed at exit; a failed flush puts them back for
+    the next round unless newer values arrived meanwhile."""
+
+    def __init__(self, flush, interval=10.0, max_pending=1000):
+        self.flush = flush
+        self.interval = interval
+        self.max_pending = max_pending
+        self.flushes = 0
+        self.failures = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flushing = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def record(self, key, value):
+        with self._lock:
+            self._pending[key] = value
+            full = len(self._pending) >= self.max_pending
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='write-coalescer', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush_now)
+        if full:
+            self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush_now()
+            except Exception:
+                # Counted in failures and retried next round; flush() logs its own errors
+                pass
+
+    def flush_now(self):
+        """Apply everything pending; returns the number of keys written"""
+        # One flush at a time, so an older batch never lands after a newer one
+        with self._flushing:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                self.flush(batch)
+            except Exception:
+                with self._lock:
+                    self.failures += 1
+                    for key, value in batch.items():
+                        self._pending.setdefault(key, value)
+                raise
+            self.flushes += 1
+            return len(batch)
@@ -0,0 +1,161 @@
+"""Registration counts per day, country, education level and age band.
+
+The counts live in a small ``(dimension, bucket, total)`` table that is
+adjusted in the same transaction as every insert and delete of a user, so
+the analytics panel reads a few hundred rows however many users there are.
+``flask rebuild-analytics`` recomputes the table from the users table with
+one GROUP BY per dimension and checks the two agree.
+
+The trade-off: every registration updates the same 'day' row, so on
+PostgreSQL and MySQL concurrent registrations wait for each other's commit
+on that row lock. That keeps the counts exact and is cheap next to a
+registration's password hashing. Group commit turns it into one update
+per batch. Multi-row updates always lock their buckets in sorted order, so
+two of them cannot deadlock.
+"""
+from collections import Counter
+
+from sqlalchemy import String, bindparam, case, cast, delete, func, insert, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+# (lowest, highest) age per band; None means no upper bound
+AGE_BANDS = [(13, 17), (18, 24), (25, 34), (35, 44), (45, 54), (55, 64), (65, None)]
+
+# User columns the buckets are computed from
+COLUMNS = ('created_at', 'country', 'education', 'age')
+
+
+def band_label(low, high):
+    return f'{low}+' if high is None else f'{low}-{high}'
+
+
+def age_band(age):
+    for low, high in AGE_BANDS:
+        if high is None or age <= high:
+            return band_label(low, high)
+
+
+# dimension -> bucket of one user (a mapping holding COLUMNS)
+DIMENSIONS = {
+    'day': lambda user: user['created_at'].strftime('%Y-%m-%d'),
+    'country': lambda user: user['country'],
+    'education': lambda user: user['education'],
+    'age': lambda user: age_band(user['age']),
+}
+
+_UPSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+class RegistrationStats:
+    def __init__(self, stats_table, users_table):
+        self.stats = stats_table
+        self.users = users_table
+
+    # ---------- incremental updates ----------
+
+    def changes(self, users, sign=1):
+        """Parameter sets for upsert(): one per bucket the users touch, in
+        (dimension, bucket) order so concurrent batches lock rows in the same order"""
+        counts = Counter((dimension, bucket_of(user)) for user in users
+                         for dimension, bucket_of in DIMENSIONS.items())
+        return [{'dimension': dimension, 'bucket': bucket, 'delta': count * sign}
+                for (dimension, bucket), count in sorted(counts.items(),
+                                                         key=lambda item: (item[0][0], str(item[0][1])))]
+
+    def apply(self, execute, dialect_name, changes):
+        """Run changes() with ``execute`` (a session's or connection's). Databases
+        without an upsert get an UPDATE per bucket and an INSERT for new ones;
+        two first registrations in a new bucket can then collide on the
+        primary key, which fails that registration rather than miscounting."""
+        if not changes:
+            return
+        if dialect_name == 'mysql' or dialect_name in _UPSERTS:
+            execute(self.upsert(dialect_name), changes)
+            return
+        stats = self.stats
+        for change in changes:
+            result = execute(update(stats)
+                             .where(stats.c.dimension == change['dimension'], stats.c.bucket == change['bucket'])
+                             .values(total=stats.c.total + change['delta']))
+            if result.rowcount == 0:
+                execute(insert(stats).values(dimension=change['dimension'], bucket=change['bucket'],
+                                             total=change['delta']))
+
+    def upsert(self, dialect_name):
+        """``total += delta`` per bucket, creating missing buckets - run it
+        with changes() as executemany parameters"""
+        values = dict(dimension=bindparam('dimension'), bucket=bindparam('bucket'), total=bindparam('delta'))
+        if dialect_name == 'mysql':
+            statement = mysql.insert(self.stats).values(**values)
+            return statement.on_duplicate_key_update(total=self.stats.c.total + statement.inserted.total)
+        if dialect_name not in _UPSERTS:
+            raise NotImplementedError(f'No upsert for {dialect_name}')
+        statement = _UPSERTS[dialect_name](self.stats).values(**values)
+        return statement.on_conflict_do_update(
+            index_elements=[self.stats.c.dimension, self.stats.c.bucket],
+            set_={'total': self.stats.c.total + statement.excluded.total}
+        )
+
+    # ---------- reads ----------
+
+    def read(self, connection, since_day=None):
+        """{dimension: [(bucket, total), ...]} - days oldest first, age bands
+        in age order, everything else largest first"""
+        query = select(self.stats.c.dimension, self.stats.c.bucket, self.stats.c.total).where(self.stats.c.total > 0)
+        if since_day:
+            query = query.where((self.stats.c.dimension != 'day') | (self.stats.c.bucket >= since_day))
+        result = {dimension: [] for dimension in DIMENSIONS}
+        for dimension, bucket, total in connection.execute(query):
+            result.setdefault(dimension, []).append((bucket, total))
+
+        bands = [band_label(low, high) for low, high in AGE_BANDS]
+        result['day'].sort()
+        result['age'].sort(key=lambda item: bands.index(item[0]) if item[0] in bands else len(bands))
+        for dimension in ('country', 'education'):
+            result[dimension].sort(key=lambda item: (-item[1], item[0]))
+        return result
+
+    # ---------- rebuild / verify ----------
+
+    def _bucket_expressions(self):
+        users = self.users
+        bands = case(*[(users.c.age <= high, band_label(low, high)) for low, high in AGE_BANDS if high is not None],
+                     else_=band_label(*AGE_BANDS[-1]))
+        return {
+            'day': cast(func.date(users.c.created_at), String),
+            'country': users.c.country,
+            'education': users.c.education,
+            'age': bands,
+        }
+
+    def recompute(self, connection):
+        """{(dimension, bucket): total} straight from the users table"""
+        totals = {}
+        for dimension, expression in self._bucket_expressions().items():
+            query = select(expression, func.count()).select_from(self.users).group_by(expression)
+            for bucket, total in connection.execute(query):
+                totals[(dimension, bucket)] = total
+        return totals
+
+    def stored(self, connection):
+        query = select(self.stats.c.dimension, self.stats.c.bucket, self.stats.c.total).where(self.stats.c.total != 0)
+        return {(dimension, bucket): total for dimension, bucket, total in connection.execute(query)}
+
+    def rebuild(self, connection):
+        """Replace the stored counts with recomputed ones. Returns the buckets written."""
+        totals = self.recompute(connection)
+        connection.execute(delete(self.stats))
+        if totals:
+            connection.execute(insert(self.stats), [
+                {'dimension': dimension, 'bucket': bucket, 'total': total}
+                for (dimension, bucket), total in totals.items()
+            ])
+        return len(totals)
+
+    def verify(self, connection):
+        """Buckets whose stored total differs from the users table:
+        [(dimension, bucket, stored, actual), ...]"""
+        stored, actual = self.stored(connection), self.recompute(connection)
+        return sorted((dimension, bucket, stored.get((dimension, bucket), 0), actual.get((dimension, bucket), 0))
+                      for dimension, bucket in stored.keys() | actual.keys()
+                      if stored.get((dimension, bucket), 0) != actual.get((dimension, bucket), 0))
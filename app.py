@@ -1,22 +1,71 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, send_file
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, send_file, Response, stream_with_context, Request, g, abort
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash
 from werkzeug.utils import secure_filename
-from datetime import datetime
-import requests as http_requests
+from markupsafe import Markup
+from sqlalchemy import bindparam, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, deferred, load_only, object_session
+from concurrent.futures import TimeoutError as FutureTimeout
+from datetime import datetime, timedelta
+from functools import lru_cache
 import os
-import csv
-import io
+import time
 import base64
-import re
+import secrets
+import json
+import click
+import assets
+import db_config
+from photo_store import PhotoStore, PhotoError, is_blob_ref, parse_ref
+from validators import validate_field, calculate_age
+from availability import AvailabilityIndex
+from user_search import search_backend
+from pagination import CachedCount, InvalidCursor, KeysetPaginator, offset_page
+from exports import FORMATS, ExportJobs, format_rows, iter_csv, iter_gzip, pa
+from hashing import DEFAULT_METHOD, PasswordHasher, PoolSaturated
+from bulk_import import BulkImporter, ImportFormatError, detect_format, read_records
+from admin_sessions import AdminIdentity, IdentityCache, WriteCoalescer
+from group_commit import GroupCommitQueue, QueueFull
+from page_cache import FileBackend, MemoryBackend, PageCache
+from analytics import COLUMNS as STAT_COLUMNS, RegistrationStats
+import request_log
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, QUERY_COUNT_BUCKETS, QueryTracker, Registry, SlowRequestProfiler
+from locations import LocationCache, LocationIndex, UpstreamClient, build_location_index, load_dataset
+
+class AppRequest(Request):
+    @property
+    def max_content_length(self):
+        # Bulk imports are the one upload allowed past MAX_CONTENT_LENGTH
+        if self.endpoint == 'import_users_page':
+            return IMPORT_MAX_BYTES
+        return super().max_content_length
 
 app = Flask(__name__)
+app.request_class = AppRequest
 
 # Configuration
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///registration.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Connection pool for server databases; SQLite is tuned with the PRAGMAs below instead
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = db_config.engine_options(
+    app.config['SQLALCHEMY_DATABASE_URI'],
+    pool_size=int(os.environ.get('DB_POOL_SIZE', 5)),
+    max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+    pool_timeout=int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    pool_recycle=int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    pool_pre_ping=os.environ.get('DB_POOL_PRE_PING', '1') != '0'
+)
+# WAL lets registrations commit while others read; busy_timeout makes writers queue for the lock
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+}
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB max
 
@@ -26,25 +75,202 @@ app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
 # Ensure upload folder exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Profile photos live on disk, keyed by content hash
+photo_store = PhotoStore(app.config['UPLOAD_FOLDER'])
+
 # Initialize extensions
 db = SQLAlchemy(app)
+with app.app_context():
+    db_config.install_sqlite_pragmas(db.engine, SQLITE_PRAGMAS)
 login_manager = LoginManager(app)
 login_manager.login_view = 'admin_login'
 
-# ==================== CACHE BUSTING ====================
+# ==================== LOGGING ====================
+
+# JSON lines on stdout, written by a background thread; LOG_FORMAT=text for a terminal
+request_log.configure(
+    level=os.environ.get('LOG_LEVEL', 'INFO'),
+    fmt=os.environ.get('LOG_FORMAT', 'json'),
+    sample_rate=float(os.environ.get('LOG_SAMPLE_RATE', 1.0)),
+    queue_size=int(os.environ.get('LOG_QUEUE_SIZE', 10000)),
+    loggers=[app.logger.name]
+)
+logger = request_log.get_logger()
+
+@app.before_request
+def start_request_log():
+    g.request_started = time.perf_counter()
+    g.request_id = request_log.begin_request(request.headers.get('X-Request-ID', '')[:64] or None)
+
+@app.after_request
+def log_request(response):
+    """One summary record per request - the latency dashboard reads these"""
+    if 'request_started' in g:
+        request_log.log_request(
+            request.method,
+            request.url_rule.rule if request.url_rule else request.path,
+            response.status_code,
+            (time.perf_counter() - g.request_started) * 1000,
+            endpoint=request.endpoint
+        )
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+@app.teardown_request
+def end_request_log(exc):
+    request_log.end_request()
+
+# ==================== METRICS ====================
+
+# Prometheus text at /metrics; METRICS_TOKEN, if set, is required as a bearer token
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+metrics = Registry()
+request_duration = metrics.histogram('http_request_duration_seconds', 'Request latency by route',
+                                     ['method', 'route'])
+request_total = metrics.counter('http_requests_total', 'Requests by route and status', ['method', 'route', 'status'])
+request_queries = metrics.histogram('http_request_db_queries', 'SQL statements per request', ['route'],
+                                    buckets=QUERY_COUNT_BUCKETS)
+request_db_time = metrics.histogram('http_request_db_seconds', 'Time spent in SQL per request', ['route'])
+upstream_duration = metrics.histogram('upstream_request_duration_seconds', 'Location upstream latency', ['outcome'])
+
+# Every engine, including the async serving mode's
+query_tracker = QueryTracker(metrics)
+query_tracker.install(Engine)
+
+# Opt-in: PROFILE_SLOW_MS=500 keeps a cProfile dump of sampled requests slower than 500 ms
+slow_profiler = SlowRequestProfiler(
+    threshold_ms=float(os.environ.get('PROFILE_SLOW_MS', 0)),
+    directory=os.environ.get('PROFILE_DIR', os.path.join(app.instance_path, 'profiles')),
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0.1))
+)
+
+def without(stats, *keys):
+    return {key: value for key, value in stats.items() if key not in keys}
+
+# Counters the components keep themselves, read at scrape time
+metrics.collected('location_cache_events_total', 'Location cache lookups and maintenance by outcome',
+                  lambda: location_cache.stats, ['event'], kind='counter')
+metrics.collected('location_cache_entries', 'Location lists held in memory', lambda: len(location_cache))
+metrics.collected('upstream_events_total', 'Location upstream requests, failures and breaker activity',
+                  lambda: without(location_upstream.metrics, 'latency_seconds_total'), ['event'], kind='counter')
+metrics.collected('upstream_circuit_open', '1 while the upstream circuit breaker is not closed',
+                  lambda: int(location_upstream.state != location_upstream.CLOSED))
+metrics.collected('password_hash_events_total', 'Password hashes, verifications, 503 rejections and timeouts',
+                  lambda: password_hasher.stats, ['event'], kind='counter')
+metrics.collected('availability_index_events_total', 'Username/email availability index lookups by outcome',
+                  lambda: without(availability.stats, 'warmup_seconds'), ['event'], kind='counter')
+metrics.collected('log_records_dropped_total', 'Log records dropped because the log queue was full',
+                  request_log.dropped, kind='counter')
+metrics.collected('page_cache_events_total', 'Page and fragment cache hits, misses and invalidations',
+                  lambda: page_cache.counters(), ['event'], kind='counter')
+metrics.collected('page_cache_bytes', 'Bytes held by the page cache', lambda: page_cache.backend.size)
+metrics.collected('admin_identity_cache_events_total', 'Admin identity lookups served from cache or database',
+                  lambda: admin_identities.stats, ['event'], kind='counter')
+metrics.collected('last_login_writes_pending', 'last_login updates waiting for the next batch', lambda: last_logins.pending())
+metrics.collected('registration_group_commit', 'Group-commit writer: rows, batches, failed batches, rejected, largest batch',
+                  lambda: registration_queue.stats if registration_queue else {}, ['stat'])
+metrics.collected('slow_request_profiles_total', 'cProfile dumps written for slow requests',
+                  lambda: slow_profiler.dumps, kind='counter')
+
+def record_request(method, route, status, seconds):
+    """Observe a finished request; returns its (SQL statements, SQL seconds)"""
+    queries, query_seconds = query_tracker.finish()
+    request_duration.observe(seconds, method, route)
+    request_total.inc(method, route, str(status))
+    request_queries.observe(queries, route)
+    request_db_time.observe(query_seconds, route)
+    request_log.annotate(db_queries=queries, db_ms=round(query_seconds * 1000, 2))
+    return queries, query_seconds
+
+@app.before_request
+def start_request_metrics():
+    query_tracker.start()
+    g.profile = slow_profiler.start()
+
+@app.after_request
+def record_request_metrics(response):
+    if 'request_started' in g:
+        elapsed = time.perf_counter() - g.request_started
+        # Unmatched paths share one label so scanners can't blow up the series count
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        record_request(request.method, route, response.status_code, elapsed)
+        profile = g.pop('profile', None)
+        if profile is not None:
+            path = slow_profiler.finish(profile, elapsed * 1000, request.endpoint)
+            if path:
+                logger.warning('slow request profiled', extra={'profile': path})
+    return response
+
+@app.teardown_request
+def stop_request_profile(exc):
+    # after_request is skipped when a response can't be built
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.disable()
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    if METRICS_TOKEN and not secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {METRICS_TOKEN}'):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+# ==================== STATIC ASSETS ====================
+
+# Fingerprinted copies of static/ (see `flask build-assets`), served forever-cacheable
+ASSETS_DIR = os.environ.get('ASSETS_DIR', os.path.join(app.instance_path, 'assets'))
+ASSETS_BUILD_ON_START = os.environ.get('ASSETS_BUILD_ON_START', '1') == '1'
+
+asset_manifest = assets.AssetManifest.load(ASSETS_DIR)
+
+def build_assets(clean=False):
+    """Rebuild the fingerprinted assets and swap in the new manifest"""
+    global asset_manifest
+    # Photo uploads live under static/ but are served by /photos
+    uploads = [app.config['UPLOAD_FOLDER'], os.path.join(app.static_folder, 'uploads')]
+    entries = assets.build(app.static_folder, ASSETS_DIR, exclude=uploads, clean=clean)
+    asset_manifest = assets.AssetManifest(ASSETS_DIR, entries)
+    return entries
+
 @app.context_processor
 def override_url_for():
-    return dict(url_for=dated_url_for)
+    return dict(url_for=asset_url_for)
 
-def dated_url_for(endpoint, **values):
+def asset_url_for(endpoint, **values):
+    """url_for() that points static files at their fingerprinted copy - a
+    dict lookup, no filesystem access"""
     if endpoint == 'static':
-        filename = values.get('filename', None)
-        if filename:
-            file_path = os.path.join(app.root_path, endpoint, filename)
-            if os.path.exists(file_path):
-                values['q'] = int(os.stat(file_path).st_mtime)
+        path = asset_manifest.url_path(values.get('filename'))
+        if path:
+            values['filename'] = path
+            return url_for('asset', **values)
     return url_for(endpoint, **values)
 
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    """A fingerprinted static file, precompressed when the client accepts it"""
+    resolved = asset_manifest.resolve(filename, request.accept_encodings)
+    if resolved is None:
+        return jsonify({'error': 'Asset not found'}), 404
+    path, mimetype, encoding = resolved
+    response = send_file(path, mimetype=mimetype, conditional=True, max_age=31536000)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.template_filter('photo_url')
+def photo_url(ref, size='thumb'):
+    """Resolve a stored profile photo reference to a URL"""
+    parsed = parse_ref(ref)
+    if parsed:
+        return url_for('profile_photo', digest=parsed[0], ext=parsed[1], size=size)
+    # Rows not yet converted by `flask migrate-photos` still hold a data URL
+    return ref or ''
+
 # ==================== MODELS ====================
 
 class User(db.Model):
@@ -59,29 +285,63 @@ class User(db.Model):
     dob = db.Column(db.Date, nullable=False)
     age = db.Column(db.Integer, nullable=False)
     gender = db.Column(db.String(20), nullable=False)
-    address = db.Column(db.Text, nullable=False)
+    address = deferred(db.Column(db.Text, nullable=False), group='detail')
     postal_code = db.Column(db.String(6), nullable=False)
     country = db.Column(db.String(50), nullable=False)
     state = db.Column(db.String(50), nullable=False)
     city = db.Column(db.String(50), nullable=False)
     education = db.Column(db.String(50), nullable=False)
-    profile_photo = db.Column(db.Text)  # Base64 or file path
-    security_question = db.Column(db.String(100), nullable=False)
-    security_answer = db.Column(db.String(100), nullable=False)
-    password_hash = db.Column(db.String(255), nullable=False)
+    # blob:<sha256>.<ext> reference into photo_store (unmigrated rows may still hold base64)
+    profile_photo = deferred(db.Column(db.Text), group='photo')
+    security_question = deferred(db.Column(db.String(100), nullable=False), group='secret')
+    security_answer = deferred(db.Column(db.String(100), nullable=False), group='secret')
+    password_hash = deferred(db.Column(db.String(255), nullable=False), group='secret')
     
     # Guardian fields (nullable for adults)
-    guardian_name = db.Column(db.String(100))
-    guardian_email = db.Column(db.String(100))
-    guardian_phone = db.Column(db.String(10))
+    guardian_name = deferred(db.Column(db.String(100)), group='detail')
+    guardian_email = deferred(db.Column(db.String(100)), group='detail')
+    guardian_phone = deferred(db.Column(db.String(10)), group='detail')
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Serves the dashboard's newest-first keyset pagination
+    __table_args__ = (db.Index('ix_users_created_at_id', 'created_at', 'id'),)
+    
+    # Column projections per view - each route loads only what it renders
+    VIEWS = {
+        'key': ('id', 'username', 'profile_photo'),
+        'list': ('id', 'first_name', 'last_name', 'username', 'email', 'mobile',
+                 'age', 'city', 'state', 'profile_photo', 'created_at', 'updated_at'),
+        'detail': ('id', 'first_name', 'last_name', 'username', 'email', 'mobile',
+                   'dob', 'age', 'gender', 'address', 'postal_code', 'country',
+                   'state', 'city', 'education', 'profile_photo', 'security_question',
+                   'guardian_name', 'guardian_email', 'guardian_phone',
+                   'created_at', 'updated_at'),
+    }
+    
+    @classmethod
+    def query_view(cls, view):
+        """User query that loads only the columns of a named view"""
+        return cls.query.options(load_only(*[getattr(cls, name) for name in cls.VIEWS[view]]))
+    
+    @classmethod
+    def exists(cls, **filters):
+        """Cheap existence check - selects the primary key only"""
+        return db.session.query(cls.id).filter_by(**filters).first() is not None
+    
     def __repr__(self):
         return f'<User {self.username}>'
 
+class RegistrationStat(db.Model):
+    """Registration counts per (dimension, bucket), kept in step with users by analytics.py"""
+    __tablename__ = 'registration_stats'
+    
+    dimension = db.Column(db.String(20), primary_key=True)
+    bucket = db.Column(db.String(50), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
 class Admin(UserMixin, db.Model):
     __tablename__ = 'admins'
     
@@ -97,100 +357,596 @@ class Admin(UserMixin, db.Model):
 
 # ==================== LOGIN MANAGER ====================
 
+# Seconds a logged-in admin's identity is reused before it is read again.
+# Changes made in this process apply at once; other workers see them within the TTL.
+ADMIN_CACHE_TTL = int(os.environ.get('ADMIN_CACHE_TTL', 30))
+# last_login is written in batches this often instead of on the login request
+LAST_LOGIN_FLUSH_SECONDS = float(os.environ.get('LAST_LOGIN_FLUSH_SECONDS', 10))
+
+def read_admin_identity(admin_id):
+    row = db.session.query(Admin.id, Admin.admin_username, Admin.admin_email).filter_by(id=admin_id).first()
+    return AdminIdentity(*row) if row else None
+
+admin_identities = IdentityCache(read_admin_identity, ttl=ADMIN_CACHE_TTL)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return Admin.query.get(int(user_id))
+    return admin_identities.get(int(user_id))
+
+@event.listens_for(Admin, 'after_update')
+@event.listens_for(Admin, 'after_delete')
+def admin_changed(mapper, connection, target):
+    admin_identities.invalidate(target.id)
+    # Dropped again once the change commits: a request that read the old row
+    # between this flush and the commit must not keep it for a whole TTL
+    object_session(target).info.setdefault('changed_admins', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def forget_changed_admins(session):
+    changed = session.info.pop('changed_admins', None)
+    if changed:
+        admin_identities.invalidate(*changed)
+
+def write_last_logins(pending):
+    """Apply coalesced {admin_id: last_login} writes in one statement"""
+    try:
+        with app.app_context(), db.engine.begin() as connection:
+            connection.execute(
+                Admin.__table__.update().where(Admin.id == bindparam('admin_id')).values(last_login=bindparam('logged_in')),
+                [{'admin_id': admin_id, 'logged_in': logged_in} for admin_id, logged_in in pending.items()]
+            )
+    except Exception:
+        logger.exception('last_login flush failed', extra={'admins': len(pending)})
+        raise
+
+last_logins = WriteCoalescer(write_last_logins, interval=LAST_LOGIN_FLUSH_SECONDS)
+
+# ==================== PASSWORD HASHING ====================
+
+# Hashing runs in a process pool; a full queue answers 503 + Retry-After
+password_hasher = PasswordHasher(
+    method=os.environ.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+    workers=int(os.environ.get('PASSWORD_HASH_WORKERS', max((os.cpu_count() or 2) // 2, 1))),
+    max_pending=int(os.environ.get('PASSWORD_HASH_QUEUE', 0)) or None,
+    timeout=int(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+)
 
 # ==================== VALIDATION HELPERS ====================
 
-def validate_email(email):
-    """RFC 5322 compliant email validation"""
-    pattern = r'^[A-Za-z0-9._+%-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,6}$'
-    if not re.match(pattern, email):
-        return False
-    
-    # Block dummy emails
-    dummy_emails = ['test@test.com', 'test@example.com', 'admin@admin.com', 
-                    'demo@demo.com', 'sample@sample.com']
-    if email.lower() in dummy_emails:
-        return False
-    
-    return True
-
-def validate_mobile(mobile):
-    """Validate 10-digit Indian mobile number"""
-    if not re.match(r'^[6789][0-9]{9}$', mobile):
-        return False
-    
-    # Block dummy numbers
-    dummy_phones = ['1234567890', '9999999999', '0000000000']
-    if mobile in dummy_phones:
-        return False
-    
-    return True
-
-def validate_name(name):
-    """Validate name (letters, spaces, dots, apostrophes, numbers allowed)"""
-    if not name or len(name) < 1 or len(name) > 50:
-        return False
-    
-    # Allow letters, numbers, spaces, dots, apostrophes, hyphens
-    if not re.match(r'^[A-Za-z0-9]+(?:[.\s\'-]*[A-Za-z0-9]+)*\.?$', name):
-        return False
-    
-    # Must contain at least one letter
-    if not re.search(r'[A-Za-z]', name):
-        return False
-    
-    return True
-
-def calculate_age(dob):
-    """Calculate age from date of birth"""
-    today = datetime.today()
-    return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
-
-def has_repeated_pattern(value):
-    """Check for repeated patterns and consonant-heavy gibberish"""
-    # 1. Check if any substring of length 2 or 3 repeats 3+ times consecutively
-    for length in [2, 3]:
-        for i in range(len(value) - length * 3 + 1):
-            substring = value[i:i+length]
-            if substring * 3 == value[i:i+length*3]:
-                return True
-                
-    # 2. Check for consonant-heavy gibberish
-    if len(value) >= 8:
-        # Count total letters
-        total_letters = len(re.findall(r'[a-zA-Z]', value))
-        # Count consonants
-        consonants = len(re.findall(r'[bcdfghjklmnpqrstvwxyzBCDFGHJKLMNPQRSTVWXYZ]', value))
+# Fields whose value must not already exist in the users table
+UNIQUE_FIELDS = {
+    'username': ('username', "Username is already taken"),
+    'email': ('email', "Email is already registered"),
+}
+
+def load_identities(since_id):
+    """Stream (id, username, email) rows for the availability index"""
+    query = (db.session.query(User.id, User.username, User.email)
+             .filter(User.id > since_id)
+             .order_by(User.id)
+             .yield_per(5000))
+    for row in query:
+        yield tuple(row)
+
+# Answers "definitely available" for usernames/emails without a query
+availability = AvailabilityIndex(
+    load_identities,
+    counter=lambda: db.session.query(db.func.count(User.id)).scalar(),
+    refresh_interval=int(os.environ.get('AVAILABILITY_REFRESH_SECONDS', 5)),
+    # Ids below the high-water mark re-read on each catch-up, for rows that commit out of id order
+    lookback=int(os.environ.get('AVAILABILITY_LOOKBACK_IDS', 1000))
+)
+
+def check_fields(fields, password_value=None):
+    """Run the format rules. Returns (results, pending) where pending holds
+    the unique fields that passed and that the availability index cannot
+    rule out - they still need uniqueness_query()."""
+    context = {'passwordValue': password_value or fields.get('password')}
+    results = {field: validate_field(field, value, context) for field, value in fields.items()}
+
+    pending = {field: fields[field] for field in UNIQUE_FIELDS
+               if field in results and results[field][0]
+               and availability.might_exist(UNIQUE_FIELDS[field][0], fields[field])}
+    return results, pending
+
+def uniqueness_query(pending):
+    """One SELECT covering every pending uniqueness check"""
+    columns = [getattr(User, UNIQUE_FIELDS[field][0]) for field in pending]
+    return db.select(*columns).where(db.or_(*[column == value for column, value in zip(columns, pending.values())]))
+
+def mark_taken(results, pending, rows):
+    for index, (field, value) in enumerate(pending.items()):
+        if any(row[index] == value for row in rows):
+            results[field] = (False, UNIQUE_FIELDS[field][1])
+
+def validate_form(fields, password_value=None):
+    """Validate a dict of field -> value in one pass.
+
+    Returns {field: (valid, message)}. Uniqueness checks for every field that
+    passed its format rules are resolved with a single query, and only for
+    values the availability index cannot rule out.
+    """
+    results, pending = check_fields(fields, password_value)
+    if pending:
+        mark_taken(results, pending, db.session.execute(uniqueness_query(pending)).all())
+    return results
+
+# ==================== SEARCH ====================
+
+_user_search = None
+
+def get_user_search():
+    """Search backend for the configured database (FTS5 on SQLite, pg_trgm on Postgres)"""
+    global _user_search
+    if _user_search is None:
+        _user_search = search_backend(User, db.engine.dialect.name)
+    return _user_search
+
+def install_search_indexes():
+    """Create the dashboard indexes on databases created before they existed"""
+    with db.engine.begin() as connection:
+        for index in User.__table__.indexes:
+            index.create(bind=connection, checkfirst=True)
+        get_user_search().install(connection)
+
+# ==================== PAGINATION ====================
+
+DASHBOARD_PAGE_SIZE = 20
+dashboard_pages = KeysetPaginator(User.created_at, User.id)
+
+def count_users():
+    with app.app_context():
+        return db.session.query(db.func.count(User.id)).scalar()
+
+# Total shown on the dashboard; recounted in the background, adjusted on writes
+user_count = CachedCount(count_users, ttl=int(os.environ.get('USER_COUNT_TTL', 60)))
+
+# ==================== ANALYTICS ====================
+
+ANALYTICS_DAYS = 30
+registration_stats = RegistrationStats(RegistrationStat.__table__, User.__table__)
+
+def record_registrations(users, sign=1):
+    """Adjust the analytics counts inside the current transaction.
+    ``users`` are mappings holding the STAT_COLUMNS; sign=-1 for deletes."""
+    registration_stats.apply(db.session.execute, db.engine.dialect.name, registration_stats.changes(users, sign))
+
+def read_analytics(days=ANALYTICS_DAYS):
+    since = (datetime.utcnow() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    return registration_stats.read(db.session.connection(), since)
+
+# ==================== PAGE CACHE ====================
+
+# Rendered pages and fragments; PAGE_CACHE_BACKEND=file shares them between workers
+PAGE_CACHE_BACKEND = os.environ.get('PAGE_CACHE_BACKEND', 'memory')
+PAGE_CACHE_MAX_BYTES = int(os.environ.get('PAGE_CACHE_MAX_MB', 32)) * 1024 * 1024
+
+if PAGE_CACHE_BACKEND == 'file':
+    page_cache = PageCache(FileBackend(os.environ.get('PAGE_CACHE_DIR', os.path.join(app.instance_path, 'page_cache')),
+                                       PAGE_CACHE_MAX_BYTES))
+else:
+    page_cache = PageCache(MemoryBackend(PAGE_CACHE_MAX_BYTES))
+
+@lru_cache(maxsize=None)
+def template_version(name):
+    """Hash of a template's source. Part of every entry's version, so a deploy
+    that edits the template stops matching entries rendered from the old one
+    (the file backend keeps them across restarts)."""
+    source = app.jinja_env.loader.get_source(app.jinja_env, name)[0]
+    return assets.fingerprint(source.encode('utf-8'))
+
+def cached_page(key, version, template, render):
+    """page_cache.render() for a page rendered from ``template``, bypassed in
+    debug mode so template edits show up at once"""
+    if app.debug:
+        return page_cache.render(key, version, render, bypass=True)
+    return page_cache.render(key, f'{template_version(template)}:{version}', render)
+
+def user_cache_keys(user_id):
+    return f'user-row:{user_id}', f'user-detail:{user_id}'
+
+@event.listens_for(User, 'after_update')
+def invalidate_user_pages(mapper, connection, target):
+    # Entries are versioned by updated_at anyway; this frees them early
+    page_cache.invalidate(*user_cache_keys(target.id))
+
+@app.template_global()
+def user_row(user):
+    """A dashboard table row, rendered once per (user.id, updated_at)"""
+    page = cached_page(f'user-row:{user.id}', user.updated_at, 'admin_user_row.html',
+                       lambda: app.jinja_env.get_template('admin_user_row.html').render(user=user))
+    return Markup(page.body)
+
+# ==================== EXPORT ====================
+
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+
+# Exportable columns in file order: attribute -> (header, formatter)
+EXPORT_COLUMNS = {
+    'id': ('ID', None),
+    'first_name': ('First Name', None),
+    'last_name': ('Last Name', None),
+    'username': ('Username', None),
+    'email': ('Email', None),
+    'mobile': ('Mobile', None),
+    'dob': ('Date of Birth', lambda value: value.strftime('%Y-%m-%d')),
+    'age': ('Age', None),
+    'gender': ('Gender', None),
+    'address': ('Address', None),
+    'postal_code': ('Postal Code', None),
+    'country': ('Country', None),
+    'state': ('State', None),
+    'city': ('City', None),
+    'education': ('Education', None),
+    'security_question': ('Security Question', None),
+    'guardian_name': ('Guardian Name', lambda value: value or ''),
+    'guardian_email': ('Guardian Email', lambda value: value or ''),
+    'guardian_phone': ('Guardian Phone', lambda value: value or ''),
+    'created_at': ('Registration Date', lambda value: value.strftime('%Y-%m-%d %H:%M:%S')),
+}
+
+def parse_export_args(args):
+    """Columns and created_at bounds from ?columns=a,b&from=YYYY-MM-DD&to=YYYY-MM-DD"""
+    columns = [name.strip() for name in args.get('columns', '').split(',') if name.strip()]
+    unknown = [name for name in columns if name not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f'Unknown export columns: {", ".join(unknown)}')
+
+    bounds = []
+    for name in ('from', 'to'):
+        value = args.get(name)
+        try:
+            bounds.append(datetime.strptime(value, '%Y-%m-%d') if value else None)
+        except ValueError:
+            raise ValueError(f'"{name}" must be a date in YYYY-MM-DD format')
+    return columns or list(EXPORT_COLUMNS), bounds[0], bounds[1]
+
+def export_rows(columns, start=None, end=None):
+    """Stream raw export rows, newest first, EXPORT_BATCH_SIZE at a time.
+    ``end`` is inclusive of the whole day."""
+    query = db.session.query(*[getattr(User, name) for name in columns])
+    if start:
+        query = query.filter(User.created_at >= start)
+    if end:
+        query = query.filter(User.created_at < end + timedelta(days=1))
+    return query.order_by(User.created_at.desc(), User.id.desc()).yield_per(EXPORT_BATCH_SIZE)
+
+# Large exports run in the background and are downloaded when finished
+export_jobs = ExportJobs(
+    os.environ.get('EXPORT_FOLDER', os.path.join(app.instance_path, 'exports')),
+    source=export_rows,
+    context=app.app_context,
+    headers={name: header for name, (header, _) in EXPORT_COLUMNS.items()},
+    formatters={name: formatter for name, (_, formatter) in EXPORT_COLUMNS.items()},
+    sql_types={name: User.__table__.c[name].type for name in EXPORT_COLUMNS},
+    max_workers=int(os.environ.get('EXPORT_WORKERS', 2)),
+    retention=int(os.environ.get('EXPORT_RETENTION_HOURS', 24)) * 3600,
+    stale_after=int(os.environ.get('EXPORT_STALE_SECONDS', 600))
+)
+
+def export_job_json(job):
+    data = job.to_dict()
+    data['status_url'] = url_for('export_job_status', job_id=job.id)
+    if job.status == 'done':
+        data['download_url'] = url_for('download_export', job_id=job.id)
+    return data
+
+# ==================== IMPORT ====================
+
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 5000))
+IMPORT_MAX_BYTES = int(os.environ.get('IMPORT_MAX_MB', 100)) * 1024 * 1024
+IMPORT_REPORT_LIMIT = 1000
+# Rows per duplicate lookup: two bound values each, well under SQLite's
+# 999-variable limit on older builds
+IMPORT_LOOKUP_ROWS = 400
+
+# Importable columns: form field -> User attribute
+IMPORT_FIELDS = {
+    'firstName': 'first_name',
+    'lastName': 'last_name',
+    'username': 'username',
+    'email': 'email',
+    'mobile': 'mobile',
+    'dob': 'dob',
+    'gender': 'gender',
+    'address': 'address',
+    'postalCode': 'postal_code',
+    'country': 'country',
+    'state': 'state',
+    'city': 'city',
+    'education': 'education',
+    'securityQuestion': 'security_question',
+    'securityAnswer': 'security_answer',
+    'guardianName': 'guardian_name',
+    'guardianEmail': 'guardian_email',
+    'guardianPhone': 'guardian_phone',
+    'passwordHash': 'password_hash',
+}
+IMPORT_OPTIONAL = ('guardianName', 'guardianEmail', 'guardianPhone', 'passwordHash')
+
+# A header may be the form field id, the attribute name or the CSV export header
+IMPORT_ALIASES = {alias.lower(): field for field, name in IMPORT_FIELDS.items()
+                  for alias in (field, name, EXPORT_COLUMNS.get(name, (name,))[0])}
+
+# Imported users without a password hash get one that never verifies
+UNUSABLE_PASSWORD = '!'
+
+@lru_cache(maxsize=32)
+def import_columns(keys):
+    """Map a record's keys to form fields (other columns are ignored)"""
+    names = {key: key.strip().lower() for key in keys if key}
+    if 'password' in names.values():
+        # Hashing every row at registration cost would turn seconds into hours
+        raise ImportFormatError('Plaintext passwords cannot be imported - supply a password_hash column or leave passwords out')
+    return [(key, IMPORT_ALIASES[name]) for key, name in names.items() if name in IMPORT_ALIASES]
+
+def prepare_import(record, cache):
+    """Check one import record with the registration rules and build its users row.
+    ``cache`` memoises rule results per (field, value) within a chunk."""
+    values = {}
+    for key, field in import_columns(tuple(record)):
+        value = record[key]
+        value = '' if value is None else str(value).strip()
+        if value:
+            values[field] = value
+
+    errors = []
+    for field in IMPORT_FIELDS:
+        value = values.get(field)
+        if value is None:
+            if field not in IMPORT_OPTIONAL:
+                errors.append((field, 'Value is required'))
+            continue
+        result = cache.get((field, value))
+        if result is None:
+            result = cache[(field, value)] = validate_field(field, value)
+        if not result[0]:
+            errors.append((field, result[1]))
+    if errors:
+        return None, errors
+
+    born = cache.get(('born', values['dob']))
+    if born is None:
+        try:
+            dob = datetime.strptime(values['dob'], '%Y-%m-%d').date()
+            born = cache[('born', values['dob'])] = (dob, calculate_age(dob))
+        except ValueError:
+            born = cache[('born', values['dob'])] = (None, None)
+    dob, age = born
+    if dob is None:
+        return None, [('dob', 'Invalid date of birth format')]
+    if age < 13:
+        return None, [('dob', 'Must be at least 13 years old to register')]
+
+    password_hash = values.get('passwordHash', UNUSABLE_PASSWORD)
+    if password_hash != UNUSABLE_PASSWORD and password_hash.count('$') != 2:
+        return None, [('passwordHash', 'Not a password hash')]
+
+    row = {name: values.get(field) for field, name in IMPORT_FIELDS.items()}
+    row.update(dob=dob, age=age, password_hash=password_hash, profile_photo=None)
+    return row, []
+
+def find_taken(rows):
+    """(usernames, emails) of a chunk that are already registered - one query
+    per IMPORT_LOOKUP_ROWS rows. For a whole chunk the indexed IN lookup is
+    cheaper than asking the availability index about every value first."""
+    taken_usernames, taken_emails = set(), set()
+    for start in range(0, len(rows), IMPORT_LOOKUP_ROWS):
+        part = rows[start:start + IMPORT_LOOKUP_ROWS]
+        usernames = [row['username'] for row in part]
+        emails = [row['email'] for row in part]
+        taken = db.session.execute(
+            db.select(User.username, User.email).where(db.or_(User.username.in_(usernames), User.email.in_(emails)))
+        ).all()
+        taken_usernames.update(username for username, _ in taken)
+        taken_emails.update(email for _, email in taken)
+    return taken_usernames, taken_emails
+
+def insert_users(rows):
+    """Insert a chunk with a single executemany and commit it"""
+    now = datetime.utcnow()
+    for row in rows:
+        row.setdefault('created_at', now)
+    try:
+        db.session.execute(User.__table__.insert(), rows)
+        record_registrations(rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    for row in rows:
+        availability.add(row['username'], row['email'])
+    user_count.adjust(len(rows))
+
+user_importer = BulkImporter(prepare_import, find_taken, insert_users,
+                             conflicts=(IntegrityError,), chunk_size=IMPORT_CHUNK_SIZE)
+
+# ==================== GROUP COMMIT ====================
+
+# REGISTRATION_GROUP_COMMIT=1: registrations are inserted by one writer thread,
+# many per transaction, instead of each request committing on its own
+GROUP_COMMIT = os.environ.get('REGISTRATION_GROUP_COMMIT', '0') == '1'
+GROUP_COMMIT_MAX_BATCH = int(os.environ.get('GROUP_COMMIT_MAX_BATCH', 64))
+GROUP_COMMIT_WAIT_MS = float(os.environ.get('GROUP_COMMIT_WAIT_MS', 2))
+GROUP_COMMIT_MAX_PENDING = int(os.environ.get('GROUP_COMMIT_MAX_PENDING', 1000))
+GROUP_COMMIT_TIMEOUT = int(os.environ.get('GROUP_COMMIT_TIMEOUT', 30))
+# A registration still queued after GROUP_COMMIT_TIMEOUT answers 504 without
+# Retry-After: it may still be written, so the form must not resubmit it
+GROUP_COMMIT_TIMEOUT_MESSAGE = ('Registration is taking longer than usual and may still complete. '
+                                'Please check your registration before submitting again.')
+
+class DuplicateRegistration(Exception):
+    """The username or email was taken by an earlier row of the batch or an existing user"""
+    
+    def __init__(self, field=None):
+        self.field = field
+        super().__init__(UNIQUE_FIELDS[field][1] if field else 'Username or email is already registered')
+    
+    def to_dict(self):
+        if self.field is None:
+            return {'success': False, 'message': str(self)}
+        return {'success': False, 'message': f'{self.field}: {self}', 'errors': {self.field: str(self)}}
+
+def insert_registrations(rows):
+    """Insert rows in one transaction; returns their ids"""
+    users = [User(**row) for row in rows]
+    try:
+        db.session.add_all(users)
+        db.session.flush()
+        ids = [user.id for user in users]
+        record_registrations(rows)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    for row in rows:
+        availability.add(row['username'], row['email'])
+    user_count.adjust(len(rows))
+    return ids
+
+def write_registrations(rows):
+    """The group-commit writer: one id per row, or a DuplicateRegistration
+    for a row whose username or email is already taken - by an existing user
+    or by an earlier row of the same batch"""
+    results = [None] * len(rows)
+    with app.app_context():
+        taken_usernames, taken_emails = find_taken(rows)
+        accepted = []
+        for index, row in enumerate(rows):
+            if row['username'] in taken_usernames:
+                results[index] = DuplicateRegistration('username')
+            elif row['email'] in taken_emails:
+                results[index] = DuplicateRegistration('email')
+            else:
+                taken_usernames.add(row['username'])
+                taken_emails.add(row['email'])
+                accepted.append(index)
+        if not accepted:
+            return results
+        try:
+            ids = insert_registrations([rows[index] for index in accepted])
+        except IntegrityError:
+            # Lost a race with another process: retry one by one so only the conflicting rows fail
+            ids = []
+            for index in accepted:
+                try:
+                    ids.extend(insert_registrations([rows[index]]))
+                except IntegrityError:
+                    ids.append(DuplicateRegistration())
+        for index, user_id in zip(accepted, ids):
+            results[index] = user_id
+    return results
+
+registration_queue = GroupCommitQueue(write_registrations, max_batch=GROUP_COMMIT_MAX_BATCH,
+                                      max_wait_ms=GROUP_COMMIT_WAIT_MS,
+                                      max_pending=GROUP_COMMIT_MAX_PENDING) if GROUP_COMMIT else None
+
+# ==================== BULK ACTIONS ====================
+
+BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 1000))
+
+def chunked(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def parse_selection(args, ids):
+    """User ids for a bulk action: explicit ``ids``, or every match of
+    ``search`` when ``scope`` is "search". Newest first."""
+    if args.get('scope') == 'search':
+        search_query = (args.get('search') or '').strip()
+        if not search_query:
+            # Never "everything" by accident
+            raise ValueError('A search is required to act on search results')
+        query = get_user_search().apply(db.session.query(User.id), search_query)
+        return sorted({user_id for user_id, in query}, reverse=True)
+    try:
+        return sorted({int(user_id) for user_id in ids or []}, reverse=True)
+    except (TypeError, ValueError):
+        raise ValueError('User ids must be integers')
+
+def iter_delete_users(ids):
+    """Delete users BULK_CHUNK_SIZE at a time, one transaction per chunk.
+
+    A chunk costs the same three statements whatever its size: a DELETE that
+    returns the deleted rows' photo references and analytics columns, one
+    executemany adjusting the analytics counts, and - once the chunk is
+    committed - one SELECT for which of those photos other users still share.
+    Unshared photo files are then removed. Yields running totals after each chunk.
+    """
+    table = User.__table__
+    returned = [table.c.profile_photo] + [table.c[name] for name in STAT_COLUMNS]
+    progress = {'total': len(ids), 'deleted': 0, 'photos_removed': 0}
+    for chunk in chunked(ids, BULK_CHUNK_SIZE):
+        delete = table.delete().where(table.c.id.in_(chunk))
+        if db.engine.dialect.delete_returning:
+            rows = db.session.execute(delete.returning(*returned)).all()
+        else:
+            rows = db.session.execute(db.select(*returned).where(table.c.id.in_(chunk))).all()
+            db.session.execute(delete)
+        deleted = len(rows)
+        record_registrations([row._mapping for row in rows], sign=-1)
+        refs = {row.profile_photo for row in rows if is_blob_ref(row.profile_photo)}
+        db.session.commit()
         
-        if total_letters > 0 and (consonants / total_letters) > 0.75:
-            return True
-            
-    return False
+        if refs:
+            # Photos are stored by content hash, so another user - possibly one
+            # registering right now - can share the file: checked after the commit
+            refs = photo_store.delete_unused(refs, photos_in_use)
+            db.session.commit()
+        page_cache.invalidate(*[key for user_id in chunk for key in user_cache_keys(user_id)])
+        availability.discard(deleted)
+        user_count.adjust(-deleted)
+        progress['deleted'] += deleted
+        progress['photos_removed'] += len(refs)
+        yield dict(progress)
+
+def photos_in_use(refs):
+    table = User.__table__
+    return set(db.session.execute(
+        db.select(table.c.profile_photo).where(table.c.profile_photo.in_(refs)).distinct()
+    ).scalars())
+
+def delete_users(ids):
+    progress = {'total': len(ids), 'deleted': 0, 'photos_removed': 0}
+    for progress in iter_delete_users(ids):
+        logger.info('users deleted', extra=progress)
+    return progress
+
+def selected_rows(columns, ids):
+    """Export rows for a selection, one query per BULK_CHUNK_SIZE ids"""
+    for chunk in chunked(ids, BULK_CHUNK_SIZE):
+        yield from (db.session.query(*[getattr(User, name) for name in columns])
+                    .filter(User.id.in_(chunk))
+                    .order_by(User.created_at.desc(), User.id.desc()))
 
 # ==================== ROUTES ====================
 
 @app.route('/')
 def index():
-    """Serve the registration form"""
-    return render_template('index.html')
+    """Serve the registration form - rendered once per asset build, revalidated by ETag"""
+    page = cached_page('page:index', asset_manifest.version, 'index.html', lambda: render_template('index.html'))
+    response = app.response_class(page.body, mimetype='text/html')
+    response.set_etag(page.etag)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def store_photo(photo):
+    """Write a registration's photo. The row is already committed, so a
+    failed write is logged instead of failing the registration."""
+    try:
+        photo_store.store(photo)
+    except OSError:
+        logger.exception('photo write failed', extra={'ref': photo.ref})
 
 @app.route('/register', methods=['POST'])
 def register():
     """Handle user registration"""
     try:
         data = request.json
-        
-        # Log incoming data for debugging
-        print(f"\n{'='*60}")
-        print(f"📥 Registration Request Received")
-        print(f"{'='*60}")
-        print(f"Name: {data.get('firstName')} {data.get('lastName')}")
-        print(f"Username: {data.get('username')}")
-        print(f"Email: {data.get('email')}")
-        print(f"Mobile: {data.get('mobile')}")
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'message': 'Invalid JSON body'}), 400
         
         # Validate required fields
         required_fields = ['firstName', 'lastName', 'username', 'email', 'mobile', 
@@ -200,55 +956,47 @@ def register():
         
         missing_fields = [field for field in required_fields if field not in data or not data[field]]
         if missing_fields:
-            print(f"❌ Missing fields: {', '.join(missing_fields)}")
+            request_log.annotate(reason='missing_fields', fields=missing_fields)
             return jsonify({'success': False, 'message': f'Missing required fields: {", ".join(missing_fields)}'}), 400
         
-        # Server-side validation
-        if not validate_email(data['email']):
-            print(f"❌ Invalid email: {data['email']}")
-            return jsonify({'success': False, 'message': f'Invalid email format: {data["email"]}'}), 400
-        
-        if not validate_mobile(data['mobile']):
-            print(f"❌ Invalid mobile: {data['mobile']}")
-            return jsonify({'success': False, 'message': f'Invalid mobile number: {data["mobile"]}'}), 400
-        
-        if not validate_name(data['firstName']):
-            print(f"❌ Invalid first name: {data['firstName']}")
-            return jsonify({'success': False, 'message': f'Invalid first name format: {data["firstName"]}'}), 400
-        
-        if not validate_name(data['lastName']):
-            print(f"❌ Invalid last name: {data['lastName']}")
-            return jsonify({'success': False, 'message': f'Invalid last name format: {data["lastName"]}'}), 400
-        
-        # Check if username or email already exists
-        existing_user = User.query.filter_by(username=data['username']).first()
-        if existing_user:
-            print(f"❌ Username already exists: {data['username']}")
-            return jsonify({'success': False, 'message': f'Username "{data["username"]}" is already taken'}), 400
-        
-        existing_email = User.query.filter_by(email=data['email']).first()
-        if existing_email:
-            print(f"❌ Email already registered: {data['email']}")
-            return jsonify({'success': False, 'message': f'Email "{data["email"]}" is already registered'}), 400
+        # Server-side validation - same rules as /api/validate
+        validated = {field: data[field] for field in data if field != 'profilePhoto' and data[field]}
+        errors = {field: message for field, (valid, message) in validate_form(validated).items() if not valid}
+        if errors:
+            field, message = next(iter(errors.items()))
+            request_log.annotate(reason='invalid_fields', fields=list(errors))
+            return jsonify({'success': False, 'message': f'{field}: {message}', 'errors': errors}), 400
         
         # Parse DOB and calculate age
         try:
             dob = datetime.strptime(data['dob'], '%Y-%m-%d').date()
-        except ValueError as e:
-            print(f"❌ Invalid date format: {data['dob']}")
+        except ValueError:
+            request_log.annotate(reason='invalid_dob')
             return jsonify({'success': False, 'message': 'Invalid date of birth format'}), 400
         
         age = calculate_age(dob)
         
         if age < 13:
-            print(f"❌ Age too young: {age} years")
+            request_log.annotate(reason='under_age')
             return jsonify({'success': False, 'message': 'Must be at least 13 years old to register'}), 400
         
-        print(f"✓ All validations passed")
-        print(f"✓ Creating user record...")
+        try:
+            password_hash = password_hasher.hash(data['password'])
+        except PoolSaturated as e:
+            request_log.annotate(reason='hash_pool_saturated', retry_after=e.retry_after)
+            response = jsonify({'success': False, 'message': 'Server is busy, please try again in a moment'})
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 503
+        
+        # Decoded and checked now, written once the row is committed: a duplicate
+        # or failed insert leaves no file behind. The row keeps only a reference.
+        try:
+            photo = photo_store.decode_data_url(data['profilePhoto'])
+        except PhotoError as e:
+            request_log.annotate(reason='invalid_photo')
+            return jsonify({'success': False, 'message': str(e)}), 400
         
-        # Create new user
-        new_user = User(
+        row = dict(
             first_name=data['firstName'],
             last_name=data['lastName'],
             username=data['username'],
@@ -263,312 +1011,233 @@ def register():
             state=data['state'],
             city=data['city'],
             education=data['education'],
-            profile_photo=data['profilePhoto'],  # Store base64
+            profile_photo=photo.ref,
             security_question=data['securityQuestion'],
             security_answer=data['securityAnswer'],
-            password_hash=generate_password_hash(data['password']),
+            password_hash=password_hash,
             guardian_name=data.get('guardianName'),
             guardian_email=data.get('guardianEmail'),
-            guardian_phone=data.get('guardianPhone')
+            guardian_phone=data.get('guardianPhone'),
+            created_at=datetime.utcnow()
         )
         
-        db.session.add(new_user)
-        db.session.commit()
+        if registration_queue is not None:
+            # Committed together with whatever else is queued; wait for our id
+            try:
+                user_id = registration_queue.submit(row).result(timeout=GROUP_COMMIT_TIMEOUT)
+            except QueueFull as e:
+                request_log.annotate(reason='registration_queue_full')
+                response = jsonify({'success': False, 'message': 'Server is busy, please try again in a moment'})
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response, 503
+            except FutureTimeout:
+                # The row stays queued, so it may still be written after we answer
+                request_log.annotate(reason='registration_queue_timeout')
+                store_photo(photo)
+                return jsonify({'success': False, 'message': GROUP_COMMIT_TIMEOUT_MESSAGE}), 504
+            except DuplicateRegistration as e:
+                request_log.annotate(reason='duplicate', fields=[e.field] if e.field else [])
+                return jsonify(e.to_dict()), 400
+        else:
+            # Create new user
+            new_user = User(**row)
+            db.session.add(new_user)
+            db.session.flush()
+            # Counted in the same transaction as the insert
+            record_registrations([row])
+            db.session.commit()
+            user_id = new_user.id
+            availability.add(new_user.username, new_user.email)
+            user_count.adjust(1)
+        store_photo(photo)
         
-        print(f"✅ SUCCESS! User registered:")
-        print(f"   ID: {new_user.id}")
-        print(f"   Username: {new_user.username}")
-        print(f"   Email: {new_user.email}")
-        print(f"   Age: {new_user.age} years")
-        print(f"{'='*60}\n")
+        request_log.annotate(user_id=user_id)
         
         return jsonify({
             'success': True, 
             'message': 'Registration successful!',
-            'user_id': new_user.id,
-            'username': new_user.username
+            'user_id': user_id,
+            'username': row['username']
         }), 201
         
-    except Exception as e:
+    except IntegrityError:
+        # The unique constraint is the final word on duplicates: the availability
+        # index can say "available" for a value another worker just took
+        db.session.rollback()
+        request_log.annotate(reason='duplicate')
+        return jsonify({'success': False, 'message': 'Username or email is already registered'}), 400
+    except Exception:
         db.session.rollback()
-        print(f"\n{'='*60}")
-        print(f"❌ REGISTRATION ERROR")
-        print(f"{'='*60}")
-        print(f"Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        print(f"{'='*60}\n")
-        return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
+        logger.exception('registration failed')
+        return jsonify({'success': False, 'message': 'Server error, please try again'}), 500
 
 @app.route('/api/validate', methods=['POST'])
 def api_validate():
-    data = request.json
+    data = request.json or {}
+    if not isinstance(data, dict):
+        return jsonify({"valid": False, "message": "Invalid JSON body"}), 400
+    
+    # Batch mode: {"fields": {field: value, ...}} validates the whole form at once
+    if 'fields' in data:
+        fields = data.get('fields')
+        if not isinstance(fields, dict) or not fields:
+            return jsonify({"valid": False, "message": "Fields are required"}), 400
+        
+        missing = [field for field, value in fields.items() if value is None]
+        results = validate_form({field: value for field, value in fields.items() if value is not None},
+                                data.get('passwordValue'))
+        for field in missing:
+            results[field] = (False, "Value is required")
+        
+        return jsonify({
+            "valid": all(valid for valid, _ in results.values()),
+            "results": {field: {"valid": valid, "message": message} for field, (valid, message) in results.items()}
+        })
+    
     field = data.get('field')
     value = data.get('value')
     
-    if not field or value is None:
+    if not field or not isinstance(field, str) or value is None:
         return jsonify({"valid": False, "message": "Field and value are required"}), 400
-        
-    valid = True
-    message = ""
-    
-    # Common helper for repeated patterns
-    if field in ['firstName', 'lastName', 'username', 'email', 'guardianEmail', 'mobile', 'guardianPhone', 'password', 'address', 'securityAnswer', 'guardianName', 'postalCode']:
-         # The prompt asks to apply "no repeated patterns" to all except dropdowns and DOB/confirmPassword specific logic
-         # But the constraint sets list it explicitly for specific fields. I'll apply where required.
-         pass
-
-    if field in ['firstName', 'lastName', 'guardianName']:
-        label = "Guardian name" if field == 'guardianName' else ("First name" if field == 'firstName' else "Last name")
-        max_len = 100 if field == 'guardianName' else 20
-        
-        if len(value) < 2:
-            return jsonify({"valid": False, "message": "Must be at least 2 characters"})
-        if len(value) > max_len:
-            return jsonify({"valid": False, "message": f"Must not exceed {max_len} characters"})
-        if not re.match(r"^[A-Za-z]+(?:[.\s'-]*[A-Za-z]+)*\.?$", value):
-            return jsonify({"valid": False, "message": "Only letters, spaces, dots, apostrophes allowed"})
-        if value.lower() in ['test','admin','demo','sample','temp','dummy','abc','xyz','asdf']:
-            return jsonify({"valid": False, "message": "This name is not allowed"})
-        if has_repeated_pattern(value):
-            return jsonify({"valid": False, "message": "No gibberish or repeated patterns allowed"})
-        message = f"{label} accepted"
-
-    elif field == 'username':
-        if len(value) < 3:
-            return jsonify({"valid": False, "message": "Username must be at least 3 characters"})
-        if len(value) > 30:
-            return jsonify({"valid": False, "message": "Username must not exceed 30 characters"})
-        if not re.match(r"^[A-Za-z0-9_@.#$%&*+-]{3,}$", value):
-            return jsonify({"valid": False, "message": "Only letters, numbers, and _@.#$%&*+- allowed"})
-        if value.lower() in ['test','admin','user','demo','sample','temp','hello','abc',
-                             'test123','user123','admin123','password','qwerty','asdfgh',
-                             'test1234','testuser','adminuser','demouser']:
-            return jsonify({"valid": False, "message": "This username is not allowed"})
-        if has_repeated_pattern(value):
-            return jsonify({"valid": False, "message": "No gibberish or repeated patterns allowed"})
-        
-        # Check DB for duplicate username
-        if User.query.filter_by(username=value).first():
-            return jsonify({"valid": False, "message": "Username is already taken"})
-
-        message = "Username is available"
-
-    elif field in ['email', 'guardianEmail']:
-        if len(value) < 5:
-            return jsonify({"valid": False, "message": "Email must be at least 5 characters"})
-        if len(value) > 100:
-            return jsonify({"valid": False, "message": "Email must not exceed 100 characters"})
-        if not re.match(r"^[A-Za-z0-9._+%-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,6}$", value):
-            return jsonify({"valid": False, "message": "Enter a valid email address"})
-        
-        # Extra email constraints
-        local, domain = value.split('@')
-        if '..' in local or '..' in domain:
-            return jsonify({"valid": False, "message": "Enter a valid email address"})
-        if local.startswith('.') or local.endswith('.'):
-             return jsonify({"valid": False, "message": "Enter a valid email address"})
-        if not re.search(r'[a-zA-Z]', local):
-             return jsonify({"valid": False, "message": "Enter a valid email address"})
-             
-        # Repeated TLD check
-        tld = domain.split('.')[-1]
-        if len(tld) * 2 == len(domain.split('.')[-1] * 2) and domain.endswith(tld+tld): 
-             # Rough check for repetition like .comcom. 
-             # Better: check if the string ends with a pattern that repeats.
-             # The constraint says "reject if TLD repeats like .comcom".
-             if tld + tld in domain:
-                  return jsonify({"valid": False, "message": "Invalid domain extension"})
-
-        if value.lower() in ['test@test.com','test@example.com','admin@admin.com',
-                             'user@user.com','demo@demo.com','demo@example.com',
-                             'sample@sample.com','info@info.com','test@gmail.com',
-                             'dummy@dummy.com','temp@temp.com','hello@hello.com',
-                             'abc@abc.com','admin@example.com']:
-            return jsonify({"valid": False, "message": "This email is not allowed"})
-        
-        # Check DB for duplicate email (only for main email)
-        if field == 'email':
-            if User.query.filter_by(email=value).first():
-                return jsonify({"valid": False, "message": "Email is already registered"})
-        
-        message = "Guardian email accepted" if field == 'guardianEmail' else "Email format is valid"
-
-    elif field in ['mobile', 'guardianPhone']:
-        if len(value) != 10:
-             return jsonify({"valid": False, "message": "Must be exactly 10 digits"})
-        if not re.match(r"^[6789][0-9]{9}$", value):
-             return jsonify({"valid": False, "message": "Must start with 6, 7, 8, or 9"})
-        if value in ['1234567890','9999999999','1111111111','5555555555',
-                     '0000000000','6666666666','7777777777','8888888888',
-                     '1234567801','9876543210']:
-            return jsonify({"valid": False, "message": "This number is not allowed"})
-        if len(set(value)) == 1:
-             return jsonify({"valid": False, "message": "Enter a real phone number"})
-        message = "Guardian phone accepted" if field == 'guardianPhone' else "Mobile number accepted"
-
-    elif field == 'password':
-        if len(value) < 8:
-             return jsonify({"valid": False, "message": "Password must be at least 8 characters"})
-        if len(value) > 50:
-             return jsonify({"valid": False, "message": "Password must not exceed 50 characters"})
-        if not re.search(r'[A-Z]', value):
-             return jsonify({"valid": False, "message": "Must include at least one uppercase letter"})
-        if not re.search(r'[a-z]', value):
-             return jsonify({"valid": False, "message": "Must include at least one lowercase letter"})
-        if not re.search(r'\d', value):
-             return jsonify({"valid": False, "message": "Must include at least one number"})
-        if not re.search(r'[@$!%*?&]', value):
-             return jsonify({"valid": False, "message": "Must include at least one special character (@$!%*?&)"})
-        if has_repeated_pattern(value):
-             return jsonify({"valid": False, "message": "No repeated patterns allowed in password"})
-        message = "Password is strong"
-
-    elif field == 'confirmPassword':
-        password_value = data.get('passwordValue')
-        if not password_value:
-             return jsonify({"valid": False, "message": "Password value is required for confirmation"})
-        if value != password_value:
-             return jsonify({"valid": False, "message": "Passwords do not match"})
-        message = "Passwords match"
-
-    elif field == 'postalCode':
-        if len(value) != 6:
-             return jsonify({"valid": False, "message": "Must be exactly 6 digits"})
-        if not re.match(r"^[0-9]{6}$", value):
-             return jsonify({"valid": False, "message": "Enter a valid postal code"})
-        if len(set(value)) == 1:
-             return jsonify({"valid": False, "message": "Enter a valid postal code"})
-        message = "Postal code accepted"
-
-    elif field == 'address':
-        if len(value) < 10:
-             return jsonify({"valid": False, "message": "Address must be at least 10 characters"})
-        if len(value) > 200:
-             return jsonify({"valid": False, "message": "Address must not exceed 200 characters"})
-        if not re.match(r"^[A-Za-z0-9\s.,#-]{10,}$", value):
-             return jsonify({"valid": False, "message": "Only letters, numbers, spaces, and .,#- allowed"})
-        if has_repeated_pattern(value):
-             return jsonify({"valid": False, "message": "No gibberish or repeated patterns allowed"})
-        message = "Address accepted"
-
-    elif field == 'securityAnswer':
-        if len(value) < 2:
-             return jsonify({"valid": False, "message": "Answer must be at least 2 characters"})
-        if len(value) > 100:
-             return jsonify({"valid": False, "message": "Answer must not exceed 100 characters"})
-        if has_repeated_pattern(value):
-             return jsonify({"valid": False, "message": "No gibberish or repeated patterns allowed"})
-        message = "Answer accepted"
-
-    elif field == 'dob':
-        try:
-            date_obj = datetime.strptime(value, '%Y-%m-%d').date()
-            if date_obj > datetime.now().date():
-                 return jsonify({"valid": False, "message": "Date cannot be in the future"})
-            if date_obj.year < 1900 or date_obj.year > datetime.now().year:
-                 return jsonify({"valid": False, "message": f"Year must be between 1900 and {datetime.now().year}"})
-            
-            age = calculate_age(date_obj)
-            if age < 13:
-                 return jsonify({"valid": False, "message": "Must be at least 13 years old"})
-            message = "Date of birth accepted"
-        except ValueError:
-            return jsonify({"valid": False, "message": "Enter a valid date (YYYY-MM-DD)"})
+    
+    valid, message = validate_form({field: value}, data.get('passwordValue'))[field]
+    return jsonify({"valid": valid, "message": message})
 
-    elif field in ['country', 'state', 'city', 'education', 'securityQuestion']:
-        if not value:
-             return jsonify({"valid": False, "message": f"Please select {field}"})
-        
-        labels = {
-            'country': 'Country', 'state': 'State', 'city': 'City',
-            'education': 'Education', 'securityQuestion': 'Security question'
-        }
-        message = f"{labels.get(field, field)} selected"
+# ==================== LOCATION API ROUTES (WITH FALLBACK) ====================
+
+CSC_API_BASE = 'https://api.countrystatecity.in/v1'
+
+# Fallback Data
+FALLBACK_COUNTRIES = [
+    {"id": 101, "name": "India", "iso2": "IN"},
+    {"id": 231, "name": "United States", "iso2": "US"},
+    {"id": 230, "name": "United Kingdom", "iso2": "GB"},
+    {"id": 38, "name": "Canada", "iso2": "CA"},
+    {"id": 13, "name": "Australia", "iso2": "AU"}
+]
+
+FALLBACK_STATES = {
+    101: [{"id": 4026, "name": "Karnataka"}, {"id": 4023, "name": "Maharashtra"}, {"id": 4035, "name": "Tamil Nadu"}, {"id": 4008, "name": "Delhi"}],
+    231: [{"id": 3919, "name": "California"}, {"id": 3951, "name": "New York"}, {"id": 3970, "name": "Texas"}, {"id": 3932, "name": "Florida"}]
+}
+
+FALLBACK_CITIES = {
+    4026: [{"id": 1, "name": "Bangalore"}, {"id": 2, "name": "Mysore"}, {"id": 3, "name": "Hubli"}],
+    4023: [{"id": 4, "name": "Mumbai"}, {"id": 5, "name": "Pune"}, {"id": 6, "name": "Nagpur"}],
+    3919: [{"id": 7, "name": "Los Angeles"}, {"id": 8, "name": "San Francisco"}, {"id": 9, "name": "San Diego"}],
+    3951: [{"id": 10, "name": "New York City"}, {"id": 11, "name": "Buffalo"}, {"id": 12, "name": "Albany"}]
+}
+
+def location_path(key):
+    """Upstream API path for a cache key"""
+    kind, *ids = key
+    if kind == 'countries':
+        return '/countries'
+    if kind == 'states':
+        return f'/countries/{ids[0]}/states'
+    return f'/countries/{ids[0]}/states/{ids[1]}/cities'
+
+# One pooled client for every upstream call - keep-alive, bounded concurrency,
+# request coalescing and a circuit breaker that fails fast to the fallbacks
+location_upstream = UpstreamClient(
+    CSC_API_BASE,
+    headers={"API-Key": os.environ.get('CSC_API_KEY', '')},
+    timeout=5,
+    max_concurrency=int(os.environ.get('CSC_MAX_CONCURRENCY', 8)),
+    failure_threshold=int(os.environ.get('CSC_BREAKER_THRESHOLD', 5)),
+    reset_timeout=int(os.environ.get('CSC_BREAKER_RESET', 30)),
+    observer=upstream_duration.observe
+)
+
+def fetch_location(key):
+    """Load a location list from countrystatecity.in (cache loader)"""
+    return location_upstream.get_json(location_path(key))
 
+location_cache = LocationCache(
+    fetch_location,
+    max_entries=int(os.environ.get('LOCATION_CACHE_SIZE', 512)),
+    ttl=int(os.environ.get('LOCATION_CACHE_TTL', 3600)),
+    stale_ttl=int(os.environ.get('LOCATION_CACHE_STALE_TTL', 86400))
+)
+
+# Prebuilt offline dataset - see `flask build-locations`
+location_index = LocationIndex(
+    os.environ.get('LOCATION_INDEX_PATH', os.path.join(app.instance_path, 'locations.db'))
+)
+
+def location_response(key, fallback):
+    """Serve a location list from the offline index, then the upstream cache,
+    then the bundled fallback data"""
+    entry = location_index.lookup(key)
+    if entry is None and os.environ.get('CSC_API_KEY'):
+        entry = location_cache.get(key)
+
+    if entry is not None:
+        response = app.response_class(entry.body, mimetype='application/json')
+        response.set_etag(entry.etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = location_cache.ttl
+        response.headers['Cache-Control'] += f', stale-while-revalidate={location_cache.stale_ttl}'
     else:
-        # Default fallback for unknown fields
-        message = "Field accepted"
+        response = jsonify(fallback)
+        response.add_etag()
+        response.cache_control.public = True
+        # Retry the upstream soon rather than pinning the fallback in browsers
+        response.cache_control.max_age = 60
 
-    return jsonify({"valid": True, "message": message})
+    return response.make_conditional(request)
 
-# ==================== LOCATION API ROUTES (WITH FALLBACK) ====================
+@app.route('/admin/location-stats')
+@login_required
+def location_stats():
+    """Location cache and upstream client counters"""
+    return jsonify({
+        'cache': dict(location_cache.stats, entries=len(location_cache)),
+        'upstream': location_upstream.stats()
+    })
 
 @app.route('/api/countries', methods=['GET'])
 def get_countries():
-    api_key = os.environ.get('CSC_API_KEY')
-    
-    # Try fetching from API if key exists
-    if api_key:
-        try:
-            response = http_requests.get(
-                "https://api.countrystatecity.in/v1/countries", 
-                headers={"API-Key": api_key},
-                timeout=5
-            )
-            if response.status_code == 200:
-                return jsonify(response.json())
-        except Exception as e:
-            print(f"⚠️ Location API Error: {str(e)}")
-            
-    # Fallback Data
-    return jsonify([
-        {"id": 101, "name": "India", "iso2": "IN"},
-        {"id": 231, "name": "United States", "iso2": "US"},
-        {"id": 230, "name": "United Kingdom", "iso2": "GB"},
-        {"id": 38, "name": "Canada", "iso2": "CA"},
-        {"id": 13, "name": "Australia", "iso2": "AU"}
-    ])
+    return location_response(('countries',), FALLBACK_COUNTRIES)
 
 @app.route('/api/states/<int:country_id>', methods=['GET'])
 def get_states(country_id):
-    api_key = os.environ.get('CSC_API_KEY')
-    
-    # Try fetching from API
-    if api_key:
-        try:
-            response = http_requests.get(
-                f"https://api.countrystatecity.in/v1/countries/{country_id}/states", 
-                headers={"API-Key": api_key},
-                timeout=5
-            )
-            if response.status_code == 200:
-                return jsonify(response.json())
-        except Exception:
-            pass
-            
-    # Fallback Data
-    fallbacks = {
-        101: [{"id": 4026, "name": "Karnataka"}, {"id": 4023, "name": "Maharashtra"}, {"id": 4035, "name": "Tamil Nadu"}, {"id": 4008, "name": "Delhi"}],
-        231: [{"id": 3919, "name": "California"}, {"id": 3951, "name": "New York"}, {"id": 3970, "name": "Texas"}, {"id": 3932, "name": "Florida"}]
-    }
-    return jsonify(fallbacks.get(country_id, [{"id": 0, "name": "State Selection Not Available (No API Key)"}]))
+    return location_response(
+        ('states', country_id),
+        FALLBACK_STATES.get(country_id, [{"id": 0, "name": "State Selection Not Available (No API Key)"}])
+    )
 
 @app.route('/api/cities/<int:country_id>/<int:state_id>', methods=['GET'])
 def get_cities(country_id, state_id):
-    api_key = os.environ.get('CSC_API_KEY')
-    
-    # Try fetching from API
-    if api_key:
-        try:
-            response = http_requests.get(
-                f"https://api.countrystatecity.in/v1/countries/{country_id}/states/{state_id}/cities", 
-                headers={"API-Key": api_key},
-                timeout=5
-            )
-            if response.status_code == 200:
-                return jsonify(response.json())
-        except Exception:
-            pass
-            
-    # Fallback Data
-    fallbacks = {
-        4026: [{"id": 1, "name": "Bangalore"}, {"id": 2, "name": "Mysore"}, {"id": 3, "name": "Hubli"}],
-        4023: [{"id": 4, "name": "Mumbai"}, {"id": 5, "name": "Pune"}, {"id": 6, "name": "Nagpur"}],
-        3919: [{"id": 7, "name": "Los Angeles"}, {"id": 8, "name": "San Francisco"}, {"id": 9, "name": "San Diego"}],
-        3951: [{"id": 10, "name": "New York City"}, {"id": 11, "name": "Buffalo"}, {"id": 12, "name": "Albany"}]
-    }
-    return jsonify(fallbacks.get(state_id, [{"id": 0, "name": "City Selection Not Available"}]))
+    return location_response(
+        ('cities', country_id, state_id),
+        FALLBACK_CITIES.get(state_id, [{"id": 0, "name": "City Selection Not Available"}])
+    )
+
+# ==================== PROFILE PHOTOS ====================
+
+@app.route('/photos/<digest>/<size>.<ext>', methods=['GET'])
+def profile_photo(digest, size, ext):
+    """Serve a stored photo. URLs are content-addressed, so they never change."""
+    if size != 'original' and size not in photo_store.sizes:
+        return jsonify({'error': 'Unknown photo size'}), 404
+    if not parse_ref(f'blob:{digest}.{ext}'):
+        return jsonify({'error': 'Photo not found'}), 404
+
+    path = photo_store.path_for(digest, ext, size)
+    if not os.path.exists(path):
+        return jsonify({'error': 'Photo not found'}), 404
+
+    response = send_file(
+        os.path.abspath(path),
+        mimetype=photo_store.mimetype_for(ext, size),
+        etag=f'{digest}-{size}',
+        conditional=True,
+        max_age=31536000
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 # ==================== ADMIN ROUTES ====================
 
@@ -584,10 +1253,19 @@ def admin_login():
         
         admin = Admin.query.filter_by(admin_username=username).first()
         
-        if admin and check_password_hash(admin.password_hash, password):
-            login_user(admin)
-            admin.last_login = datetime.utcnow()
-            db.session.commit()
+        try:
+            valid = admin is not None and password_hasher.verify(admin.password_hash, password)
+        except PoolSaturated as e:
+            flash('Server is busy, please try again in a moment', 'error')
+            response = app.make_response((render_template('admin_login.html'), 503))
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+        
+        if valid:
+            identity = AdminIdentity.of(admin)
+            login_user(identity)
+            admin_identities.put(identity)
+            last_logins.record(admin.id, datetime.utcnow())
             flash('Login successful!', 'success')
             return redirect(url_for('admin_dashboard'))
         else:
@@ -607,92 +1285,219 @@ def admin_logout():
 @login_required
 def admin_dashboard():
     """Admin dashboard with all user data"""
-    page = request.args.get('page', 1, type=int)
-    per_page = 20
-    
-    search_query = request.args.get('search', '')
-    
-    if search_query:
-        users = User.query.filter(
-            db.or_(
-                User.first_name.ilike(f'%{search_query}%'),
-                User.last_name.ilike(f'%{search_query}%'),
-                User.username.ilike(f'%{search_query}%'),
-                User.email.ilike(f'%{search_query}%')
-            )
-        ).order_by(User.created_at.desc()).paginate(page=page, per_page=per_page)
-    else:
-        users = User.query.order_by(User.created_at.desc()).paginate(page=page, per_page=per_page)
+    cursor = request.args.get('cursor')
+    search_query = request.args.get('search', '').strip()
+    
+    query = User.query_view('list')
+    try:
+        if search_query:
+            # Ranked results have no seekable key, so search pages by offset
+            matches = get_user_search().apply(query, search_query)
+            users = offset_page(matches, cursor, DASHBOARD_PAGE_SIZE)
+            # The card shows how many users match, not how many there are
+            users.total = matches.order_by(None).count()
+        else:
+            users = dashboard_pages.page(query, cursor, DASHBOARD_PAGE_SIZE)
+            users.total = user_count.get()
+    except InvalidCursor:
+        return redirect(url_for('admin_dashboard', search=search_query or None))
     
     return render_template('admin_dashboard.html', users=users, search_query=search_query)
 
+@app.route('/admin/analytics')
+@login_required
+def analytics_page():
+    """Registration analytics panel"""
+    days = max(request.args.get('days', ANALYTICS_DAYS, type=int), 1)
+    return render_template('admin_analytics.html', stats=read_analytics(days), days=days, total=user_count.get())
+
+@app.route('/admin/analytics/data')
+@login_required
+def analytics_data():
+    """Registrations per day, country, education level and age band as JSON"""
+    days = max(request.args.get('days', ANALYTICS_DAYS, type=int), 1)
+    return jsonify({dimension: [{'bucket': bucket, 'total': total} for bucket, total in buckets]
+                    for dimension, buckets in read_analytics(days).items()})
+
 @app.route('/admin/export-csv')
 @login_required
 def export_csv():
-    """Export all user data to CSV"""
-    users = User.query.order_by(User.created_at.desc()).all()
-    
-    # Create CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write headers
-    headers = ['ID', 'First Name', 'Last Name', 'Username', 'Email', 'Mobile', 
-               'Date of Birth', 'Age', 'Gender', 'Address', 'Postal Code', 
-               'Country', 'State', 'City', 'Education', 'Security Question', 
-               'Guardian Name', 'Guardian Email', 'Guardian Phone', 
-               'Registration Date']
-    writer.writerow(headers)
-    
-    # Write data
-    for user in users:
-        writer.writerow([
-            user.id,
-            user.first_name,
-            user.last_name,
-            user.username,
-            user.email,
-            user.mobile,
-            user.dob.strftime('%Y-%m-%d'),
-            user.age,
-            user.gender,
-            user.address,
-            user.postal_code,
-            user.country,
-            user.state,
-            user.city,
-            user.education,
-            user.security_question,
-            user.guardian_name or '',
-            user.guardian_email or '',
-            user.guardian_phone or '',
-            user.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        ])
-    
-    # Prepare response
-    output.seek(0)
-    return send_file(
-        io.BytesIO(output.getvalue().encode('utf-8')),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'registrations_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+    """Export user data to CSV, streamed as it is read from the database"""
+    try:
+        columns, start, end = parse_export_args(request.args)
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('admin_dashboard'))
+    
+    header = [EXPORT_COLUMNS[name][0] for name in columns]
+    formatters = [EXPORT_COLUMNS[name][1] for name in columns]
+    body = iter_csv(header, format_rows(formatters, export_rows(columns, start, end)))
+    filename = f'registrations_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+    mimetype = 'text/csv'
+    if request.args.get('gzip') == '1':
+        body = iter_gzip(body)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    
+    # No Content-Length: the body goes out with chunked transfer encoding
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
     )
 
+@app.route('/admin/exports', methods=['GET', 'POST'])
+@login_required
+def export_jobs_page():
+    """List export jobs (GET) or start one (POST, form or JSON)"""
+    if request.method == 'GET':
+        return render_template('admin_exports.html', jobs=export_jobs.recent(), formats=FORMATS,
+                               columns=EXPORT_COLUMNS, parquet_available=pa is not None)
+    
+    wants_json = request.is_json
+    if wants_json:
+        args = request.get_json(silent=True)
+        args = args if isinstance(args, dict) else {}
+        columns = args.get('columns')
+    else:
+        args = request.form.to_dict()
+        columns = request.form.getlist('columns')
+    if isinstance(columns, list):
+        args['columns'] = ','.join(columns)
+    try:
+        columns, start, end = parse_export_args(args)
+        job, created = export_jobs.submit(args.get('format', 'csv'), columns, start, end)
+    except ValueError as e:
+        if wants_json:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        flash(str(e), 'error')
+        return redirect(url_for('export_jobs_page'))
+    
+    if wants_json:
+        return jsonify(export_job_json(job)), 202 if created else 200
+    flash('Export started' if created else 'An identical export is already running', 'success')
+    return redirect(url_for('export_jobs_page'))
+
+@app.route('/admin/exports/<job_id>')
+@login_required
+def export_job_status(job_id):
+    """Poll an export job"""
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Export not found'}), 404
+    return jsonify(export_job_json(job))
+
+@app.route('/admin/exports/<job_id>/download')
+@login_required
+def download_export(job_id):
+    """Download a finished export (supports Range requests for resuming)"""
+    job = export_jobs.get(job_id)
+    if job is None or not os.path.exists(export_jobs.path_for(job)):
+        return jsonify({'success': False, 'message': 'Export not found'}), 404
+    if job.status != 'done':
+        return jsonify({'success': False, 'message': f'Export is {job.status}'}), 409
+    return send_file(export_jobs.path_for(job), mimetype=job.mimetype, as_attachment=True,
+                     download_name=job.filename, conditional=True)
+
+@app.route('/admin/import', methods=['GET', 'POST'])
+@login_required
+def import_users_page():
+    """Bulk-import users from an uploaded CSV or JSONL file (optionally gzipped)"""
+    if request.method == 'GET':
+        return render_template('admin_import.html', report=None)
+    
+    wants_json = request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+    upload = request.files.get('file')
+    try:
+        if upload is None or not upload.filename:
+            raise ImportFormatError('Choose a file to import')
+        fmt, gzipped = detect_format(upload.filename)
+        report = user_importer.run(read_records(upload.stream, fmt, gzipped), max_errors=IMPORT_REPORT_LIMIT)
+    except ImportFormatError as e:
+        message = str(e)
+        if e.report is not None and e.report.imported:
+            message += f' ({e.report.imported} rows before it were imported)'
+        if wants_json:
+            return jsonify({'success': False, 'message': message}), 400
+        flash(message, 'error')
+        return redirect(url_for('import_users_page'))
+    
+    logger.info('users imported', extra={'upload': upload.filename, 'imported': report.imported,
+                                         'rejected': report.rejected})
+    if wants_json:
+        return jsonify(dict(report.to_dict(), success=True))
+    return render_template('admin_import.html', report=report, filename=upload.filename)
+
+@app.route('/admin/users/bulk', methods=['POST'])
+@login_required
+def bulk_users():
+    """Delete or export a selection of users (form or JSON).
+
+    JSON deletes stream their progress as one JSON object per chunk.
+    """
+    wants_json = request.is_json
+    if wants_json:
+        args = request.get_json(silent=True)
+        args = args if isinstance(args, dict) else {}
+        ids = args.get('ids')
+        if isinstance(args.get('columns'), list):
+            args['columns'] = ','.join(args['columns'])
+    else:
+        args = request.form.to_dict()
+        ids = request.form.getlist('ids')
+    action = args.get('action')
+    
+    try:
+        if action not in ('delete', 'export'):
+            raise ValueError('Unknown bulk action')
+        ids = parse_selection(args, ids)
+        if not ids:
+            raise ValueError('No users selected')
+        if action == 'export':
+            columns, _, _ = parse_export_args(args)
+    except ValueError as e:
+        if wants_json:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        flash(str(e), 'error')
+        return redirect(url_for('admin_dashboard', search=args.get('search') or None))
+    
+    if action == 'export':
+        header = [EXPORT_COLUMNS[name][0] for name in columns]
+        formatters = [EXPORT_COLUMNS[name][1] for name in columns]
+        filename = f'registrations_selected_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        return Response(
+            stream_with_context(iter_csv(header, format_rows(formatters, selected_rows(columns, ids)))),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+    
+    if wants_json:
+        progress = (json.dumps(progress) + '\n' for progress in iter_delete_users(ids))
+        return Response(stream_with_context(progress), mimetype='application/x-ndjson')
+    
+    result = delete_users(ids)
+    flash(f"Deleted {result['deleted']} users ({result['photos_removed']} photos removed)", 'success')
+    return redirect(url_for('admin_dashboard', search=args.get('search') if args.get('scope') == 'search' else None))
+
 @app.route('/admin/user/<int:user_id>')
 @login_required
 def view_user(user_id):
     """View detailed user information"""
-    user = User.query.get_or_404(user_id)
-    return render_template('user_detail.html', user=user)
+    # A hit only costs this primary-key lookup; the full row is loaded to render
+    version = db.session.query(User.updated_at).filter_by(id=user_id).first()
+    if version is None:
+        abort(404)
+    page = cached_page(f'user-detail:{user_id}', version.updated_at, 'user_detail.html',
+                       lambda: render_template('user_detail.html', user=User.query_view('detail').get_or_404(user_id)))
+    return page.body
 
 @app.route('/admin/user/<int:user_id>/delete', methods=['POST'])
 @login_required
 def delete_user(user_id):
     """Delete a user"""
-    user = User.query.get_or_404(user_id)
+    user = User.query_view('key').get_or_404(user_id)
     username = user.username
-    db.session.delete(user)
-    db.session.commit()
+    delete_users([user.id])
     flash(f'User "{username}" deleted successfully', 'success')
     return redirect(url_for('admin_dashboard'))
 
@@ -700,7 +1505,8 @@ def delete_user(user_id):
 @app.after_request
 def add_header(response):
     """Disable caching for development"""
-    if app.debug:
+    # Responses that set their own public caching policy keep it
+    if app.debug and not response.cache_control.public:
         response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
         response.headers['Pragma'] = 'no-cache'
         response.headers['Expires'] = '-1'
@@ -712,13 +1518,26 @@ def init_db():
     """Initialize database and create default admin"""
     with app.app_context():
         db.create_all()
+        install_search_indexes()
+        availability.warm()
+        
+        # Databases from before the analytics table get it filled in once
+        if db.session.query(RegistrationStat.dimension).first() is None and User.exists():
+            with db.engine.begin() as connection:
+                buckets = registration_stats.rebuild(connection)
+            print(f"✓ Registration analytics built ({buckets} buckets)")
+        
+        # Unchanged files are not rewritten, so this only reads the sources
+        if ASSETS_BUILD_ON_START:
+            build_assets()
         
         # Create default admin if doesn't exist
         if not Admin.query.filter_by(admin_username='admin').first():
             default_admin = Admin(
                 admin_username='admin',
                 admin_email='admin@example.com',
-                password_hash=generate_password_hash('admin123')
+                # One-off at startup - not worth starting the hashing pool for
+                password_hash=generate_password_hash('admin123', method=password_hasher.method)
             )
             db.session.add(default_admin)
             db.session.commit()
@@ -730,6 +1549,168 @@ def init_db():
             print("⚠️  CHANGE THIS PASSWORD IMMEDIATELY!")
             print("="*60 + "\n")
 
+@app.cli.command('build-assets')
+@click.option('--clean', is_flag=True, help='Remove fingerprinted copies no longer in the manifest')
+def build_assets_command(clean):
+    """Fingerprint and precompress the static files"""
+    entries = build_assets(clean=clean)
+    for name, entry in sorted(entries.items()):
+        variants = ', '.join(f"{encoding} {size / 1024:.1f} KB" for encoding, size in entry['encodings'].items())
+        print(f"✓ {name} -> {entry['path']} ({entry['size'] / 1024:.1f} KB{', ' + variants if variants else ''})")
+    print(f"✅ {len(entries)} assets in {ASSETS_DIR}")
+
+@app.cli.command('db-info')
+def db_info():
+    """Show the database engine settings in effect"""
+    for name, value in db_config.describe(db.engine).items():
+        print(f"{name:>13}: {value}")
+
+@app.cli.command('migrate-photos')
+@click.option('--batch-size', default=100, show_default=True, help='Rows converted per commit')
+def migrate_photos(batch_size):
+    """Move base64 photos out of the users table into the photo store"""
+    converted = failed = 0
+    last_id = 0
+    while True:
+        users = (User.query_view('key')
+                 .filter(User.id > last_id, User.profile_photo.like('data:%'))
+                 .order_by(User.id)
+                 .limit(batch_size)
+                 .all())
+        if not users:
+            break
+
+        for user in users:
+            last_id = user.id
+            try:
+                user.profile_photo = photo_store.save_data_url(user.profile_photo)
+                converted += 1
+            except PhotoError as e:
+                failed += 1
+                print(f"⚠️ User {user.id}: {str(e)}")
+        db.session.commit()
+        print(f"✓ Converted {converted} photos so far...")
+
+    print(f"✅ Done. Converted: {converted}, failed: {failed}")
+
+@app.cli.command('build-locations')
+@click.argument('source', required=False)
+@click.option('--from-api', is_flag=True, help='Download the dataset from countrystatecity.in (needs CSC_API_KEY)')
+def build_locations(source, from_api):
+    """Build the offline location index.
+
+    SOURCE is a countries+states+cities.json file or a directory with
+    countries.json, states.json and cities.json. Without SOURCE or --from-api
+    the bundled fallback data is indexed.
+    """
+    if source:
+        countries, states, cities = load_dataset(source)
+    elif from_api:
+        if not os.environ.get('CSC_API_KEY'):
+            raise click.ClickException('CSC_API_KEY is not set')
+        countries, states, cities = fetch_location(('countries',)), [], []
+        for country in countries:
+            for state in fetch_location(('states', country['id'])):
+                states.append(dict(state, country_id=country['id']))
+                for city in fetch_location(('cities', country['id'], state['id'])):
+                    cities.append(dict(city, state_id=state['id']))
+            print(f"✓ {country['name']}: {len(states)} states, {len(cities)} cities so far")
+    else:
+        countries = FALLBACK_COUNTRIES
+        states = [dict(state, country_id=country_id)
+                  for country_id, items in FALLBACK_STATES.items() for state in items]
+        country_of_state = {state['id']: state['country_id'] for state in states}
+        cities = [dict(city, state_id=state_id)
+                  for state_id, items in FALLBACK_CITIES.items() if state_id in country_of_state
+                  for city in items]
+
+    written = build_location_index(location_index.path, countries, states, cities)
+    print(f"✅ Indexed {len(countries)} countries, {len(states)} states, {len(cities)} cities "
+          f"({written} lists) into {location_index.path}")
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index():
+    """Create (if missing) and rebuild the admin dashboard search index"""
+    install_search_indexes()
+    with db.engine.begin() as connection:
+        get_user_search().rebuild(connection)
+    print(f"✅ Search index rebuilt ({get_user_search().name})")
+
+@app.cli.command('check-availability-index')
+@click.option('--probes', default=10000, show_default=True, help='Random unused values used to measure false positives')
+def check_availability_index(probes):
+    """Rebuild the availability index and verify it against the users table"""
+    rows = availability.warm()
+    print(f"✓ Indexed {rows} users in {availability.stats['warmup_seconds'] * 1000:.1f} ms")
+    for key, value in availability.memory_stats().items():
+        print(f"   {key}: {value}")
+    
+    # Every stored value must be reported as possibly taken - no false negatives
+    missing = 0
+    for user_id, username, email in load_identities(0):
+        if not availability.might_exist('username', username) or not availability.might_exist('email', email):
+            missing += 1
+            print(f"❌ User {user_id} ({username}) missing from the index")
+    
+    false_positives = sum(availability.might_exist('username', secrets.token_hex(12)) for _ in range(probes))
+    print(f"✓ False positive rate: {false_positives / probes:.4%} over {probes} probes")
+    
+    if missing:
+        raise click.ClickException(f'{missing} users missing from the availability index')
+    print("✅ Availability index is consistent with the database")
+
+@app.cli.command('rebuild-analytics')
+@click.option('--verify-only', is_flag=True, help='Only compare the stored counts with the users table')
+def rebuild_analytics(verify_only):
+    """Recompute the registration analytics from the users table and verify them"""
+    with db.engine.begin() as connection:
+        if not verify_only:
+            buckets = registration_stats.rebuild(connection)
+            print(f"✓ Rebuilt {buckets} buckets")
+        mismatches = registration_stats.verify(connection)
+    
+    for dimension, bucket, stored, actual in mismatches[:20]:
+        print(f"❌ {dimension} {bucket}: stored {stored}, users table {actual}")
+    if mismatches:
+        raise click.ClickException(f'{len(mismatches)} analytics buckets differ from the users table')
+    print("✅ Registration analytics match the users table")
+
+@app.cli.command('import-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', default=IMPORT_CHUNK_SIZE, show_default=True, help='Rows validated and inserted per batch')
+@click.option('--report', 'report_path', type=click.Path(dir_okay=False), help='Write rejected rows to this CSV file')
+def import_users(path, chunk_size, report_path):
+    """Bulk-import users from a .csv or .jsonl file (optionally .gz)"""
+    try:
+        fmt, gzipped = detect_format(path)
+    except ImportFormatError as e:
+        raise click.ClickException(str(e))
+    
+    availability.warm()
+    importer = BulkImporter(prepare_import, find_taken, insert_users,
+                            conflicts=(IntegrityError,), chunk_size=chunk_size)
+    started = time.perf_counter()
+    try:
+        with open(path, 'rb') as f:
+            report = importer.run(read_records(f, fmt, gzipped),
+                                  progress=lambda report: print(f"✓ {report.imported} imported, "
+                                                                f"{report.rejected} rejected so far..."),
+                                  # Without a report file only the first few errors are printed
+                                  max_errors=None if report_path else 20)
+    except ImportFormatError as e:
+        imported = e.report.imported if e.report else 0
+        raise click.ClickException(f'{e} ({imported} rows imported before the error)')
+    
+    if report_path:
+        with open(report_path, 'w', newline='', encoding='utf-8') as f:
+            report.write_csv(f)
+    for row, field, message in report.errors[:20]:
+        print(f"❌ Row {row}: {field or 'row'}: {message}")
+    if len(report.errors) > 20 or report.truncated:
+        print("   ... more errors" + (f" in {report_path}" if report_path else ' - pass --report to save them all'))
+    print(f"✅ Imported {report.imported} users, rejected {report.rejected} rows "
+          f"in {time.perf_counter() - started:.1f}s")
+
 if __name__ == '__main__':
     init_db()
     print("\n" + "="*60)
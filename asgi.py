@@ -0,0 +1,340 @@
+"""Async serving mode.
+
+    uvicorn asgi:application --workers 4
+
+The form's hot endpoints - ``/api/validate``, the location lists and
+``/register`` - are served here as coroutines: database I/O goes through an
+async SQLAlchemy engine, password hashing and upstream location fetches are
+awaited on their existing pools, so a request that is waiting holds no
+thread. Every other route (admin pages, photos, exports) is the unchanged
+Flask app, mounted underneath.
+
+The rules, availability index, caches and pools are the ones app.py builds,
+so both modes behave the same. Needs the optional dependencies listed in
+requirements.txt (starlette, uvicorn, a2wsgi and an async driver such as
+aiosqlite or asyncpg).
+"""
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from a2wsgi import WSGIMiddleware
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+from werkzeug.http import generate_etag, parse_etags
+
+import app as flask_module
+from app import (FALLBACK_CITIES, FALLBACK_COUNTRIES, FALLBACK_STATES, GROUP_COMMIT_TIMEOUT,
+                 GROUP_COMMIT_TIMEOUT_MESSAGE, DuplicateRegistration, User, availability, calculate_age, check_fields,
+                 location_cache, location_index, location_path, location_upstream, mark_taken, password_hasher,
+                 photo_store, query_tracker, record_request, registration_queue, registration_stats, store_photo,
+                 uniqueness_query, user_count)
+import db_config
+import request_log
+from group_commit import QueueFull
+from hashing import PoolSaturated
+from photo_store import PhotoError
+
+flask_app = flask_module.app
+
+# Sync driver -> async driver for the same database
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql',
+}
+
+REQUIRED_FIELDS = ['firstName', 'lastName', 'username', 'email', 'mobile',
+                   'dob', 'gender', 'address', 'postalCode', 'country',
+                   'state', 'city', 'education', 'password', 'securityQuestion',
+                   'securityAnswer', 'profilePhoto']
+
+engine = None
+
+
+def async_database_url():
+    if os.environ.get('ASYNC_DATABASE_URL'):
+        return os.environ['ASYNC_DATABASE_URL']
+    with flask_app.app_context():
+        # The engine URL, so relative SQLite paths resolve exactly as in app.py
+        url = flask_module.db.engine.url
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+@asynccontextmanager
+async def lifespan(_):
+    global engine
+    # Same startup as `python app.py`: tables, indexes, availability index
+    await run_in_threadpool(flask_module.init_db)
+    engine = create_async_engine(async_database_url(),
+                                 **dict({'pool_pre_ping': True}, **flask_app.config['SQLALCHEMY_ENGINE_OPTIONS']))
+    db_config.install_sqlite_pragmas(engine.sync_engine, flask_module.SQLITE_PRAGMAS)
+    yield
+    if registration_queue is not None:
+        await run_in_threadpool(registration_queue.shutdown)
+    await engine.dispose()
+    password_hasher.shutdown()
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def check_fields_sync(fields, password_value):
+    with flask_app.app_context():
+        return check_fields(fields, password_value)
+
+
+async def validate_async(fields, password_value=None):
+    """validate_form() with the uniqueness query on the async engine"""
+    # The availability index usually answers from memory, but its periodic
+    # catch-up (or a rebuild) queries through the Flask session - a thread,
+    # not the event loop, waits for that
+    results, pending = await run_in_threadpool(check_fields_sync, fields, password_value)
+    if pending:
+        async with engine.connect() as connection:
+            rows = (await connection.execute(uniqueness_query(pending))).all()
+        mark_taken(results, pending, rows)
+    return results
+
+# ==================== VALIDATION ====================
+
+async def api_validate(request):
+    data = await read_json(request) or {}
+    if not isinstance(data, dict):
+        return JSONResponse({"valid": False, "message": "Invalid JSON body"}, 400)
+
+    if 'fields' in data:
+        fields = data.get('fields')
+        if not isinstance(fields, dict) or not fields:
+            return JSONResponse({"valid": False, "message": "Fields are required"}, 400)
+
+        missing = [field for field, value in fields.items() if value is None]
+        results = await validate_async({field: value for field, value in fields.items() if value is not None},
+                                       data.get('passwordValue'))
+        for field in missing:
+            results[field] = (False, "Value is required")
+
+        return JSONResponse({
+            "valid": all(valid for valid, _ in results.values()),
+            "results": {field: {"valid": valid, "message": message} for field, (valid, message) in results.items()}
+        })
+
+    field = data.get('field')
+    value = data.get('value')
+    if not field or not isinstance(field, str) or value is None:
+        return JSONResponse({"valid": False, "message": "Field and value are required"}, 400)
+
+    valid, message = (await validate_async({field: value}, data.get('passwordValue')))[field]
+    return JSONResponse({"valid": valid, "message": message})
+
+# ==================== LOCATIONS ====================
+
+async def location_entry(key):
+    """Offline index, then the upstream cache; a miss awaits the shared
+    upstream client (coalescing, circuit breaker) instead of blocking"""
+    # The offline index is a SQLite file read
+    entry = await run_in_threadpool(location_index.lookup, key)
+    if entry is not None or not os.environ.get('CSC_API_KEY'):
+        return entry
+
+    entry = location_cache.peek(key)
+    if entry is None:
+        try:
+            data = await asyncio.wrap_future(location_upstream.submit(location_path(key)))
+        except Exception:
+            location_cache.record_error()
+            return None
+        entry = location_cache.put(key, data)
+    return entry
+
+
+async def location_response(request, key, fallback):
+    entry = await location_entry(key)
+    if entry is not None:
+        body, etag = entry.body, entry.etag
+        cache_control = (f'public, max-age={location_cache.ttl}, '
+                         f'stale-while-revalidate={location_cache.stale_ttl}')
+    else:
+        body = json.dumps(fallback).encode('utf-8')
+        etag = generate_etag(body)
+        # Retry the upstream soon rather than pinning the fallback in browsers
+        cache_control = 'public, max-age=60'
+
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': cache_control}
+    if parse_etags(request.headers.get('if-none-match')).contains(etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type='application/json', headers=headers)
+
+
+async def get_countries(request):
+    return await location_response(request, ('countries',), FALLBACK_COUNTRIES)
+
+
+async def get_states(request):
+    country_id = request.path_params['country_id']
+    return await location_response(
+        request, ('states', country_id),
+        FALLBACK_STATES.get(country_id, [{"id": 0, "name": "State Selection Not Available (No API Key)"}])
+    )
+
+
+async def get_cities(request):
+    country_id, state_id = request.path_params['country_id'], request.path_params['state_id']
+    return await location_response(
+        request, ('cities', country_id, state_id),
+        FALLBACK_CITIES.get(state_id, [{"id": 0, "name": "City Selection Not Available"}])
+    )
+
+# ==================== REGISTRATION ====================
+
+async def register(request):
+    data = await read_json(request)
+    if not isinstance(data, dict):
+        return JSONResponse({'success': False, 'message': 'Invalid JSON body'}, 400)
+
+    missing_fields = [field for field in REQUIRED_FIELDS if field not in data or not data[field]]
+    if missing_fields:
+        request_log.annotate(reason='missing_fields', fields=missing_fields)
+        return JSONResponse({'success': False, 'message': f'Missing required fields: {", ".join(missing_fields)}'}, 400)
+
+    validated = {field: data[field] for field in data if field != 'profilePhoto' and data[field]}
+    errors = {field: message for field, (valid, message) in (await validate_async(validated)).items() if not valid}
+    if errors:
+        field, message = next(iter(errors.items()))
+        request_log.annotate(reason='invalid_fields', fields=list(errors))
+        return JSONResponse({'success': False, 'message': f'{field}: {message}', 'errors': errors}, 400)
+
+    try:
+        dob = datetime.strptime(data['dob'], '%Y-%m-%d').date()
+    except ValueError:
+        request_log.annotate(reason='invalid_dob')
+        return JSONResponse({'success': False, 'message': 'Invalid date of birth format'}, 400)
+
+    age = calculate_age(dob)
+    if age < 13:
+        request_log.annotate(reason='under_age')
+        return JSONResponse({'success': False, 'message': 'Must be at least 13 years old to register'}, 400)
+
+    try:
+        password_hash = await password_hasher.hash_async(data['password'])
+    except PoolSaturated as e:
+        request_log.annotate(reason='hash_pool_saturated', retry_after=e.retry_after)
+        return JSONResponse({'success': False, 'message': 'Server is busy, please try again in a moment'}, 503,
+                            headers={'Retry-After': str(e.retry_after)})
+
+    try:
+        # Decoding is CPU work - keep it off the loop. Written once the row is committed.
+        photo = await run_in_threadpool(photo_store.decode_data_url, data['profilePhoto'])
+    except PhotoError as e:
+        request_log.annotate(reason='invalid_photo')
+        return JSONResponse({'success': False, 'message': str(e)}, 400)
+
+    row = dict(
+        first_name=data['firstName'], last_name=data['lastName'], username=data['username'],
+        email=data['email'], mobile=data['mobile'], dob=dob, age=age, gender=data['gender'],
+        address=data['address'], postal_code=data['postalCode'], country=data['country'],
+        state=data['state'], city=data['city'], education=data['education'], profile_photo=photo.ref,
+        security_question=data['securityQuestion'], security_answer=data['securityAnswer'],
+        password_hash=password_hash, guardian_name=data.get('guardianName'),
+        guardian_email=data.get('guardianEmail'), guardian_phone=data.get('guardianPhone'),
+        created_at=datetime.utcnow(),
+    )
+    if registration_queue is not None:
+        # The group-commit writer inserts it with the rest of its batch
+        try:
+            # shield(): a timeout must not cancel the queued row under the writer
+            user_id = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(registration_queue.submit(row))),
+                                             GROUP_COMMIT_TIMEOUT)
+        except QueueFull as e:
+            request_log.annotate(reason='registration_queue_full')
+            return JSONResponse({'success': False, 'message': 'Server is busy, please try again in a moment'}, 503,
+                                headers={'Retry-After': str(e.retry_after)})
+        except asyncio.TimeoutError:
+            request_log.annotate(reason='registration_queue_timeout')
+            await run_in_threadpool(store_photo, photo)
+            return JSONResponse({'success': False, 'message': GROUP_COMMIT_TIMEOUT_MESSAGE}, 504)
+        except DuplicateRegistration as e:
+            request_log.annotate(reason='duplicate', fields=[e.field] if e.field else [])
+            return JSONResponse(e.to_dict(), 400)
+    else:
+        try:
+            async with engine.begin() as connection:
+                result = await connection.execute(User.__table__.insert().values(**row))
+                # Counted in the same transaction as the insert
+                await connection.execute(registration_stats.upsert(engine.dialect.name),
+                                         registration_stats.changes([row]))
+        except IntegrityError:
+            # Lost a race with a concurrent registration for the same username/email
+            request_log.annotate(reason='duplicate')
+            return JSONResponse({'success': False, 'message': 'Username or email is already registered'}, 400)
+        user_id = result.inserted_primary_key[0]
+        availability.add(row['username'], row['email'])
+        user_count.adjust(1)
+    await run_in_threadpool(store_photo, photo)
+
+    request_log.annotate(user_id=user_id)
+
+    return JSONResponse({
+        'success': True,
+        'message': 'Registration successful!',
+        'user_id': user_id,
+        'username': row['username']
+    }, 201)
+
+
+async def server_error(request, exc):
+    """Unhandled errors answer in the API's JSON shape, not Starlette's plain text"""
+    return JSONResponse({'success': False, 'message': 'Server error, please try again'}, 500)
+
+
+def logged_route(path, endpoint, methods):
+    """Per-request metrics and log record for a native route, the same as
+    the Flask app's request hooks (mounted Flask routes go through those)"""
+    async def handler(request):
+        started = time.perf_counter()
+        request_id = request_log.begin_request(request.headers.get('x-request-id', '')[:64] or None)
+        query_tracker.start()
+
+        def finish(status):
+            elapsed = time.perf_counter() - started
+            record_request(request.method, path, status, elapsed)
+            request_log.log_request(request.method, path, status, elapsed * 1000, endpoint=endpoint.__name__)
+
+        try:
+            response = await endpoint(request)
+        except Exception as e:
+            request_log.get_logger().exception('unhandled error')
+            response = await server_error(request, e)
+        finish(response.status_code)
+        response.headers['X-Request-ID'] = request_id
+        return response
+    return Route(path, handler, methods=methods)
+
+
+routes = [
+    logged_route('/api/validate', api_validate, ['POST']),
+    logged_route('/api/countries', get_countries, ['GET']),
+    logged_route('/api/states/{country_id:int}', get_states, ['GET']),
+    logged_route('/api/cities/{country_id:int}/{state_id:int}', get_cities, ['GET']),
+    logged_route('/register', register, ['POST']),
+    # Everything else is the Flask app, run in a thread pool
+    Mount('/', app=WSGIMiddleware(flask_app)),
+]
+
+application = Starlette(routes=routes, lifespan=lifespan, exception_handlers={Exception: server_error})
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run('asgi:application', host='0.0.0.0', port=int(os.environ.get('PORT', 5000)),
+                workers=int(os.environ.get('WEB_CONCURRENCY', 1)))
@@ -0,0 +1,166 @@
+"""Fingerprinted static assets.
+
+``build()`` copies every file under the static folder to
+``<output>/<name>.<hash>.<ext>``, where the hash is taken from the content,
+together with gzip and brotli variants of the text files. It also writes a
+``manifest.json`` mapping the original names to the copies. Because a
+changed file gets a new name, the copies can be cached by browsers forever
+(``immutable``). Page renders resolve ``url_for('static', ...)`` through the
+manifest with one dict lookup, and never touch the filesystem.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+try:
+    import brotli
+except ImportError:  # brotli is optional - without it only gzip variants are built
+    brotli = None
+
+MANIFEST = 'manifest.json'
+
+# Worth precompressing; images and fonts are compressed already
+COMPRESSIBLE = {'.css', '.js', '.mjs', '.json', '.map', '.svg', '.txt', '.html', '.xml', '.ico'}
+
+# Smallest file worth a compressed variant
+MIN_COMPRESS_BYTES = 512
+
+# Preference order when the client accepts several
+ENCODINGS = ('br', 'gzip')
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def fingerprint(data, length=12):
+    return hashlib.sha256(data).hexdigest()[:length]
+
+
+def hashed_name(name, digest):
+    """'js/script.js' -> 'js/script.<digest>.js'"""
+    root, ext = os.path.splitext(name)
+    return f'{root}.{digest}{ext}'
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def available_encodings():
+    return [encoding for encoding in ENCODINGS if encoding != 'br' or brotli is not None]
+
+
+def iter_sources(static_dir, exclude=()):
+    """Relative paths (with / separators) of the files to fingerprint"""
+    skipped = {os.path.abspath(path) for path in exclude}
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.abspath(os.path.join(root, d)) not in skipped
+                         and not d.startswith('.'))
+        for name in sorted(files):
+            if not name.startswith('.'):
+                yield os.path.relpath(os.path.join(root, name), static_dir).replace(os.sep, '/')
+
+
+def write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = f'{path}.{os.getpid()}.tmp'
+    with open(temp, 'wb') as f:
+        f.write(data)
+    os.replace(temp, path)
+
+
+def build(static_dir, output_dir, exclude=(), clean=False):
+    """Fingerprint and precompress the static folder; returns the manifest.
+
+    Files whose hashed copy already exists are not rewritten, so running it
+    at every start only costs reading the sources. ``clean`` removes copies
+    that are no longer in the manifest.
+    """
+    encodings = available_encodings()
+    manifest = {}
+    for name in iter_sources(static_dir, exclude=(output_dir, *exclude)):
+        with open(os.path.join(static_dir, name), 'rb') as f:
+            data = f.read()
+        output = hashed_name(name, fingerprint(data))
+        entry = {'path': output, 'size': len(data), 'encodings': {}}
+
+        target = os.path.join(output_dir, output)
+        if not os.path.exists(target):
+            write_atomic(target, data)
+        if os.path.splitext(name)[1].lower() in COMPRESSIBLE and len(data) >= MIN_COMPRESS_BYTES:
+            for encoding in encodings:
+                variant = target + SUFFIXES[encoding]
+                if os.path.exists(variant):
+                    size = os.path.getsize(variant)
+                else:
+                    compressed = compress(data, encoding)
+                    if len(compressed) >= len(data):
+                        continue
+                    write_atomic(variant, compressed)
+                    size = len(compressed)
+                entry['encodings'][encoding] = size
+        manifest[name] = entry
+
+    write_atomic(os.path.join(output_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    if clean:
+        remove_stale(output_dir, manifest)
+    return manifest
+
+
+def remove_stale(output_dir, manifest):
+    keep = {MANIFEST}
+    for entry in manifest.values():
+        keep.add(entry['path'])
+        keep.update(entry['path'] + SUFFIXES[encoding] for encoding in entry['encodings'])
+    removed = 0
+    for name in iter_sources(output_dir):
+        if name not in keep:
+            os.remove(os.path.join(output_dir, name))
+            removed += 1
+    return removed
+
+
+class AssetManifest:
+    """The built manifest, held in memory.
+
+    ``url_path(name)`` is the fingerprinted path for a static file name (or
+    None when the file was not built); ``resolve(path, accept_encoding)``
+    finds the file to send for a fingerprinted path.
+    """
+
+    def __init__(self, output_dir, entries=None):
+        self.output_dir = output_dir
+        self.entries = entries or {}
+        self._by_path = {entry['path']: entry for entry in self.entries.values()}
+        # Changes whenever any asset does - pages that link to assets are cached per version
+        self.version = fingerprint(''.join(sorted(self._by_path)).encode('utf-8'))
+
+    @classmethod
+    def load(cls, output_dir):
+        try:
+            with open(os.path.join(output_dir, MANIFEST), encoding='utf-8') as f:
+                return cls(output_dir, json.load(f))
+        except (OSError, ValueError):
+            return cls(output_dir)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def url_path(self, name):
+        entry = self.entries.get(name)
+        return entry['path'] if entry else None
+
+    def resolve(self, path, accept_encoding=None):
+        """(file path, mimetype, content encoding or None), or None for an
+        unknown path. ``accept_encoding`` is a werkzeug Accept object."""
+        entry = self._by_path.get(path)
+        if entry is None:
+            return None
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        file_path = os.path.join(self.output_dir, path)
+        for encoding in ENCODINGS:
+            if encoding in entry['encodings'] and accept_encoding and accept_encoding[encoding]:
+                return file_path + SUFFIXES[encoding], mimetype, encoding
+        return file_path, mimetype, None
@@ -0,0 +1,213 @@
+"""In-process availability index for usernames and emails.
+
+Every existing username and email is added to a Bloom filter. A lookup that
+misses the filter means the value is definitely not in the users table, so
+the keystroke-driven availability checks can answer without a query; only
+possible hits fall through to the database.
+
+The filter is built at startup and updated on register. Rows inserted by
+other worker processes are picked up by a cheap id-range catch-up at most
+every ``refresh_interval`` seconds. The catch-up re-reads the last
+``lookback`` ids below the high-water mark, because on PostgreSQL and MySQL
+a row can commit after a row with a higher id. Deleted users cannot be
+removed from a Bloom filter; they only cause extra fall-through queries,
+and the filter is rebuilt once deletes pile up. Rebuilds and catch-ups
+query outside the lock, so lookups keep answering from the current filter.
+"""
+import hashlib
+import math
+import threading
+import time
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.size = max(int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)), 64)
+        self.hashes = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add(self, item):
+        bits = self.bits
+        for position in self._positions(item):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        bits = self.bits
+        for position in self._positions(item):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    @property
+    def memory_bytes(self):
+        return len(self.bits)
+
+
+class AvailabilityIndex:
+    """``loader(since_id)`` yields ``(id, username, email)`` rows with
+    ``id > since_id`` in id order; ``counter()`` returns the current row
+    count so the filter can be sized before streaming the rows."""
+
+    def __init__(self, loader, counter, error_rate=0.01, refresh_interval=5, lookback=1000,
+                 clock=time.monotonic):
+        self.loader = loader
+        self.counter = counter
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.lookback = lookback
+        self.clock = clock
+
+        self._lock = threading.RLock()
+        # Held for a whole rebuild, so only one runs at a time
+        self._build_lock = threading.Lock()
+        self._filter = None
+        self._high_water = 0
+        self._deletes = 0
+        self._checked_at = 0.0
+        # Values add()ed while a rebuild is reading the table, replayed into the new filter
+        self._added_during_build = None
+        self.stats = {'lookups': 0, 'definitely_available': 0, 'possible_hits': 0,
+                      'rebuilds': 0, 'warmup_seconds': 0.0, 'caught_up_rows': 0}
+
+    @staticmethod
+    def _key(kind, value):
+        # Case-folded: a case variant is at worst a false positive that
+        # falls through to the (authoritative) database check
+        return f'{kind}\x00{value.lower()}'
+
+    # ---------- build / refresh ----------
+
+    def warm(self):
+        """(Re)build the filter from the database. Returns the rows loaded."""
+        with self._build_lock:
+            return self._build()
+
+    def _build(self):
+        started = time.perf_counter()
+        with self._lock:
+            self._added_during_build = []
+        try:
+            # Two keys per row, with 2x headroom for growth before a rebuild
+            bloom = BloomFilter(max(self.counter(), 5000) * 2 * 2, self.error_rate)
+            high_water = rows = 0
+            for user_id, username, email in self.loader(0):
+                self._add(bloom, username, email)
+                high_water = max(high_water, user_id)
+                rows += 1
+        except Exception:
+            with self._lock:
+                self._added_during_build = None
+            raise
+
+        with self._lock:
+            for username, email in self._added_during_build:
+                self._add(bloom, username, email)
+            self._added_during_build = None
+            self._filter = bloom
+            self._high_water = high_water
+            self._deletes = 0
+            self._checked_at = self.clock()
+            self.stats['rebuilds'] += 1
+            self.stats['warmup_seconds'] = time.perf_counter() - started
+        return rows
+
+    def _refresh(self):
+        if self._filter is None:
+            # First use: nothing to answer from yet, so wait for the build
+            with self._build_lock:
+                if self._filter is None:
+                    self._build()
+            return
+
+        with self._lock:
+            if self.clock() - self._checked_at < self.refresh_interval:
+                return
+            self._checked_at = self.clock()
+            bloom = self._filter
+            rebuild = bloom.count >= bloom.capacity or self._deletes * 10 > bloom.count
+            since = max(self._high_water - self.lookback, 0)
+
+        if rebuild:
+            # One thread rebuilds; the others keep using the current filter
+            if self._build_lock.acquire(blocking=False):
+                try:
+                    self._build()
+                finally:
+                    self._build_lock.release()
+            return
+
+        rows = list(self.loader(since))
+        with self._lock:
+            if self._filter is not bloom:
+                # Rebuilt meanwhile - the new filter already has these rows
+                return
+            for user_id, username, email in rows:
+                if self._add(bloom, username, email):
+                    self.stats['caught_up_rows'] += 1
+                self._high_water = max(self._high_water, user_id)
+
+    # ---------- updates ----------
+
+    def _add(self, bloom, username, email):
+        """Add one user's keys; False when both were already present. Keys the
+        catch-up window reads again are skipped, so they don't count twice
+        towards the filter's capacity."""
+        added = False
+        for key in (self._key('username', username), self._key('email', email)):
+            if key not in bloom:
+                bloom.add(key)
+                added = True
+        return added
+
+    def add(self, username, email):
+        """Record a user inserted by this process. The high-water mark is left
+        alone so rows other workers inserted with lower ids still get caught up."""
+        with self._lock:
+            if self._filter is not None:
+                self._add(self._filter, username, email)
+            if self._added_during_build is not None:
+                self._added_during_build.append((username, email))
+
+    def discard(self, count=1):
+        """Record deleted users; the filter is rebuilt once they pile up"""
+        with self._lock:
+            self._deletes += count
+
+    # ---------- queries ----------
+
+    def might_exist(self, kind, value):
+        """False means the value is definitely not taken"""
+        self._refresh()
+        with self._lock:
+            hit = self._key(kind, value) in self._filter
+            self.stats['lookups'] += 1
+            self.stats['possible_hits' if hit else 'definitely_available'] += 1
+        return hit
+
+    def memory_stats(self):
+        with self._lock:
+            bloom = self._filter
+            if bloom is None:
+                return {'built': False}
+            return {
+                'built': True,
+                'keys': bloom.count,
+                'capacity': bloom.capacity,
+                'bits': bloom.size,
+                'hash_functions': bloom.hashes,
+                'memory_bytes': bloom.memory_bytes,
+                'pending_deletes': self._deletes,
+                'high_water_id': self._high_water,
+            }
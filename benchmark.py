@@ -0,0 +1,920 @@
+"""Micro-benchmarks for the hot paths of the registration backend.
+
+Usage:
+    python benchmark.py validate [--iterations N] [--validators path/to/validators.py]
+    python benchmark.py repeated-pattern [--iterations N] [--cases N]
+    python benchmark.py search [--sizes 10000 100000 1000000]
+    python benchmark.py pagination [--users N] [--pages 1 100 1000 5000]
+    python benchmark.py hashing [--methods scrypt:32768:8:1 pbkdf2:sha256:600000] [--workers N]
+    python benchmark.py load [--mode sync async] [--users 1000] [--duration 30] [--url http://host:port]
+    python benchmark.py import [--rows 100000] [--chunk-size 5000] [--baseline 1000]
+    python benchmark.py bulk-delete [--sizes 10 1000 10000] [--baseline 200]
+    python benchmark.py logging [--requests 5000] [--sample-rate 0.1] [--flush-ms 0.2]
+    python benchmark.py metrics [--requests 20000] [--queries 3]
+    python benchmark.py assets [--iterations 100000]
+    python benchmark.py page-cache [--users 50] [--iterations 500] [--backend memory file]
+    python benchmark.py stress-writers [--writers 16] [--registrations 25] [--mode default tuned]
+    python benchmark.py group-commit [--threads 32] [--registrations 20] [--synchronous NORMAL FULL]
+
+Pass ``--validators`` pointing at another checkout's validators.py to compare
+before/after numbers on the same machine.
+"""
+import argparse
+import importlib.util
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+# A realistic mix of accepted and rejected values per form field
+FORM_SAMPLES = {
+    'firstName': ['Ravi', 'Anne-Marie', 'R', 'test', 'xxxxxxxxxxxxxxxxxxxxxxxxx', "O'Brien"],
+    'lastName': ['Kumar', 'Sharma', 'ab', 'Qwrtzpkl', 'Smith Jr.'],
+    'username': ['ravi_kumar', 'admin', 'a', 'john.doe#1', 'abcabcabc', 'priya_s'],
+    'email': ['ravi.kumar@gmail.com', 'test@test.com', 'a..b@mail.com', 'not-an-email', 'priya@company.co.in'],
+    'mobile': ['9845012345', '1234567890', '98450', '6666666666', '7022334455'],
+    'password': ['Secure@Pass1', 'weak', 'NoSpecial123', 'Ab@1ababab', 'Tr0ub4dor&3x'],
+    'postalCode': ['560001', '111111', '56001', 'abcdef'],
+    'address': ['12 MG Road, Bangalore', 'short', '#45, 2nd Cross, Indiranagar, Bangalore - 560038', 'zzzzzzzzzzzz'],
+    'securityAnswer': ['Bruno', 'x', 'My first school'],
+    'dob': ['1995-05-17', '2020-01-01', '1850-01-01', 'bad-date'],
+    'country': ['101', ''],
+    'education': ['Masters', ''],
+}
+
+
+def load_module(path, name='bench_target'):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return time.perf_counter() - start
+
+
+def bench_validate(args):
+    if args.validators:
+        validators = load_module(args.validators)
+    else:
+        import validators
+
+    cases = [(field, value) for field, values in FORM_SAMPLES.items() for value in values]
+    context = {'passwordValue': 'Secure@Pass1'}
+    validate_field = validators.validate_field
+
+    def run():
+        for field, value in cases:
+            validate_field(field, value, context)
+
+    run()  # warm up
+    elapsed = timed(run, args.iterations)
+    total = args.iterations * len(cases)
+    print(f"validate_field: {total} validations in {elapsed:.3f}s "
+          f"-> {total / elapsed:,.0f} validations/sec ({elapsed / total * 1e6:.2f} us each)")
+
+
+def reference_has_repeated_pattern(value):
+    """The original two-pass implementation, kept as the equivalence oracle"""
+    for length in [2, 3]:
+        for i in range(len(value) - length * 3 + 1):
+            substring = value[i:i+length]
+            if substring * 3 == value[i:i+length*3]:
+                return True
+
+    if len(value) >= 8:
+        total_letters = len(re.findall(r'[a-zA-Z]', value))
+        consonants = len(re.findall(r'[bcdfghjklmnpqrstvwxyzBCDFGHJKLMNPQRSTVWXYZ]', value))
+        if total_letters > 0 and (consonants / total_letters) > 0.75:
+            return True
+
+    return False
+
+
+def random_strings(rng, count):
+    """Property-style inputs: small alphabets make periodic runs likely"""
+    alphabets = ['ab', 'abc', 'aB1', 'aeiou', 'bcdfg', 'abAB .-', 'xyz019#,',
+                 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 .,#-@\'é']
+    for _ in range(count):
+        alphabet = rng.choice(alphabets)
+        yield ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+
+
+REALISTIC_INPUTS = [
+    'Ravi', 'Kumar', 'Anne-Marie', 'ravi_kumar', 'priya.sharma@gmail.com', 'Secure@Pass1',
+    'My first school', '12 MG Road, Bangalore',
+    '#45, 2nd Cross, 4th Main, Indiranagar, Bangalore - 560038, Near Metro Station',
+    'Flat 302, Sunrise Apartments, Plot 17, Sector 21, Kharghar, Navi Mumbai 410210, Maharashtra, India, '
+    'opposite Central Park gate number 2 and behind the community hall',
+]
+
+ADVERSARIAL_INPUTS = [
+    # Near-misses: periodic runs broken just before the third repetition
+    ('abab' + 'c') * 40, ('abcabc' + 'd') * 28, 'ab' * 2 + 'a' + 'xy' * 2 + 'x',
+    # Long non-repeating text and consonant-only / vowel-only strings
+    ''.join(chr(ord('a') + (i * 7) % 26) for i in range(200)),
+    'bcdfghjklmnpqrstvwxz' * 10, 'aeiou' * 40,
+    # Runs found only at the very end
+    'Bangalore Road ' * 12 + 'xyxyxy',
+    'é' * 200, '',
+]
+
+
+def bench_repeated_pattern(args):
+    from validators import has_repeated_pattern
+
+    rng = random.Random(args.seed)
+    checked = 0
+    for value in list(random_strings(rng, args.cases)) + REALISTIC_INPUTS + ADVERSARIAL_INPUTS:
+        expected = reference_has_repeated_pattern(value)
+        if has_repeated_pattern(value) != expected:
+            raise SystemExit(f"MISMATCH for {value!r}: expected {expected}")
+        checked += 1
+    print(f"equivalence: {checked} inputs match the reference implementation")
+
+    for label, inputs in (('realistic', REALISTIC_INPUTS), ('adversarial', ADVERSARIAL_INPUTS)):
+        for name, fn in (('reference', reference_has_repeated_pattern), ('single-pass', has_repeated_pattern)):
+            elapsed = timed(lambda: [fn(value) for value in inputs], args.iterations)
+            calls = args.iterations * len(inputs)
+            print(f"{label:>11} {name:>11}: {calls / elapsed:>12,.0f} calls/sec ({elapsed / calls * 1e6:.2f} us each)")
+
+
+FIRST_NAMES = ['Ravi', 'Priya', 'Anita', 'Rahul', 'Sneha', 'Arjun', 'Kavya', 'Vikram', 'Meera', 'Karthik',
+               'Divya', 'Suresh', 'Lakshmi', 'Aditya', 'Pooja', 'Nikhil', 'Ananya', 'Rohan', 'Isha', 'Manoj']
+LAST_NAMES = ['Kumar', 'Sharma', 'Rao', 'Reddy', 'Iyer', 'Nair', 'Patel', 'Gupta', 'Singh', 'Menon',
+              'Joshi', 'Das', 'Shetty', 'Pillai', 'Verma', 'Bhat', 'Kulkarni', 'Mehta', 'Chopra', 'Hegde']
+DOMAINS = ['gmail.com', 'yahoo.co.in', 'outlook.com', 'company.in', 'mail.com']
+
+
+def setup_app_database(label):
+    """Import app.py against a throwaway SQLite database"""
+    path = os.path.join(tempfile.mkdtemp(prefix=f'bench-{label}-'), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    import app
+    return app
+
+
+def synthetic_users(start, count, rng):
+    """Rows for the users table as plain tuples, cheap enough for millions"""
+    from datetime import date, datetime, timedelta
+    base = datetime(2024, 1, 1)
+    for i in range(start, start + count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        username = f'{first.lower()}{last.lower()[:3]}{i}'
+        yield (first, last, username, f'{username}@{rng.choice(DOMAINS)}', '98450' + str(10000 + i % 90000),
+               date(1990, 1, 1), 34, 'Male', '12 MG Road, Bangalore', '560001', 'India', 'Karnataka',
+               'Bangalore', 'Masters', None, 'Pet name?', 'Bruno', '!',
+               # Stored in the same text format SQLAlchemy writes, so range predicates compare correctly
+               (base + timedelta(seconds=i * 7)).isoformat(' ', 'microseconds'))
+
+
+def seed_users(app_module, start, count, rng, batch=20000):
+    columns = ('first_name, last_name, username, email, mobile, dob, age, gender, address, postal_code, '
+               'country, state, city, education, profile_photo, security_question, security_answer, '
+               'password_hash, created_at')
+    sql = f'INSERT INTO users ({columns}) VALUES ({", ".join(["?"] * 19)})'
+    rows = synthetic_users(start, count, rng)
+    with app_module.db.engine.begin() as connection:
+        while True:
+            chunk = [row for _, row in zip(range(batch), rows)]
+            if not chunk:
+                break
+            connection.exec_driver_sql(sql, chunk)
+
+
+def bench_search(args):
+    app_module = setup_app_database('search')
+    from user_search import LikeSearch
+
+    rng = random.Random(args.seed)
+    queries = ['ravi', 'kumar', 'sharma', 'yahoo.co', 'priyarao12', 'zzqx']
+    seeded = 0
+    with app_module.app.app_context():
+        app_module.db.create_all()
+        User = app_module.User
+        indexed = app_module.get_user_search()
+        scan = LikeSearch(User)
+
+        for size in sorted(args.sizes):
+            started = time.perf_counter()
+            seed_users(app_module, seeded, size - seeded, rng)
+            seeded = size
+            app_module.install_search_indexes()
+            with app_module.db.engine.begin() as connection:
+                indexed.rebuild(connection)
+            print(f"\n{size:,} users (seeded + indexed in {time.perf_counter() - started:.1f}s)")
+
+            for backend in (scan, indexed):
+                timings = []
+                for query_text in queries:
+                    query = backend.apply(User.query_view('list'), query_text)
+                    started = time.perf_counter()
+                    for _ in range(args.repeat):
+                        # What the dashboard does: first page plus total count
+                        query.paginate(page=1, per_page=20, error_out=False)
+                    timings.append((time.perf_counter() - started) / args.repeat)
+                    app_module.db.session.rollback()
+                per_query = ', '.join(f'{q}={t * 1000:.1f}ms' for q, t in zip(queries, timings))
+                print(f"  {backend.name:>12}: mean {sum(timings) / len(timings) * 1000:8.2f} ms  ({per_query})")
+
+
+def bench_pagination(args):
+    app_module = setup_app_database('pagination')
+    rng = random.Random(args.seed)
+    per_page = app_module.DASHBOARD_PAGE_SIZE
+
+    with app_module.app.app_context():
+        app_module.db.create_all()
+        User = app_module.User
+        started = time.perf_counter()
+        seed_users(app_module, 0, args.users, rng)
+        print(f"{args.users:,} users seeded in {time.perf_counter() - started:.1f}s")
+
+        # Walk the keyset cursors once to find the token that starts each page
+        cursors, cursor = {}, None
+        for number in range(1, max(args.pages) + 1):
+            cursors[number] = cursor
+            page = app_module.dashboard_pages.page(User.query_view('list'), cursor, per_page)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+
+        for number in sorted(args.pages):
+            if number not in cursors:
+                print(f"  page {number:>6}: beyond the last page")
+                continue
+            offset_query = User.query_view('list').order_by(User.created_at.desc())
+            offset = timed(lambda: offset_query.paginate(page=number, per_page=per_page, error_out=False),
+                           args.repeat) / args.repeat
+            keyset = timed(lambda: app_module.dashboard_pages.page(User.query_view('list'), cursors[number], per_page),
+                           args.repeat) / args.repeat
+            app_module.db.session.rollback()
+            print(f"  page {number:>6}: OFFSET+COUNT {offset * 1000:8.2f} ms   keyset {keyset * 1000:6.2f} ms")
+
+
+def bench_hashing(args):
+    from concurrent.futures import ThreadPoolExecutor
+    from hashing import PasswordHasher
+
+    workers = args.workers or os.cpu_count() or 1
+    for method in args.methods:
+        inline = PasswordHasher(method, workers=0)
+        started = time.perf_counter()
+        for _ in range(args.hashes):
+            inline.hash('Secure@Pass1')
+        per_core = args.hashes / (time.perf_counter() - started)
+
+        pool = PasswordHasher(method, workers=workers, max_pending=workers * 4)
+        pool.hash('warm-up')  # start the worker processes outside the timing
+        total = args.hashes * workers
+        started = time.perf_counter()
+        # Like concurrent registrations: as many request threads as queue slots
+        with ThreadPoolExecutor(max_workers=workers * 4) as requests:
+            list(requests.map(lambda _: pool.hash('Secure@Pass1'), range(total)))
+        pooled = total / (time.perf_counter() - started)
+        pool.shutdown()
+
+        print(f"{method:>24}: {1000 / per_core:7.1f} ms/hash   {per_core:7.1f} registrations/sec/core inline   "
+              f"{pooled:7.1f}/sec with {workers} pool worker(s) ({pooled / workers:.1f}/core)")
+
+
+def import_record(row):
+    """A synthetic_users() row as the columns of an import file"""
+    return row[:5] + (row[5].isoformat(),) + row[7:14] + row[15:17]
+
+
+def bench_import(args):
+    import csv
+    from bulk_import import BulkImporter, read_records
+    from sqlalchemy.exc import IntegrityError
+
+    app_module = setup_app_database('import')
+    rng = random.Random(args.seed)
+    header = ['firstName', 'lastName', 'username', 'email', 'mobile', 'dob', 'gender', 'address', 'postalCode',
+              'country', 'state', 'city', 'education', 'securityQuestion', 'securityAnswer']
+    path = os.path.join(tempfile.mkdtemp(prefix='bench-import-file-'), 'users.csv')
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(import_record(row) for row in synthetic_users(0, args.rows, rng))
+    print(f"{args.rows:,} rows written to {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+    with app_module.app.app_context():
+        app_module.db.create_all()
+        app_module.install_search_indexes()
+        app_module.availability.warm()
+
+        # Baseline: what a loop over the registration path does - validate, add, commit per row
+        records = [dict(zip(header, import_record(row))) for row in synthetic_users(args.rows, args.baseline, rng)]
+        started = time.perf_counter()
+        for record in records:
+            results = app_module.validate_form(record)
+            row, _ = app_module.prepare_import(record, {})
+            if all(valid for valid, _ in results.values()) and row:
+                app_module.db.session.add(app_module.User(**row))
+                app_module.db.session.commit()
+        per_row = (time.perf_counter() - started) / len(records)
+        print(f"row at a time: {per_row * 1000:.2f} ms/row -> {per_row * args.rows:,.0f}s for {args.rows:,} rows")
+
+        importer = BulkImporter(app_module.prepare_import, app_module.find_taken, app_module.insert_users,
+                                conflicts=(IntegrityError,), chunk_size=args.chunk_size)
+        started = time.perf_counter()
+        with open(path, 'rb') as f:
+            report = importer.run(read_records(f, 'csv'))
+        elapsed = time.perf_counter() - started
+        print(f"bulk import:   {report.imported:,} imported, {report.rejected:,} rejected in {elapsed:.1f}s "
+              f"({report.imported / elapsed:,.0f} rows/s, chunks of {args.chunk_size})")
+
+
+def bench_bulk_delete(args):
+    from sqlalchemy import event, text
+
+    app_module = setup_app_database('bulk-delete')
+    db, User = app_module.db, app_module.User
+    rng = random.Random(args.seed)
+    with app_module.app.app_context():
+        db.create_all()
+        app_module.install_search_indexes()
+        seed_users(app_module, 0, sum(args.sizes) + args.baseline, rng)
+        # Every other user gets a (missing) photo so each chunk also runs the shared-photo check
+        with db.engine.begin() as connection:
+            connection.execute(text("UPDATE users SET profile_photo = :ref WHERE id % 2 = 0"),
+                               {'ref': 'blob:' + '0' * 64 + '.png'})
+        ids = [user_id for user_id, in db.session.query(User.id).order_by(User.id)]
+
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *_: statements.append(1))
+
+        # The old path: load, delete and commit one user per request
+        selection, ids = ids[:args.baseline], ids[args.baseline:]
+        started = time.perf_counter()
+        for user_id in selection:
+            db.session.delete(db.session.get(User, user_id))
+            db.session.commit()
+        per_row = (time.perf_counter() - started) / len(selection)
+        print(f"one by one: {len(statements) / len(selection):.0f} statements and {per_row * 1000:.2f} ms per user")
+
+        for size in args.sizes:
+            selection, ids = ids[:size], ids[size:]
+            statements.clear()
+            started = time.perf_counter()
+            for progress in app_module.iter_delete_users(selection):
+                pass
+            elapsed = time.perf_counter() - started
+            chunks = -(-size // app_module.BULK_CHUNK_SIZE)
+            print(f"{size:>8,} users: {progress['deleted']:,} deleted with {len(statements)} statements "
+                  f"in {chunks} chunk(s), {elapsed * 1000:.1f} ms ({per_row * size * 1000:,.0f} ms one by one)")
+
+
+SERVERS = {
+    # The current sync app: Flask's threaded server, as `python app.py` runs it (minus the reloader)
+    'sync': lambda port: [sys.executable, '-c',
+                          f'import app; app.init_db(); app.app.run(port={port}, threaded=True)'],
+    'async': lambda port: [sys.executable, '-m', 'uvicorn', 'asgi:application',
+                           '--port', str(port), '--log-level', 'warning'],
+}
+
+
+class SlowStream:
+    """A log destination whose flush takes a while, like a pipe into a busy
+    log shipper or a terminal over SSH"""
+
+    def __init__(self, path, delay):
+        self.file = open(path, 'w', encoding='utf-8')
+        self.delay = delay
+
+    def write(self, text):
+        return self.file.write(text)
+
+    def flush(self):
+        time.sleep(self.delay)
+        self.file.flush()
+
+
+def bench_logging(args):
+    import logging
+    import request_log
+
+    path = os.path.join(tempfile.mkdtemp(prefix='bench-logging-'), 'app.log')
+    out = SlowStream(path, args.flush_ms / 1000)
+    user = {'username': 'ravi_kumar', 'email': 'ravi.kumar@gmail.com', 'mobile': '9845012345'}
+    lines = ['=' * 60, '📥 Registration Request Received', '=' * 60, 'Name: Ravi Kumar',
+             *(f"{label}: {user[label.lower()]}" for label in ('Username', 'Email', 'Mobile')),
+             '✓ All validations passed', '✓ Creating user record...', '✅ SUCCESS! User registered:', '   ID: 1',
+             *(f"   {label}: {user[label.lower()]}" for label in ('Username', 'Email')), '   Age: 30 years', '=' * 60]
+
+    def one_request():
+        request_log.begin_request()
+        request_log.annotate(user_id=1)
+        request_log.log_request('POST', '/register', 201, 12.5, endpoint='register')
+        request_log.end_request()
+
+    # What register() printed per successful request; stdout is line buffered
+    # on a terminal and unbuffered under PYTHONUNBUFFERED, so each line flushes
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        for line in lines:
+            print(line, file=out, flush=True)
+    report_logging(f'{len(lines)} print() calls', started, args.requests)
+
+    # The same JSON record, formatted and written on the request thread
+    logger = request_log.get_logger()
+    handler = logging.StreamHandler(out)
+    handler.setFormatter(request_log.JsonFormatter())
+    handler.addFilter(request_log.ContextFilter())
+    logger.handlers[:] = [handler]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        one_request()
+    report_logging('JSON, synchronous', started, args.requests)
+
+    for rate in (1.0, args.sample_rate):
+        handler = request_log.configure(sample_rate=rate, queue_size=args.requests * 2, stream=out)
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            one_request()
+        report_logging(f'JSON, queued, sample {rate:g}', started, args.requests)
+        request_log.shutdown()
+    out.file.close()
+
+
+def report_logging(label, started, requests):
+    per_request = (time.perf_counter() - started) / requests
+    print(f"{label:>28}: {per_request * 1e6:8.1f} µs/request on the request thread")
+
+
+def bench_metrics(args):
+    from sqlalchemy import create_engine, text
+    from metrics import QueryTracker, Registry
+
+    def run(engine, tracker, registry):
+        histogram = registry.histogram('bench_request_duration_seconds', 'bench', ['method', 'route'])
+        counter = registry.counter('bench_requests_total', 'bench', ['method', 'route', 'status'])
+        with engine.connect() as connection:
+            started = time.perf_counter()
+            for _ in range(args.requests):
+                request_started = time.perf_counter()
+                if tracker:
+                    tracker.start()
+                for _ in range(args.queries):
+                    connection.execute(text('SELECT 1'))
+                if tracker:
+                    tracker.finish()
+                    histogram.observe(time.perf_counter() - request_started, 'POST', '/register')
+                    counter.inc('POST', '/register', '201')
+            return (time.perf_counter() - started) / args.requests
+
+    plain = run(create_engine('sqlite://'), None, Registry())
+    registry = Registry()
+    tracker = QueryTracker(registry)
+    engine = create_engine('sqlite://')
+    tracker.install(engine)
+    instrumented = run(engine, tracker, registry)
+    print(f"{args.queries} statements/request: {plain * 1e6:.1f} µs bare, {instrumented * 1e6:.1f} µs instrumented "
+          f"-> {(instrumented - plain) * 1e6:.1f} µs/request of metrics overhead")
+    started = time.perf_counter()
+    body = registry.render()
+    print(f"/metrics render: {(time.perf_counter() - started) * 1000:.2f} ms, {len(body.splitlines())} lines")
+
+
+def reference_dated_url_for(app_module, endpoint, **values):
+    """The mtime cache-buster asset_url_for() replaced: two stat calls per static URL"""
+    if endpoint == 'static':
+        filename = values.get('filename', None)
+        if filename:
+            file_path = os.path.join(app_module.app.root_path, endpoint, filename)
+            if os.path.exists(file_path):
+                values['q'] = int(os.stat(file_path).st_mtime)
+    return app_module.url_for(endpoint, **values)
+
+
+def bench_assets(args):
+    import shutil
+
+    workdir = tempfile.mkdtemp(prefix='bench-assets-')
+    os.environ['ASSETS_DIR'] = os.path.join(workdir, 'assets')
+    app_module = setup_app_database('assets')
+    app = app_module.app
+    here = os.path.dirname(os.path.abspath(__file__))
+    if not os.path.exists(os.path.join(app.static_folder, 'script.js')):
+        # Flat checkout: stage the form's assets the way the readme lays them out
+        app.static_folder = os.path.join(workdir, 'static')
+        os.makedirs(app.static_folder)
+        for name in ('script.js', 'style.css'):
+            shutil.copy(os.path.join(here, name), app.static_folder)
+        app.root_path = workdir
+
+    started = time.perf_counter()
+    entries = app_module.build_assets()
+    print(f"build: {len(entries)} assets in {(time.perf_counter() - started) * 1000:.0f} ms")
+    started = time.perf_counter()
+    app_module.build_assets()
+    print(f"rebuild, nothing changed: {(time.perf_counter() - started) * 1000:.1f} ms")
+    for name, entry in sorted(entries.items()):
+        sizes = ', '.join(f"{encoding} {size:,}" for encoding, size in entry['encodings'].items())
+        print(f"   {name}: {entry['size']:,} bytes -> {sizes or 'not compressed'}")
+
+    with app.test_request_context('/'):
+        candidates = {
+            'mtime query string': lambda: reference_dated_url_for(app_module, 'static', filename='script.js'),
+            'manifest lookup': lambda: app_module.asset_url_for('static', filename='script.js'),
+        }
+        for label, fn in candidates.items():
+            elapsed = timed(fn, args.iterations)
+            print(f"{label:>20}: {elapsed / args.iterations * 1e6:6.2f} µs per url_for -> {fn()}")
+
+
+def bench_page_cache(args):
+    import jinja2
+    from sqlalchemy import text
+    from page_cache import FileBackend, MemoryBackend, PageCache
+
+    workdir = tempfile.mkdtemp(prefix='bench-page-cache-')
+    app_module = setup_app_database('page-cache')
+    app = app_module.app
+    here = os.path.dirname(os.path.abspath(__file__))
+    if not os.path.exists(os.path.join(app.root_path, app.template_folder, 'index.html')):
+        # Flat checkout: the templates sit next to app.py
+        app.jinja_loader = jinja2.FileSystemLoader(here)
+    app.config['LOGIN_DISABLED'] = True
+    backends = {
+        'memory': lambda: MemoryBackend(32 * 1024 * 1024),
+        'file': lambda: FileBackend(os.path.join(workdir, 'page_cache'), 32 * 1024 * 1024),
+    }
+
+    with app.app_context():
+        app_module.db.create_all()
+        app_module.install_search_indexes()
+        seed_users(app_module, 0, args.users, random.Random(0))
+        with app_module.db.engine.begin() as connection:
+            connection.execute(text('UPDATE users SET updated_at = created_at'))
+        user_id = app_module.db.session.query(app_module.User.id).limit(1).scalar()
+    client = app.test_client()
+    pages = {'index': '/', 'dashboard': '/admin/dashboard', 'user detail': f'/admin/user/{user_id}'}
+
+    for backend in args.backend:
+        app_module.page_cache = PageCache(backends[backend]())
+        for label, path in pages.items():
+            # Debug mode bypasses the cache: every request renders
+            app.debug = True
+            cold = timed(lambda: client.get(path), args.iterations)
+            app.debug = False
+            client.get(path)
+            warm = timed(lambda: client.get(path), args.iterations)
+            print(f"{backend:>6} {label:>12}: {cold / args.iterations * 1000:6.2f} ms uncached, "
+                  f"{warm / args.iterations * 1000:6.2f} ms cached ({cold / warm:.1f}x)")
+        etag = client.get('/').headers['ETag']
+        revalidate = timed(lambda: client.get('/', headers={'If-None-Match': etag}), args.iterations)
+        print(f"{backend:>6} {'index 304':>12}: {revalidate / args.iterations * 1000:6.2f} ms")
+        print(f"{backend:>6} counters: {app_module.page_cache.counters()}")
+
+
+# SQLite settings before db_config.py (the library defaults) and with it
+WRITER_MODES = {
+    'default': {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL', 'SQLITE_BUSY_TIMEOUT_MS': '5000',
+                'SQLITE_MMAP_SIZE': '0'},
+    'tuned': {},
+}
+
+
+def stress_writer(number, registrations, start_at):
+    """One worker process: a validate call and a registration, over and over"""
+    import app as app_module
+    client = app_module.app.test_client()
+    photo = sample_photo()
+    outcomes = {}
+    latencies = []
+    time.sleep(max(start_at - time.time(), 0))
+    for attempt in range(registrations):
+        username = f'writer{number}x{attempt}'
+        client.post('/api/validate', json={'field': 'username', 'value': username})
+        started = time.perf_counter()
+        response = client.post('/register', json={
+            'firstName': 'Ravi', 'lastName': 'Kumar', 'username': username, 'email': f'{username}@mail.com',
+            'mobile': '9845012345', 'dob': '1995-05-17', 'gender': 'Male', 'address': '12 MG Road, Bangalore',
+            'postalCode': '560001', 'country': 'India', 'state': 'Karnataka', 'city': 'Bangalore',
+            'education': 'Masters', 'password': 'Secure@Pass1', 'securityQuestion': 'Pet name?',
+            'securityAnswer': 'Bruno', 'profilePhoto': photo})
+        latencies.append(time.perf_counter() - started)
+        message = (response.get_json() or {}).get('message', '')
+        outcome = ('ok' if response.status_code == 201 else 'locked' if 'database is locked' in message
+                   else f'{response.status_code} {message[:60]}')
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    return outcomes, latencies
+
+
+def bench_stress_writers(args):
+    import multiprocessing
+    import subprocess
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    context = multiprocessing.get_context('spawn')
+    for mode in args.mode:
+        workdir = tempfile.mkdtemp(prefix=f'bench-writers-{mode}-')
+        os.environ.update(WRITER_MODES[mode], DATABASE_URL=f'sqlite:///{os.path.join(workdir, "writers.db")}',
+                          PASSWORD_HASH_METHOD=args.hash_method, PASSWORD_HASH_WORKERS='0',
+                          LOG_LEVEL='CRITICAL', ASSETS_BUILD_ON_START='0')
+        # Tables and indexes once, before the writers start
+        subprocess.run([sys.executable, '-c', 'import app; app.init_db()'], cwd=workdir, check=True,
+                       env=dict(os.environ, PYTHONPATH=here), stdout=subprocess.DEVNULL)
+        os.chdir(workdir)
+        start_at = time.time() + args.warmup
+        with context.Pool(args.writers) as pool:
+            results = pool.starmap(stress_writer, [(number, args.registrations, start_at)
+                                                   for number in range(args.writers)])
+        duration = time.time() - start_at
+        for name in WRITER_MODES[mode]:
+            del os.environ[name]
+
+        outcomes = {}
+        latencies = []
+        for worker_outcomes, worker_latencies in results:
+            for outcome, count in worker_outcomes.items():
+                outcomes[outcome] = outcomes.get(outcome, 0) + count
+            latencies.extend(worker_latencies)
+        print(f"{mode:>8}: {args.writers} writers x {args.registrations}  ok {outcomes.pop('ok', 0)}  "
+              f"locked {outcomes.pop('locked', 0)}  other {sum(outcomes.values())}   "
+              f"{len(latencies) / duration:6.1f} registrations/s   p50 {percentile(latencies, 0.5) * 1000:6.1f} ms   "
+              f"p99 {percentile(latencies, 0.99) * 1000:7.1f} ms")
+        for outcome, count in sorted(outcomes.items()):
+            print(f"          {count} x {outcome}")
+
+
+def bench_group_commit(args):
+    import threading
+    from group_commit import GroupCommitQueue
+
+    os.environ.update(PASSWORD_HASH_METHOD=args.hash_method, PASSWORD_HASH_WORKERS='0', LOG_LEVEL='CRITICAL',
+                      ASSETS_BUILD_ON_START='0')
+    photo = sample_photo()
+    for synchronous in args.synchronous:
+        os.environ['SQLITE_SYNCHRONOUS'] = synchronous
+        sys.modules.pop('app', None)
+        app_module = setup_app_database(f'group-commit-{synchronous.lower()}')
+        app_module.init_db()
+        modes = {
+            'per-request commit': None,
+            'group commit': GroupCommitQueue(app_module.write_registrations, max_batch=args.max_batch,
+                                             max_wait_ms=args.wait_ms),
+        }
+        for label, registration_queue in modes.items():
+            app_module.registration_queue = registration_queue
+            latencies = []
+            failures = []
+
+            def writer(number):
+                client = app_module.app.test_client()
+                for attempt in range(args.registrations):
+                    username = f'{"group" if registration_queue else "single"}{number}x{attempt}'
+                    started = time.perf_counter()
+                    response = client.post('/register', json={
+                        'firstName': 'Ravi', 'lastName': 'Kumar', 'username': username,
+                        'email': f'{username}@mail.com', 'mobile': '9845012345', 'dob': '1995-05-17',
+                        'gender': 'Male', 'address': '12 MG Road, Bangalore', 'postalCode': '560001',
+                        'country': 'India', 'state': 'Karnataka', 'city': 'Bangalore', 'education': 'Masters',
+                        'password': 'Secure@Pass1', 'securityQuestion': 'Pet name?', 'securityAnswer': 'Bruno',
+                        'profilePhoto': photo})
+                    latencies.append(time.perf_counter() - started)
+                    if response.status_code != 201:
+                        failures.append(response.status_code)
+
+            threads = [threading.Thread(target=writer, args=(number,)) for number in range(args.threads)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            duration = time.perf_counter() - started
+            batches = (f"   {registration_queue.stats['batches']} batches, largest {registration_queue.stats['largest_batch']}"
+                       if registration_queue else '')
+            print(f"synchronous={synchronous:<6} {label:>18}: {len(latencies) / duration:6.1f} registrations/s   "
+                  f"p50 {percentile(latencies, 0.5) * 1000:6.1f} ms   p99 {percentile(latencies, 0.99) * 1000:7.1f} ms   "
+                  f"failed {len(failures)}{batches}")
+            if registration_queue:
+                registration_queue.shutdown()
+
+
+def start_server(mode, port):
+    """Run one serving mode against a fresh database; returns the process"""
+    import subprocess
+    workdir = tempfile.mkdtemp(prefix=f'bench-load-{mode}-')
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{os.path.join(workdir, "load.db")}',
+               PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.Popen(SERVERS[mode](port), cwd=workdir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0.0
+
+
+def sample_photo():
+    import base64
+    import io
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (120, 120), (200, 80, 60)).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+
+async def run_load(url, args):
+    """``args.users`` simulated people filling in the form concurrently"""
+    import asyncio
+    import httpx
+
+    latencies = {}
+    statuses = {'ok': 0, 'shed': 0, 'error': 0}
+    photo = sample_photo()
+    deadline = time.perf_counter() + args.ramp + args.duration
+    measure_from = time.perf_counter() + args.ramp
+
+    async def call(client, label, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            outcome = 'shed' if response.status_code == 503 else 'error' if response.status_code >= 500 else 'ok'
+        except httpx.HTTPError:
+            outcome = 'error'
+        finished = time.perf_counter()
+        if started >= measure_from:
+            latencies.setdefault(label, []).append(finished - started)
+            statuses[outcome] += 1
+
+    async def form_user(client, number):
+        rng = random.Random(number)
+        await asyncio.sleep(rng.uniform(0, args.ramp))
+        attempt = 0
+        while time.perf_counter() < deadline:
+            attempt += 1
+            username = f'loaduser{number}x{attempt}'
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            await call(client, 'countries', 'GET', '/api/countries')
+            await asyncio.sleep(rng.expovariate(1 / args.think))
+            await call(client, 'validate', 'POST', '/api/validate', json={'fields': {
+                'firstName': first, 'lastName': last, 'username': username,
+                'email': f'{username}@{rng.choice(DOMAINS)}', 'mobile': '9845012345'}})
+            await asyncio.sleep(rng.expovariate(1 / args.think))
+            if rng.random() < args.register_ratio:
+                await call(client, 'register', 'POST', '/register', json={
+                    'firstName': first, 'lastName': last, 'username': username,
+                    'email': f'{username}@mail.com', 'mobile': '9845012345', 'dob': '1995-05-17',
+                    'gender': 'Male', 'address': '12 MG Road, Bangalore', 'postalCode': '560001',
+                    'country': 'India', 'state': 'Karnataka', 'city': 'Bangalore', 'education': 'Masters',
+                    'password': 'Secure@Pass1', 'securityQuestion': 'Pet name?', 'securityAnswer': 'Bruno',
+                    'profilePhoto': photo})
+
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        await asyncio.gather(*[form_user(client, number) for number in range(args.users)])
+    return latencies, statuses
+
+
+def report_load(label, latencies, statuses, duration):
+    everything = [value for values in latencies.values() for value in values]
+    print(f"{label:>6}: {len(everything) / duration:8.1f} req/s   p50 {percentile(everything, 0.5) * 1000:7.1f} ms   "
+          f"p99 {percentile(everything, 0.99) * 1000:8.1f} ms   ok {statuses['ok']}  503 {statuses['shed']}  "
+          f"errors {statuses['error']}")
+    for endpoint, values in sorted(latencies.items()):
+        print(f"        {endpoint:>9}: {len(values):6} calls   p50 {percentile(values, 0.5) * 1000:7.1f} ms   "
+              f"p99 {percentile(values, 0.99) * 1000:8.1f} ms")
+
+
+def bench_load(args):
+    import asyncio
+    import httpx
+
+    if args.url:
+        report_load('target', *asyncio.run(run_load(args.url, args)), args.duration)
+        return
+
+    for mode in args.mode:
+        server = start_server(mode, args.port)
+        url = f'http://127.0.0.1:{args.port}'
+        try:
+            for _ in range(300):
+                try:
+                    httpx.get(url + '/api/countries', timeout=1)
+                    break
+                except httpx.HTTPError:
+                    time.sleep(0.1)
+            report_load(mode, *asyncio.run(run_load(url, args)), args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    validate = commands.add_parser('validate', help='field validation throughput')
+    validate.add_argument('--iterations', type=int, default=2000)
+    validate.add_argument('--validators', help='validators.py to benchmark (default: this checkout)')
+    validate.set_defaults(run=bench_validate)
+
+    repeated = commands.add_parser('repeated-pattern', help='has_repeated_pattern equivalence and speed')
+    repeated.add_argument('--iterations', type=int, default=5000)
+    repeated.add_argument('--cases', type=int, default=100000, help='random inputs for the equivalence check')
+    repeated.add_argument('--seed', type=int, default=0)
+    repeated.set_defaults(run=bench_repeated_pattern)
+
+    search = commands.add_parser('search', help='dashboard search latency by table size')
+    search.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    search.add_argument('--repeat', type=int, default=5)
+    search.add_argument('--seed', type=int, default=0)
+    search.set_defaults(run=bench_search)
+
+    pagination = commands.add_parser('pagination', help='dashboard page latency by depth, OFFSET vs keyset')
+    pagination.add_argument('--users', type=int, default=200000)
+    pagination.add_argument('--pages', type=int, nargs='+', default=[1, 100, 1000, 5000])
+    pagination.add_argument('--repeat', type=int, default=5)
+    pagination.add_argument('--seed', type=int, default=0)
+    pagination.set_defaults(run=bench_pagination)
+
+    hashing = commands.add_parser('hashing', help='password hashing throughput per cost setting')
+    hashing.add_argument('--methods', nargs='+',
+                         default=['scrypt:16384:8:1', 'scrypt:32768:8:1', 'scrypt:65536:8:1',
+                                  'pbkdf2:sha256:260000', 'pbkdf2:sha256:600000'])
+    hashing.add_argument('--workers', type=int, default=0, help='pool size (default: CPU count)')
+    hashing.add_argument('--hashes', type=int, default=20, help='hashes per worker per method')
+    hashing.set_defaults(run=bench_hashing)
+
+    load = commands.add_parser('load', help='sync vs async serving under concurrent form users')
+    load.add_argument('--mode', nargs='+', choices=sorted(SERVERS), default=['sync', 'async'])
+    load.add_argument('--url', help='load an already running server instead')
+    load.add_argument('--users', type=int, default=1000, help='concurrent form users')
+    load.add_argument('--duration', type=float, default=30, help='measured seconds (after the ramp-up)')
+    load.add_argument('--ramp', type=float, default=5, help='seconds over which users arrive')
+    load.add_argument('--think', type=float, default=1.0, help='mean seconds between a user\'s requests')
+    load.add_argument('--register-ratio', type=float, default=0.05, help='share of form passes that submit')
+    load.add_argument('--port', type=int, default=5055)
+    load.set_defaults(run=bench_load)
+
+    bulk = commands.add_parser('import', help='bulk user import vs row-at-a-time inserts')
+    bulk.add_argument('--rows', type=int, default=100000)
+    bulk.add_argument('--chunk-size', type=int, default=5000)
+    bulk.add_argument('--baseline', type=int, default=1000, help='rows timed through the row-at-a-time path')
+    bulk.add_argument('--seed', type=int, default=0)
+    bulk.set_defaults(run=bench_import)
+
+    bulk_delete = commands.add_parser('bulk-delete', help='bulk delete statement count and speed vs one by one')
+    bulk_delete.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000])
+    bulk_delete.add_argument('--baseline', type=int, default=200, help='users deleted one by one for comparison')
+    bulk_delete.add_argument('--seed', type=int, default=0)
+    bulk_delete.set_defaults(run=bench_bulk_delete)
+
+    logs = commands.add_parser('logging', help='per-request logging cost on the request thread')
+    logs.add_argument('--requests', type=int, default=5000)
+    logs.add_argument('--sample-rate', type=float, default=0.1)
+    logs.add_argument('--flush-ms', type=float, default=0.2, help='time each flush of the log destination takes')
+    logs.set_defaults(run=bench_logging)
+
+    metrics = commands.add_parser('metrics', help='per-request cost of the metrics instrumentation')
+    metrics.add_argument('--requests', type=int, default=20000)
+    metrics.add_argument('--queries', type=int, default=3, help='SQL statements per simulated request')
+    metrics.set_defaults(run=bench_metrics)
+
+    static = commands.add_parser('assets', help='asset build sizes and url_for cost, mtime vs manifest')
+    static.add_argument('--iterations', type=int, default=100000)
+    static.set_defaults(run=bench_assets)
+
+    pages = commands.add_parser('page-cache', help='index, dashboard and user pages, uncached vs cached')
+    pages.add_argument('--users', type=int, default=50, help='users seeded (one dashboard page)')
+    pages.add_argument('--iterations', type=int, default=500)
+    pages.add_argument('--backend', nargs='+', choices=['memory', 'file'], default=['memory', 'file'])
+    pages.set_defaults(run=bench_page_cache)
+
+    writers = commands.add_parser('stress-writers', help='parallel registrations on SQLite, lock errors and latency')
+    writers.add_argument('--writers', type=int, default=16, help='worker processes registering at once')
+    writers.add_argument('--registrations', type=int, default=25, help='registrations per worker')
+    writers.add_argument('--mode', nargs='+', choices=sorted(WRITER_MODES), default=['default', 'tuned'])
+    writers.add_argument('--hash-method', default='pbkdf2:sha256:1000',
+                         help='cheap by default, so the database is the bottleneck')
+    writers.add_argument('--warmup', type=float, default=5, help='seconds for the workers to import the app')
+    writers.set_defaults(run=bench_stress_writers)
+
+    group = commands.add_parser('group-commit', help='registration throughput, commit per request vs group commit')
+    group.add_argument('--threads', type=int, default=32, help='concurrent registering threads')
+    group.add_argument('--registrations', type=int, default=20, help='registrations per thread')
+    group.add_argument('--synchronous', nargs='+', default=['NORMAL', 'FULL'], help='SQLite synchronous settings')
+    group.add_argument('--max-batch', type=int, default=64)
+    group.add_argument('--wait-ms', type=float, default=2)
+    group.add_argument('--hash-method', default='pbkdf2:sha256:1000',
+                       help='cheap by default, so the database is the bottleneck')
+    group.set_defaults(run=bench_group_commit)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
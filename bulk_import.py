@@ -0,0 +1,175 @@
+"""Bulk user import from CSV or JSONL.
+
+The file is read as a stream and handled a chunk at a time: every row in the
+chunk is checked with the registration rules, duplicates are resolved with
+one query for the whole chunk, and the valid rows go in with a single
+executemany. Rows that fail are collected in a report instead of aborting
+the import, so a partner spreadsheet with a few bad lines still loads.
+"""
+import csv
+import gzip
+import io
+import json
+from itertools import islice
+
+FORMATS = ('csv', 'jsonl')
+
+
+class ImportFormatError(ValueError):
+    """The file as a whole can't be imported (unknown type, unreadable, plaintext passwords)"""
+
+    report = None
+
+
+def detect_format(filename):
+    """('csv' | 'jsonl', gzipped) from a file name"""
+    name = (filename or '').lower()
+    gzipped = name.endswith('.gz')
+    if gzipped:
+        name = name[:-3]
+    if name.endswith('.csv'):
+        return 'csv', gzipped
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl', gzipped
+    raise ImportFormatError('Upload a .csv or .jsonl file (optionally .gz)')
+
+
+def read_records(stream, fmt, gzipped=False):
+    """Yield one dict per data row from a binary stream"""
+    if gzipped:
+        stream = gzip.GzipFile(fileobj=stream)
+    # utf-8-sig drops the BOM spreadsheet programs put in front of CSV exports
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'csv':
+            yield from csv.DictReader(text)
+            return
+        for number, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if not isinstance(record, dict):
+                raise ImportFormatError(f'Line {number} is not a JSON object')
+            yield record
+    except (UnicodeDecodeError, csv.Error, EOFError, gzip.BadGzipFile) as e:
+        raise ImportFormatError(f'Could not read the file: {e}')
+
+
+class ImportReport:
+    """Counts plus ``(row, field, message)`` errors; only the first
+    ``max_errors`` are kept so a file of junk can't exhaust memory."""
+
+    def __init__(self, max_errors=None):
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []
+        self.max_errors = max_errors
+        self.truncated = False
+
+    def reject(self, row, errors):
+        self.rejected += 1
+        for field, message in errors:
+            if self.max_errors is not None and len(self.errors) >= self.max_errors:
+                self.truncated = True
+                return
+            self.errors.append((row, field, message))
+
+    def to_dict(self):
+        return {
+            'imported': self.imported,
+            'rejected': self.rejected,
+            'errors': [{'row': row, 'field': field, 'message': message} for row, field, message in self.errors],
+            'truncated': self.truncated,
+        }
+
+    def write_csv(self, fp):
+        writer = csv.writer(fp)
+        writer.writerow(['Row', 'Field', 'Message'])
+        writer.writerows(self.errors)
+
+
+class BulkImporter:
+    """Drives an import; the model specifics come in as callables.
+
+    ``prepare(record, cache)`` turns a record into ``(row, errors)`` where
+    errors is a list of ``(field, message)``; ``cache`` is a per-chunk dict
+    it can memoise validation results in.
+    ``find_existing(rows)`` returns the ``(usernames, emails)`` already taken.
+    ``insert(rows)`` writes a list of rows in one statement and commits, or
+    rolls back and raises. When it raises one of ``conflicts`` (a row
+    inserted concurrently by someone else) the chunk is retried row by row
+    so only the conflicting rows are rejected.
+    """
+
+    def __init__(self, prepare, find_existing, insert, conflicts=(), chunk_size=5000):
+        self.prepare = prepare
+        self.find_existing = find_existing
+        self.insert = insert
+        self.conflicts = tuple(conflicts)
+        self.chunk_size = chunk_size
+
+    def run(self, records, progress=None, max_errors=None):
+        report = ImportReport(max_errors)
+        seen_usernames, seen_emails = set(), set()
+        # Data rows are numbered from 1, like spreadsheet rows under a header
+        numbered = enumerate(records, 1)
+        try:
+            while True:
+                chunk = list(islice(numbered, self.chunk_size))
+                if not chunk:
+                    break
+                self._import_chunk(chunk, report, seen_usernames, seen_emails)
+                if progress:
+                    progress(report)
+        except ImportFormatError as e:
+            # Chunks before the bad line are already committed
+            e.report = report
+            raise
+        return report
+
+    def _import_chunk(self, chunk, report, seen_usernames, seen_emails):
+        cache = {}
+        candidates = []
+        for number, record in chunk:
+            row, errors = self.prepare(record, cache)
+            if errors:
+                report.reject(number, errors)
+                continue
+            # Duplicates inside the file itself
+            if row['username'] in seen_usernames:
+                report.reject(number, [('username', 'Duplicate username in file')])
+                continue
+            if row['email'] in seen_emails:
+                report.reject(number, [('email', 'Duplicate email in file')])
+                continue
+            seen_usernames.add(row['username'])
+            seen_emails.add(row['email'])
+            candidates.append((number, row))
+
+        if not candidates:
+            return
+        taken_usernames, taken_emails = self.find_existing([row for _, row in candidates])
+        rows = []
+        for number, row in candidates:
+            if row['username'] in taken_usernames:
+                report.reject(number, [('username', 'Username is already taken')])
+            elif row['email'] in taken_emails:
+                report.reject(number, [('email', 'Email is already registered')])
+            else:
+                rows.append((number, row))
+
+        if not rows:
+            return
+        try:
+            self.insert([row for _, row in rows])
+            report.imported += len(rows)
+        except self.conflicts:
+            for number, row in rows:
+                try:
+                    self.insert([row])
+                    report.imported += 1
+                except self.conflicts:
+                    report.reject(number, [(None, 'Username or email is already registered')])
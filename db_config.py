@@ -0,0 +1,89 @@
+"""Database engine settings.
+
+SQLite gets a few PRAGMAs on every new connection:
+
+- ``journal_mode=WAL`` - readers no longer block the writer or each other,
+  and a commit appends to the log instead of rewriting the database file
+- ``synchronous=NORMAL`` - fsync at checkpoints rather than on every commit;
+  in WAL mode a power cut can lose the last commits but not corrupt the file
+- ``busy_timeout`` - a writer that finds the lock taken waits up to this many
+  milliseconds instead of failing with "database is locked"
+- ``mmap_size`` - read pages through a memory map instead of read() calls
+
+Server databases (PostgreSQL, MySQL) get connection pool settings instead:
+size and overflow, how long a request waits for a connection, a liveness
+check before a pooled connection is handed out, and recycling connections
+before the server's idle timeout closes them.
+"""
+import re
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+# PRAGMA values are spliced into the statement, so only plain words and numbers
+_PRAGMA_VALUE = re.compile(r'-?\w+')
+
+
+def is_sqlite(url):
+    return make_url(url).get_backend_name() == 'sqlite'
+
+
+def engine_options(url, pool_size=5, max_overflow=10, pool_timeout=30, pool_recycle=1800, pool_pre_ping=True):
+    """``SQLALCHEMY_ENGINE_OPTIONS`` for ``url``. SQLite keeps SQLAlchemy's
+    default pool - its settings are the PRAGMAs, see ``install_sqlite_pragmas``."""
+    if is_sqlite(url):
+        return {}
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'pool_recycle': pool_recycle,
+        'pool_pre_ping': pool_pre_ping,
+    }
+
+
+def pragma_statements(pragmas):
+    statements = []
+    for name, value in pragmas.items():
+        if value is None or value == '':
+            continue
+        if not _PRAGMA_VALUE.fullmatch(name) or not _PRAGMA_VALUE.fullmatch(str(value)):
+            raise ValueError(f'Invalid SQLite PRAGMA {name}={value!r}')
+        statements.append(f'PRAGMA {name} = {value}')
+    return statements
+
+
+def install_sqlite_pragmas(engine, pragmas=SQLITE_PRAGMAS):
+    """Run ``pragmas`` on every new connection of ``engine`` (a sync engine,
+    or ``async_engine.sync_engine``). Does nothing for other databases."""
+    if engine.dialect.name != 'sqlite':
+        return
+    statements = pragma_statements(pragmas)
+    if not statements:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+def describe(engine):
+    """The settings in effect, for ``flask db-info``"""
+    info = {'database': engine.url.render_as_string(hide_password=True), 'pool': engine.pool.status()}
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as connection:
+            for name in SQLITE_PRAGMAS:
+                info[name] = connection.execute(text(f'PRAGMA {name}')).scalar()
+    return info
@@ -0,0 +1,377 @@
+"""Streaming writers and background jobs for user exports.
+
+Each writer turns an iterable of rows into an iterable of byte chunks, so a
+response can be sent while the database cursor is still being read and no
+stage ever holds more than one chunk of output.
+
+Exports too large to finish inside a request run as jobs: ``ExportJobs``
+writes the file in a worker thread and the admin polls for it. Every job
+keeps a ``<id>.json`` status file next to its output, so any worker process
+can report on or serve a job started by another one, and a process asked for
+an export that another one is already running returns that job. The dedup is
+best effort across processes: two processes submitting the same export at the
+same instant can both start it.
+
+While a process has queued or running jobs, it rewrites their status files
+every ``heartbeat`` seconds. An active job whose file has not changed for
+``stale_after`` seconds belonged to a process that died. It is reported as
+failed and cleaned up like any finished job.
+"""
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional - without it Parquet exports are unavailable
+    pa = pq = None
+
+CHUNK_BYTES = 64 * 1024
+
+# format -> (file extension, mimetype)
+FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'jsonl': ('.jsonl', 'application/x-ndjson'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+}
+
+
+class _LineBuffer:
+    """File-like target that hands back what csv.writer writes to it"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows, chunk_bytes=CHUNK_BYTES):
+    """Encode ``header`` and ``rows`` as UTF-8 CSV in ~chunk_bytes pieces"""
+    writer = csv.writer(_LineBuffer())
+    pending = [writer.writerow(header)]
+    size = len(pending[0])
+    for row in rows:
+        line = writer.writerow(row)
+        pending.append(line)
+        size += len(line)
+        if size >= chunk_bytes:
+            yield ''.join(pending).encode('utf-8')
+            pending, size = [], 0
+    if pending:
+        yield ''.join(pending).encode('utf-8')
+
+
+def iter_gzip(chunks, level=6):
+    """Compress a byte stream on the fly into a single gzip member"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def format_rows(formatters, rows):
+    """Apply per-column formatters (None leaves the value as is)"""
+    for row in rows:
+        yield [value if formatter is None else formatter(value) for formatter, value in zip(formatters, row)]
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def iter_jsonl(columns, rows, chunk_bytes=CHUNK_BYTES):
+    """One JSON object per row, keyed by column name"""
+    pending, size = [], 0
+    for row in rows:
+        line = json.dumps(dict(zip(columns, row)), default=_json_default, ensure_ascii=False) + '\n'
+        pending.append(line)
+        size += len(line)
+        if size >= chunk_bytes:
+            yield ''.join(pending).encode('utf-8')
+            pending, size = [], 0
+    if pending:
+        yield ''.join(pending).encode('utf-8')
+
+
+def arrow_type(sql_type):
+    python_type = sql_type.python_type
+    if python_type is int:
+        return pa.int64()
+    if python_type is datetime:
+        return pa.timestamp('us')
+    if python_type is date:
+        return pa.date32()
+    return pa.string()
+
+
+def write_parquet(path, columns, sql_types, rows, batch_rows=10000):
+    """Write rows as Parquet one record batch (row group) at a time"""
+    if pa is None:
+        raise RuntimeError('Parquet export requires pyarrow')
+    schema = pa.schema([(name, arrow_type(sql_type)) for name, sql_type in zip(columns, sql_types)])
+    with pq.ParquetWriter(path, schema, compression='snappy') as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                writer.write_batch(_record_batch(schema, batch))
+                batch = []
+        if batch:
+            writer.write_batch(_record_batch(schema, batch))
+
+
+def _record_batch(schema, rows):
+    arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class ExportJob:
+    def __init__(self, job_id, key, fmt, columns, start=None, end=None):
+        self.id = job_id
+        self.key = key
+        self.format = fmt
+        self.columns = list(columns)
+        self.start = start
+        self.end = end
+        self.status = 'queued'
+        self.rows = 0
+        self.size = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.finished_at = None
+
+    @property
+    def active(self):
+        return self.status in ('queued', 'running')
+
+    @property
+    def filename(self):
+        stamp = time.strftime('%Y%m%d_%H%M%S', time.localtime(self.created_at))
+        return f'registrations_{stamp}_{self.id[:8]}{FORMATS[self.format][0]}'
+
+    @property
+    def mimetype(self):
+        return FORMATS[self.format][1]
+
+    def to_dict(self):
+        return {
+            'id': self.id, 'key': self.key, 'format': self.format, 'columns': self.columns,
+            'from': _date_str(self.start), 'to': _date_str(self.end),
+            'status': self.status, 'rows': self.rows, 'size': self.size, 'error': self.error,
+            'created_at': self.created_at, 'updated_at': self.updated_at, 'finished_at': self.finished_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        job = cls(data['id'], data['key'], data['format'], data['columns'], data['from'], data['to'])
+        for name in ('status', 'rows', 'size', 'error', 'created_at', 'finished_at'):
+            setattr(job, name, data[name])
+        # Status files written before heartbeats existed
+        job.updated_at = data.get('updated_at', job.created_at)
+        return job
+
+
+def _date_str(value):
+    return value.strftime('%Y-%m-%d') if isinstance(value, (date, datetime)) else value
+
+
+class ExportJobs:
+    """Runs exports in a thread pool and tracks them on disk.
+
+    ``source(columns, start, end)`` yields raw row tuples and is called on the
+    worker thread inside ``context()`` (e.g. ``app.app_context``).
+    ``headers``/``formatters``/``sql_types`` map column names to the CSV
+    header, CSV value formatter and SQLAlchemy type of each column.
+    """
+
+    JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+    def __init__(self, directory, source, context, headers, formatters, sql_types,
+                 max_workers=2, retention=24 * 3600, heartbeat=30, stale_after=600):
+        self.directory = directory
+        self.source = source
+        self.context = context
+        self.headers = headers
+        self.formatters = formatters
+        self.sql_types = sql_types
+        self.retention = retention
+        self.heartbeat = heartbeat
+        self.stale_after = stale_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='export')
+        self._lock = threading.Lock()
+        # Status writes of the worker and the heartbeat thread never interleave
+        self._save_lock = threading.Lock()
+        self._heartbeat_thread = None
+        self._jobs = {}
+        self._active = {}
+
+    # ---------- paths ----------
+
+    def path_for(self, job):
+        return os.path.join(self.directory, job.id + FORMATS[job.format][0])
+
+    def _status_path(self, job_id):
+        return os.path.join(self.directory, job_id + '.json')
+
+    def _save(self, job, heartbeat=False):
+        with self._save_lock:
+            # A heartbeat must not overwrite the final status the worker just wrote
+            if heartbeat and not job.active:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            job.updated_at = time.time()
+            path = self._status_path(job.id)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(job.to_dict(), f)
+            os.replace(tmp_path, path)
+
+    # ---------- jobs ----------
+
+    def submit(self, fmt, columns, start=None, end=None):
+        """Start an export, or return the identical one already in progress"""
+        if fmt not in FORMATS:
+            raise ValueError(f'Unknown export format: {fmt}')
+        if fmt == 'parquet' and pa is None:
+            raise ValueError('Parquet export requires pyarrow')
+
+        key = hashlib.sha1(json.dumps([fmt, list(columns), _date_str(start), _date_str(end)]).encode()).hexdigest()
+        with self._lock:
+            running = self._active.get(key)
+        if running is None:
+            # Started by another process? Its status file says so (stale ones have expired by now)
+            running = next((job for job in self.recent(limit=None) if job.key == key and job.active), None)
+        if running is not None:
+            return running, False
+
+        with self._lock:
+            running = self._active.get(key)
+            if running is not None:
+                return running, False
+            job = ExportJob(uuid.uuid4().hex, key, fmt, columns, start, end)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._save(job)
+            if self._heartbeat_thread is None:
+                self._heartbeat_thread = threading.Thread(target=self._beat, name='export-heartbeat', daemon=True)
+                self._heartbeat_thread.start()
+
+        self.cleanup()
+        self._executor.submit(self._run, job)
+        return job, True
+
+    def get(self, job_id):
+        if not self.JOB_ID.match(job_id or ''):
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        try:
+            with open(self._status_path(job_id)) as f:
+                job = ExportJob.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+        return self._expire(job)
+
+    def _expire(self, job):
+        """Fail a job another process left queued or running without a heartbeat"""
+        if job.active and time.time() - job.updated_at > self.stale_after:
+            job.status = 'failed'
+            job.error = 'Export stopped without finishing (its worker process exited)'
+            job.finished_at = time.time()
+            self._save(job)
+        return job
+
+    def recent(self, limit=20):
+        """Newest jobs first, including ones started by other processes"""
+        try:
+            names = [name[:-5] for name in os.listdir(self.directory) if name.endswith('.json')]
+        except FileNotFoundError:
+            names = []
+        jobs = [job for job in (self.get(name) for name in names) if job is not None]
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)[:limit]
+
+    def cleanup(self):
+        """Remove finished exports older than the retention period"""
+        cutoff = time.time() - self.retention
+        for job in self.recent(limit=None):
+            if job.active or (job.finished_at or job.created_at) > cutoff:
+                continue
+            for path in (self.path_for(job), self._status_path(job.id)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            with self._lock:
+                self._jobs.pop(job.id, None)
+
+    # ---------- worker ----------
+
+    def _beat(self):
+        while True:
+            time.sleep(self.heartbeat)
+            with self._lock:
+                active = [job for job in self._jobs.values() if job.active]
+            for job in active:
+                try:
+                    self._save(job, heartbeat=True)
+                except OSError:
+                    # Missed beats only matter once they add up to stale_after
+                    pass
+
+    def _counted(self, job, rows):
+        for row in rows:
+            job.rows += 1
+            yield row
+
+    def _run(self, job):
+        path = self.path_for(job)
+        part = path + '.part'
+        job.status = 'running'
+        self._save(job)
+        try:
+            with self.context():
+                rows = self._counted(job, self.source(job.columns, job.start, job.end))
+                if job.format == 'parquet':
+                    write_parquet(part, job.columns, [self.sql_types[name] for name in job.columns], rows)
+                else:
+                    if job.format == 'csv':
+                        chunks = iter_csv([self.headers[name] for name in job.columns],
+                                          format_rows([self.formatters[name] for name in job.columns], rows))
+                    else:
+                        chunks = iter_jsonl(job.columns, rows)
+                    with open(part, 'wb') as f:
+                        for chunk in chunks:
+                            f.write(chunk)
+            os.replace(part, path)
+            job.size = os.path.getsize(path)
+            job.status = 'done'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            try:
+                os.remove(part)
+            except FileNotFoundError:
+                pass
+        finally:
+            if job.status == 'running':
+                # Anything that got past ``except Exception`` must not leave it running forever
+                job.status = 'failed'
+                job.error = 'Export was interrupted'
+            job.finished_at = time.time()
+            with self._lock:
+                self._active.pop(job.key, None)
+            self._save(job)
@@ -0,0 +1,112 @@
+"""Write-behind queue with group commit.
+
+Request threads ``submit()`` a row and wait on the returned future. A single
+writer thread takes whatever is queued - up to ``max_batch`` rows, waiting at
+most ``max_wait_ms`` for more once it has one - and hands the batch to
+``write(rows)``, which inserts it in one transaction. One commit (and one
+fsync) then covers the whole batch instead of one per request, and on SQLite
+the writers stop queueing for the database lock one at a time.
+
+``write`` returns one result per row: the value for that row's future, or an
+exception instance to raise from it (a duplicate detected inside the batch,
+for example). If ``write`` itself raises, every row of the batch gets that
+exception.
+"""
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class QueueFull(Exception):
+    """More rows are waiting than the writer is allowed to fall behind by"""
+
+    def __init__(self, retry_after=1):
+        super().__init__('Registration queue is full')
+        self.retry_after = retry_after
+
+
+class GroupCommitQueue:
+    def __init__(self, write, max_batch=64, max_wait_ms=2, max_pending=1000):
+        self.write = write
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.max_pending = max_pending
+        self.stats = {'rows': 0, 'batches': 0, 'failed_batches': 0, 'rejected': 0, 'largest_batch': 0}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+
+    def submit(self, row):
+        """Queue ``row``; the future resolves once its batch is committed"""
+        if self._queue.qsize() >= self.max_pending:
+            self.stats['rejected'] += 1
+            raise QueueFull()
+        future = Future()
+        with self._lock:
+            if self._stopping:
+                raise RuntimeError('Registration queue is shut down')
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+                self._thread.start()
+                atexit.register(self.shutdown)
+            self._queue.put((row, future))
+        return future
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                # Whatever queued up during the last commit is taken at once
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = self._collect(item)
+            rows = [row for row, _ in batch]
+            try:
+                results = self.write(rows)
+            except Exception as e:
+                self.stats['failed_batches'] += 1
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.stats['batches'] += 1
+            self.stats['rows'] += len(batch)
+            self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def shutdown(self, timeout=10):
+        """Write what is queued, then stop the writer"""
+        with self._lock:
+            self._stopping = True
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join(timeout)
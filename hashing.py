@@ -0,0 +1,103 @@
+"""Password hashing off the request thread.
+
+``generate_password_hash`` / ``check_password_hash`` are deliberately slow
+(scrypt by default). Run on the request thread, a burst of signups keeps
+every worker busy hashing and cheap requests queue behind them. Here the
+hashing runs in a small process pool instead: the request thread only waits
+on a future, and once ``max_pending`` hashes are queued or running, new
+ones are refused with ``PoolSaturated`` so the caller can answer 503 instead
+of piling up more work.
+"""
+import asyncio
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+class PoolSaturated(Exception):
+    def __init__(self, retry_after):
+        super().__init__('Password hashing is saturated')
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """``workers=0`` hashes inline on the calling thread (no pool)."""
+
+    def __init__(self, method=DEFAULT_METHOD, workers=1, max_pending=None, timeout=10, retry_after=2):
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending or max(workers, 1) * 4
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self.stats = {'hashed': 0, 'verified': 0, 'rejected': 0, 'timeouts': 0}
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that is already running request threads is unsafe
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+                atexit.register(self.shutdown)
+            return self._executor
+
+    def _submit(self, fn, *args):
+        if not self.workers:
+            future = Future()
+            future.set_result(fn(*args))
+            return future
+        if not self._slots.acquire(blocking=False):
+            self.stats['rejected'] += 1
+            raise PoolSaturated(self.retry_after)
+        try:
+            future = self._pool().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot is held until the work is done, even if this caller gives up
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _run(self, fn, *args):
+        try:
+            return self._submit(fn, *args).result(timeout=self.timeout)
+        except TimeoutError:
+            self.stats['timeouts'] += 1
+            raise PoolSaturated(self.retry_after)
+
+    async def _run_async(self, fn, *args):
+        """Await the pool from a coroutine without tying up a thread"""
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(self._submit(fn, *args)), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            raise PoolSaturated(self.retry_after)
+
+    def hash(self, password):
+        value = self._run(generate_password_hash, password, self.method)
+        self.stats['hashed'] += 1
+        return value
+
+    def verify(self, pwhash, password):
+        # The cost parameters travel inside pwhash, so old hashes keep verifying
+        ok = self._run(check_password_hash, pwhash, password)
+        self.stats['verified'] += 1
+        return ok
+
+    async def hash_async(self, password):
+        value = await self._run_async(generate_password_hash, password, self.method)
+        self.stats['hashed'] += 1
+        return value
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,410 @@
+"""Location data (countries / states / cities) for the registration form.
+
+The form is served from a prebuilt on-disk index (see ``LocationIndex`` and
+``flask build-locations``). Lookups the index does not cover fall through to
+the upstream API through a shared ``UpstreamClient``. Upstream lookups are
+slow and rate limited, so responses are kept in a small in-process cache.
+Entries stay fresh for ``ttl`` seconds; after that they are still served for
+up to ``stale_ttl`` seconds while a single background refresh per key fetches
+a new copy.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def index_key(key):
+    """('cities', 101, 4026) -> 'cities/101/4026'"""
+    return '/'.join(str(part) for part in key)
+
+
+def encode_payload(data):
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+class CacheEntry:
+    __slots__ = ('body', 'etag', 'stored_at')
+
+    def __init__(self, body, stored_at, etag=None):
+        self.body = body
+        self.etag = etag or hashlib.sha1(body).hexdigest()
+        self.stored_at = stored_at
+
+
+def _spawn_thread(target):
+    threading.Thread(target=target, daemon=True).start()
+
+
+class LocationCache:
+    """Bounded LRU cache with TTL and stale-while-revalidate.
+
+    ``loader(key)`` returns JSON-serialisable data for a key or raises. The
+    clock and the function used to start background refreshes can be swapped
+    out, which keeps the cache easy to drive from a fake upstream.
+    """
+
+    def __init__(self, loader, max_entries=512, ttl=3600, stale_ttl=86400,
+                 clock=time.monotonic, spawn=_spawn_thread):
+        self.loader = loader
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.clock = clock
+        self.spawn = spawn
+
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0,
+                      'refreshes': 0, 'errors': 0, 'evictions': 0}
+
+    def get(self, key):
+        """Return a CacheEntry for key, or None when the upstream failed and
+        nothing usable is cached."""
+        entry = self.peek(key)
+        return entry if entry is not None else self._load(key)
+
+    def peek(self, key):
+        """Like get() but never loads on a miss - for callers that fetch the
+        upstream themselves (the async server) and then put() the result."""
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.stored_at
+                if age <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return entry
+                if age <= self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stats['stale_hits'] += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        self.spawn(lambda: self._refresh(key))
+                    return entry
+                # Too old to serve at all
+                del self._entries[key]
+            self.stats['misses'] += 1
+        return None
+
+    def put(self, key, data):
+        entry = CacheEntry(encode_payload(data), self.clock())
+        self._store(key, entry)
+        return entry
+
+    def record_error(self):
+        with self._lock:
+            self.stats['errors'] += 1
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ---------- internals ----------
+
+    def _load(self, key):
+        try:
+            data = self.loader(key)
+        except Exception:
+            self.record_error()
+            return None
+        return self.put(key, data)
+
+    def _refresh(self, key):
+        try:
+            if self._load(key) is not None:
+                with self._lock:
+                    self.stats['refreshes'] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+
+class UpstreamError(Exception):
+    """The upstream API failed or returned an unusable response"""
+
+
+class CircuitOpenError(UpstreamError):
+    """Raised without contacting the upstream while the breaker is open"""
+
+
+class UpstreamClient:
+    """Shared HTTP client for the location upstream.
+
+    * one keep-alive ``requests.Session`` with a bounded connection pool
+    * at most ``max_concurrency`` requests in flight (extra calls queue)
+    * concurrent calls for the same path share one in-flight fetch
+    * a circuit breaker that opens after ``failure_threshold`` consecutive
+      failures and fails fast for ``reset_timeout`` seconds, then lets a
+      single trial request through (half-open)
+
+    ``submit()`` returns a Future; ``get_json()`` blocks on it.
+    ``observer(seconds, outcome)``, if given, is called after every request
+    with outcome ``'ok'``, ``'error'`` or ``'timeout'``.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, base_url, headers=None, timeout=5, max_concurrency=8,
+                 failure_threshold=5, reset_timeout=30, clock=time.monotonic, session=None, observer=None):
+        self.base_url = base_url.rstrip('/')
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.observer = observer
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='upstream')
+
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+
+        self.metrics = {'requests': 0, 'coalesced': 0, 'failures': 0, 'timeouts': 0,
+                        'short_circuited': 0, 'breaker_opens': 0, 'latency_seconds_total': 0.0}
+
+    def get_json(self, path):
+        return self.submit(path).result()
+
+    def submit(self, path):
+        with self._lock:
+            future = self._inflight.get(path)
+            if future is not None:
+                self.metrics['coalesced'] += 1
+                return future
+
+            trial = self._admit()
+            future = self._executor.submit(self._fetch, path, trial)
+            self._inflight[path] = future
+
+        future.add_done_callback(lambda done: self._forget(path, done))
+        return future
+
+    def _admit(self):
+        """Breaker check, called with the lock held. Returns True when this
+        request is the half-open trial."""
+        if self.state == self.OPEN:
+            if self.clock() - self._opened_at < self.reset_timeout:
+                self.metrics['short_circuited'] += 1
+                raise CircuitOpenError('Upstream circuit is open')
+            self.state = self.HALF_OPEN
+
+        if self.state == self.HALF_OPEN:
+            if self._trial_running:
+                self.metrics['short_circuited'] += 1
+                raise CircuitOpenError('Upstream circuit is half-open')
+            self._trial_running = True
+            return True
+        return False
+
+    def _forget(self, path, future):
+        with self._lock:
+            if self._inflight.get(path) is future:
+                del self._inflight[path]
+
+    def _fetch(self, path, trial):
+        started = self.clock()
+        try:
+            response = self.session.get(self.base_url + path, headers=self.headers, timeout=self.timeout)
+        except Exception as e:
+            self._record(started, trial, error=e)
+            raise UpstreamError(str(e)) from e
+
+        if response.status_code >= 500:
+            error = UpstreamError(f'Upstream returned HTTP {response.status_code}')
+            self._record(started, trial, error=error)
+            raise error
+
+        # A 4xx means the upstream is healthy and the request was bad - no breaker hit
+        self._record(started, trial)
+        if response.status_code != 200:
+            raise UpstreamError(f'Upstream returned HTTP {response.status_code}')
+        try:
+            return response.json()
+        except ValueError as e:
+            raise UpstreamError('Upstream returned invalid JSON') from e
+
+    def _record(self, started, trial, error=None):
+        elapsed = self.clock() - started
+        if self.observer:
+            self.observer(elapsed, 'ok' if error is None else 'timeout' if isinstance(error, requests.Timeout)
+                          else 'error')
+        with self._lock:
+            self.metrics['requests'] += 1
+            self.metrics['latency_seconds_total'] += elapsed
+            if trial:
+                self._trial_running = False
+
+            if error is None:
+                self._failures = 0
+                self.state = self.CLOSED
+                return
+
+            self.metrics['failures'] += 1
+            if isinstance(error, requests.Timeout):
+                self.metrics['timeouts'] += 1
+            self._failures += 1
+            if trial or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.metrics['breaker_opens'] += 1
+                self.state = self.OPEN
+                self._opened_at = self.clock()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.metrics, state=self.state, in_flight=len(self._inflight),
+                        consecutive_failures=self._failures)
+
+
+class LocationIndex:
+    """Read side of the offline location dataset.
+
+    The index is a SQLite file holding one pre-serialised JSON payload per
+    dropdown (all countries, the states of a country, the cities of a state)
+    keyed by ``index_key``. A lookup is a single primary-key read; the body is
+    sent as-is.
+    """
+
+    RELOAD_CHECK_SECONDS = 30
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def lookup(self, key):
+        """Return a CacheEntry for key, or None if the index does not have it"""
+        conn = self._connection()
+        if conn is None:
+            return None
+        row = conn.execute('SELECT body, etag FROM payloads WHERE key = ?', (index_key(key),)).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(row[0], 0, etag=row[1])
+
+    def _connection(self):
+        local = self._local
+        now = time.monotonic()
+        if getattr(local, 'checked_at', None) is not None and now - local.checked_at < self.RELOAD_CHECK_SECONDS:
+            return local.conn
+
+        # Re-open when `flask build-locations` has swapped in a new file
+        local.checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            local.conn = local.mtime = None
+            return None
+        if getattr(local, 'conn', None) is None or local.mtime != mtime:
+            if getattr(local, 'conn', None) is not None:
+                local.conn.close()
+            local.conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+            local.mtime = mtime
+        return local.conn
+
+
+def build_location_index(path, countries, states, cities):
+    """Write a new index file atomically.
+
+    ``countries`` is a list of ``{"id", "name", "iso2"}`` dicts, ``states`` a
+    list of ``{"id", "name", "country_id"}`` and ``cities`` a list of
+    ``{"id", "name", "state_id"}``. Returns the number of payloads written.
+    """
+    states_by_country = {}
+    country_of_state = {}
+    for state in states:
+        states_by_country.setdefault(state['country_id'], []).append(
+            {'id': state['id'], 'name': state['name']})
+        country_of_state[state['id']] = state['country_id']
+
+    cities_by_state = {}
+    for city in cities:
+        cities_by_state.setdefault(city['state_id'], []).append(
+            {'id': city['id'], 'name': city['name']})
+
+    payloads = [(('countries',), [
+        {'id': c['id'], 'name': c['name'], 'iso2': c.get('iso2')} for c in countries])]
+    for country_id, items in states_by_country.items():
+        payloads.append((('states', country_id), sorted(items, key=lambda item: item['name'])))
+    for state_id, items in cities_by_state.items():
+        if state_id in country_of_state:
+            payloads.append((('cities', country_of_state[state_id], state_id),
+                             sorted(items, key=lambda item: item['name'])))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute('CREATE TABLE payloads (key TEXT PRIMARY KEY, body BLOB NOT NULL, etag TEXT NOT NULL) WITHOUT ROWID')
+        rows = []
+        for key, data in payloads:
+            body = encode_payload(data)
+            rows.append((index_key(key), body, hashlib.sha1(body).hexdigest()))
+        conn.executemany('INSERT INTO payloads VALUES (?, ?, ?)', rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, path)
+    return len(payloads)
+
+
+def load_dataset(path):
+    """Read a countries/states/cities dataset for ``build_location_index``.
+
+    Accepts the nested ``countries+states+cities.json`` layout (countries with
+    a ``states`` list, states with a ``cities`` list) or a directory holding
+    flat ``countries.json``, ``states.json`` and ``cities.json`` files.
+    """
+    if os.path.isdir(path):
+        def read(name):
+            with open(os.path.join(path, name), encoding='utf-8') as f:
+                return json.load(f)
+        return read('countries.json'), read('states.json'), read('cities.json')
+
+    with open(path, encoding='utf-8') as f:
+        nested = json.load(f)
+
+    countries, states, cities = [], [], []
+    for country in nested:
+        countries.append({'id': country['id'], 'name': country['name'], 'iso2': country.get('iso2')})
+        for state in country.get('states', []):
+            states.append({'id': state['id'], 'name': state['name'], 'country_id': country['id']})
+            for city in state.get('cities', []):
+                cities.append({'id': city['id'], 'name': city['name'], 'state_id': state['id']})
+    return countries, states, cities
@@ -0,0 +1,250 @@
+"""In-process metrics, served in the Prometheus text format.
+
+Counters and histograms are plain dicts updated under a per-metric lock, so
+recording costs a dict lookup and a bisect. Stats the app's components
+already keep (cache hits, hasher rejections, ...) are read only when
+``/metrics`` is scraped. ``QueryTracker`` counts SQL statements and their
+time per request from SQLAlchemy engine events. ``SlowRequestProfiler`` is
+opt-in and writes a cProfile dump for sampled requests that turn out slow.
+"""
+import bisect
+import cProfile
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+
+from sqlalchemy import event
+
+# Seconds - from a cached location lookup up to a saturated registration
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def format_labels(names, values, extra=''):
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f'{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}'
+                for labels, value in values]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series = {}
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        with self._lock:
+            series = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count)
+                            in self._series.items())
+        lines = []
+        for labels, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{format_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(total)}')
+            lines.append(f'{self.name}_count{format_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+class Collected(Metric):
+    """Values read from ``collect()`` at scrape time: a number, or a dict of
+    {label value (or tuple of them): number}"""
+
+    def __init__(self, name, help, collect, labelnames=(), kind='gauge'):
+        super().__init__(name, help, labelnames)
+        self.collect = collect
+        self.kind = kind
+
+    def render(self):
+        values = self.collect()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f'{self.name}{format_labels(self.labelnames, labels if isinstance(labels, tuple) else (labels,))} '
+                f'{format_value(value)}'
+                for labels, value in sorted(values.items()) if isinstance(value, (int, float))]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def collected(self, name, help, collect, labelnames=(), kind='gauge'):
+        return self.register(Collected(name, help, collect, labelnames, kind))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = metric.render()
+            except Exception:
+                # One broken collector must not take the whole scrape down
+                continue
+            lines.extend(metric.header())
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+@lru_cache(maxsize=1024)
+def statement_kind(statement):
+    """'SELECT', 'INSERT', ... - cached, the same SQL strings come back every request"""
+    return (statement.split(None, 1) or ['?'])[0].upper()
+
+
+class QueryTracker:
+    """SQL statement count and time, in total and for the request in flight.
+
+    ``start()`` at the beginning of a request, ``finish()`` at the end
+    returns its ``(statements, seconds)``. Statements run outside a request
+    (background refreshes, CLI commands) only count towards the totals.
+    """
+
+    def __init__(self, registry):
+        self.duration = registry.histogram('db_query_duration_seconds', 'SQL statement execution time',
+                                           ['statement'])
+        self._current = ContextVar('query_tracker', default=None)
+
+    def install(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._before)
+        event.listen(engine, 'after_cursor_execute', self._after)
+
+    def _before(self, connection, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    def _after(self, connection, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_started
+        self.duration.observe(elapsed, statement_kind(statement))
+        current = self._current.get()
+        if current is not None:
+            current[0] += 1
+            current[1] += elapsed
+
+    def start(self):
+        self._current.set([0, 0.0])
+
+    def finish(self):
+        current = self._current.get()
+        self._current.set(None)
+        return tuple(current) if current is not None else (0, 0.0)
+
+
+class SlowRequestProfiler:
+    """Profiles a ``sample_rate`` share of requests and keeps a cProfile dump
+    (``<time>-<endpoint>-<ms>ms.prof``, readable with pstats or snakeviz)
+    of those slower than ``threshold_ms``. Only the newest ``keep`` dumps
+    are kept. A threshold of 0 turns it off."""
+
+    def __init__(self, threshold_ms, directory, sample_rate=0.1, keep=100):
+        self.threshold_ms = threshold_ms
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self.dumps = 0
+
+    @property
+    def enabled(self):
+        return self.threshold_ms > 0
+
+    def start(self):
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already running on this thread
+            return None
+        return profile
+
+    def finish(self, profile, duration_ms, label):
+        """Stop ``profile``; returns the dump's path when the request was slow"""
+        profile.disable()
+        if duration_ms < self.threshold_ms:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        safe_label = ''.join(c if c.isalnum() or c in '-_' else '_' for c in label or 'unmatched')
+        path = os.path.join(self.directory,
+                            f'{time.strftime("%Y%m%d-%H%M%S")}-{safe_label}-{int(duration_ms)}ms.prof')
+        profile.dump_stats(path)
+        self.dumps += 1
+        self._prune()
+        return path
+
+    def _prune(self):
+        dumps = sorted(entry.path for entry in os.scandir(self.directory) if entry.name.endswith('.prof'))
+        for path in dumps[:-self.keep]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
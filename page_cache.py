@@ -0,0 +1,214 @@
+"""Rendered page and fragment cache.
+
+Entries are stored with the version they were rendered from (for a user
+row, its ``updated_at``), so a changed user is never served from a stale
+entry even if an invalidation was missed or happened in another worker;
+explicit invalidation on update and delete just frees the space early.
+
+Two backends with the same small interface (``get``, ``set``, ``delete``,
+``clear`` over bytes): ``MemoryBackend`` is a per-process LRU,
+``FileBackend`` keeps entries on local disk so every worker on a host
+shares them. Both are bounded by total size.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+class MemoryBackend:
+    """LRU over total value size"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self.size -= len(value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FileBackend:
+    """One file per entry under ``directory``, shared by the workers on a
+    host. When the total passes ``max_bytes`` the oldest-written files are
+    removed until it is back under 90% of the limit."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(entry.stat().st_size for entry in self._files())
+
+    def _files(self):
+        for shard in os.scandir(self.directory):
+            if shard.is_dir():
+                yield from (entry for entry in os.scandir(shard.path) if not entry.name.endswith('.tmp'))
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp, 'wb') as f:
+            f.write(value)
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(temp, path)
+        with self._lock:
+            self.size += len(value) - replaced
+            over = self.size > self.max_bytes
+        if over:
+            self._evict()
+
+    def _evict(self):
+        with self._lock:
+            files = sorted(self._files(), key=lambda entry: entry.stat().st_mtime)
+            self.size = sum(entry.stat().st_size for entry in files)
+            for entry in files:
+                if self.size <= self.max_bytes * 0.9:
+                    break
+                try:
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+                self.size -= size
+                self.evictions += 1
+
+    def delete(self, key):
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self.size -= size
+
+    def clear(self):
+        with self._lock:
+            for entry in list(self._files()):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+            self.size = 0
+
+    def __len__(self):
+        return sum(1 for _ in self._files())
+
+
+class CachedPage:
+    __slots__ = ('body', 'etag')
+
+    def __init__(self, body, etag):
+        self.body = body
+        self.etag = etag
+
+
+def version_tag(version):
+    # Stored on the first line of an entry, so it must not contain a newline
+    return str(version).replace('\n', ' ')
+
+
+def make_page(body):
+    return CachedPage(body, hashlib.sha1(body.encode('utf-8')).hexdigest())
+
+
+class PageCache:
+    """``render(key, version, fn)`` returns the cached page for ``key`` if it
+    was rendered from ``version``, otherwise calls ``fn()`` and stores the
+    result. Pages carry an ETag computed once when they are stored.
+    ``bypass=True`` renders without reading or storing anything."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'invalidations': 0}
+
+    def _count(self, event, amount=1):
+        with self._lock:
+            self.stats[event] += amount
+
+    def get(self, key, version):
+        raw = self.backend.get(key)
+        if raw is not None:
+            stored_version, etag, body = raw.split(b'\n', 2)
+            if stored_version.decode('utf-8') == version_tag(version):
+                self._count('hits')
+                return CachedPage(body.decode('utf-8'), etag.decode('ascii'))
+            self._count('stale')
+        self._count('misses')
+        return None
+
+    def set(self, key, version, body):
+        page = make_page(body)
+        self.backend.set(key, b'\n'.join([version_tag(version).encode('utf-8'), page.etag.encode('ascii'),
+                                          body.encode('utf-8')]))
+        return page
+
+    def render(self, key, version, fn, bypass=False):
+        if bypass:
+            return make_page(fn())
+        return self.get(key, version) or self.set(key, version, fn())
+
+    def invalidate(self, *keys):
+        for key in keys:
+            self.backend.delete(key)
+        self._count('invalidations', len(keys))
+
+    def clear(self):
+        self.backend.clear()
+
+    def counters(self):
+        return dict(self.stats, evictions=self.backend.evictions)
@@ -0,0 +1,193 @@
+"""Cursor pagination for the admin dashboard.
+
+``OFFSET n`` makes the database walk and discard n rows, and the
+``COUNT(*)`` that ``paginate()`` issues scans the table on every view. The
+dashboard instead pages by key: the cursor carries the sort key of the
+first/last row on the page and the next page is a ``WHERE key < cursor``
+range read from the index, so page 5,000 costs the same as page 1. The
+total is served from a background-refreshed count.
+"""
+import base64
+import json
+import threading
+import time
+from datetime import date, datetime
+
+from sqlalchemy import and_, or_
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(payload):
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Malformed cursor')
+    if not isinstance(payload, dict):
+        raise InvalidCursor('Malformed cursor')
+    return payload
+
+
+class Page:
+    """What the dashboard template needs from a page of results"""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None, approximate=False):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.total_is_approximate = approximate
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+class KeysetPaginator:
+    """Pages a query ordered by ``columns`` descending (the last column must
+    be unique, e.g. the primary key)."""
+
+    def __init__(self, *columns):
+        self.columns = columns
+
+    def _key(self, item):
+        values = []
+        for column in self.columns:
+            value = getattr(item, column.key)
+            values.append(value.isoformat() if isinstance(value, (date, datetime)) else value)
+        return values
+
+    def _parse_key(self, values):
+        if not isinstance(values, list) or len(values) != len(self.columns):
+            raise InvalidCursor('Cursor does not match the sort key')
+        parsed = []
+        for column, value in zip(self.columns, values):
+            python_type = column.type.python_type
+            try:
+                parsed.append(python_type.fromisoformat(value) if python_type in (date, datetime)
+                              else python_type(value))
+            except (TypeError, ValueError):
+                raise InvalidCursor('Cursor does not match the sort key')
+        return parsed
+
+    def _beyond(self, key, descending):
+        """Rows strictly after ``key`` in the given direction, expanded so it
+        does not depend on row-value comparison support"""
+        clauses = []
+        for i, column in enumerate(self.columns):
+            step = column < key[i] if descending else column > key[i]
+            clauses.append(and_(*[self.columns[j] == key[j] for j in range(i)], step))
+        # The redundant inclusive bound on the leading column is what lets the
+        # planner seek the index instead of scanning it to evaluate the OR
+        leading = self.columns[0] <= key[0] if descending else self.columns[0] >= key[0]
+        return and_(leading, or_(*clauses))
+
+    def page(self, query, cursor, per_page):
+        payload = decode_cursor(cursor) if cursor else {}
+        direction = payload.get('d', 'next')
+        key = self._parse_key(payload['k']) if 'k' in payload else None
+
+        if direction == 'prev' and key is not None:
+            # Walk backwards from the cursor, then restore display order
+            rows = (query.filter(self._beyond(key, descending=False))
+                    .order_by(*[column.asc() for column in self.columns])
+                    .limit(per_page + 1).all())
+            more = len(rows) > per_page
+            items = list(reversed(rows[:per_page]))
+            has_prev, has_next = more, True
+        else:
+            if key is not None:
+                query = query.filter(self._beyond(key, descending=True))
+            rows = query.order_by(*[column.desc() for column in self.columns]).limit(per_page + 1).all()
+            more = len(rows) > per_page
+            items = rows[:per_page]
+            has_prev, has_next = key is not None, more
+
+        return Page(
+            items, per_page,
+            next_cursor=encode_cursor({'d': 'next', 'k': self._key(items[-1])}) if has_next and items else None,
+            prev_cursor=encode_cursor({'d': 'prev', 'k': self._key(items[0])}) if has_prev and items else None,
+        )
+
+
+def offset_page(query, cursor, per_page):
+    """Cursor-shaped offset paging for ranked search results, where there is
+    no stable sort key to seek on"""
+    payload = decode_cursor(cursor) if cursor else {}
+    offset = payload.get('o', 0)
+    if not isinstance(offset, int) or offset < 0:
+        raise InvalidCursor('Malformed cursor')
+
+    rows = query.offset(offset).limit(per_page + 1).all()
+    items = rows[:per_page]
+    return Page(
+        items, per_page,
+        next_cursor=encode_cursor({'o': offset + per_page}) if len(rows) > per_page else None,
+        prev_cursor=encode_cursor({'o': max(offset - per_page, 0)}) if offset > 0 else None,
+    )
+
+
+class CachedCount:
+    """A row count that is refreshed in the background.
+
+    ``counter()`` runs the real count; readers get the last value immediately
+    and at most one refresh runs at a time once it is older than ``ttl``.
+    ``adjust()`` keeps the value roughly right between refreshes.
+    """
+
+    def __init__(self, counter, ttl=60, clock=time.monotonic, spawn=None):
+        self.counter = counter
+        self.ttl = ttl
+        self.clock = clock
+        self.spawn = spawn or (lambda target: threading.Thread(target=target, daemon=True).start())
+        self._lock = threading.Lock()
+        self._value = None
+        self._refreshed_at = 0.0
+        self._refreshing = False
+
+    def get(self):
+        with self._lock:
+            value = self._value
+            stale = self.clock() - self._refreshed_at > self.ttl
+            start = stale and value is not None and not self._refreshing
+            if start:
+                self._refreshing = True
+
+        if value is None:
+            # First use: count synchronously once
+            return self._refresh()
+        if start:
+            self.spawn(self._refresh_in_background)
+        return value
+
+    def adjust(self, delta):
+        with self._lock:
+            if self._value is not None:
+                self._value = max(self._value + delta, 0)
+
+    def _refresh(self):
+        value = self.counter()
+        with self._lock:
+            self._value = value
+            self._refreshed_at = self.clock()
+        return value
+
+    def _refresh_in_background(self):
+        try:
+            self._refresh()
+        finally:
+            with self._lock:
+                self._refreshing = False
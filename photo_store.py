@@ -0,0 +1,237 @@
+"""Content-addressed storage for profile photos.
+
+Photos arrive from the registration form as base64 data URLs. They are decoded
+once, stored on disk under their SHA-256 digest (so identical uploads are kept
+only once) and the users table only keeps a short ``blob:<digest>.<ext>``
+reference. Thumbnails are generated at write time so serving them is a plain
+file send.
+
+Registration decodes a photo first (``decode_data_url``) and writes it with
+``store`` only once the user row is committed, so a rejected registration
+leaves no files behind. Since files are shared by content, deletes go through
+``delete_unused``, which re-checks the references under the same per-digest
+lock ``store`` takes.
+"""
+import base64
+import binascii
+import hashlib
+import io
+import os
+import re
+import threading
+from contextlib import ExitStack
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional - without it every size serves the original
+    Image = None
+
+REF_PREFIX = 'blob:'
+
+# Pre-generated thumbnail sizes (longest edge in pixels)
+THUMBNAIL_SIZES = {
+    'thumb': 64,
+    'small': 160,
+    'medium': 400,
+}
+
+ALLOWED_TYPES = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/jpg': 'jpg',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+}
+
+MIMETYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+}
+
+DATA_URL_RE = re.compile(r'^data:([\w/+.-]+);base64,', re.IGNORECASE)
+REF_RE = re.compile(r'^blob:([0-9a-f]{64})\.(png|jpg|gif|webp)$')
+
+
+class PhotoError(ValueError):
+    """Raised when an uploaded photo cannot be decoded or stored"""
+
+
+def is_blob_ref(value):
+    return bool(value) and value.startswith(REF_PREFIX)
+
+
+def parse_ref(ref):
+    """Return (digest, ext) for a stored reference, or None"""
+    match = REF_RE.match(ref or '')
+    return match.groups() if match else None
+
+
+class PendingPhoto:
+    """A decoded upload that is not on disk yet; ``ref`` is what the row keeps"""
+
+    __slots__ = ('raw', 'ext', 'digest', 'image')
+
+    def __init__(self, raw, ext, image):
+        self.raw = raw
+        self.ext = ext
+        self.digest = hashlib.sha256(raw).hexdigest()
+        self.image = image
+
+    @property
+    def ref(self):
+        return f'{REF_PREFIX}{self.digest}.{self.ext}'
+
+
+class PhotoStore:
+    LOCK_STRIPES = 64
+
+    def __init__(self, root, sizes=None):
+        self.root = root
+        self.sizes = dict(THUMBNAIL_SIZES if sizes is None else sizes)
+        # store() and delete_unused() of the same digest never overlap in this process
+        self._locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+
+    def _stripe(self, digest):
+        return int(digest[:8], 16) % self.LOCK_STRIPES
+
+    # ---------- paths ----------
+
+    def _dir_for(self, digest):
+        # Fan out on the first two hex chars so no directory grows unbounded
+        return os.path.join(self.root, digest[:2])
+
+    def path_for(self, digest, ext, size='original'):
+        if size == 'original' or Image is None:
+            return os.path.join(self._dir_for(digest), f'{digest}.{ext}')
+        return os.path.join(self._dir_for(digest), f'{digest}_{size}.jpg')
+
+    def mimetype_for(self, ext, size='original'):
+        if size == 'original' or Image is None:
+            return MIMETYPES[ext]
+        return 'image/jpeg'
+
+    # ---------- writes ----------
+
+    def save_data_url(self, data_url):
+        """Decode a base64 data URL and store it. Returns the blob reference."""
+        return self.store(self.decode_data_url(data_url))
+
+    def decode_data_url(self, data_url):
+        """Check and decode a base64 data URL without writing anything"""
+        match = DATA_URL_RE.match(data_url) if isinstance(data_url, str) else None
+        if not match:
+            raise PhotoError('Profile photo must be a base64 data URL')
+
+        ext = ALLOWED_TYPES.get(match.group(1).lower())
+        if not ext:
+            raise PhotoError(f'Unsupported photo type: {match.group(1)}')
+
+        try:
+            raw = base64.b64decode(data_url[match.end():], validate=True)
+        except (binascii.Error, ValueError):
+            raise PhotoError('Profile photo is not valid base64')
+
+        return self.decode_bytes(raw, ext)
+
+    def decode_bytes(self, raw, ext):
+        if not raw:
+            raise PhotoError('Profile photo is empty')
+        return PendingPhoto(raw, ext, self._open_image(raw))
+
+    def save_bytes(self, raw, ext):
+        return self.store(self.decode_bytes(raw, ext))
+
+    def store(self, photo):
+        """Write a decoded photo and its thumbnails. Returns the blob reference."""
+        digest, ext = photo.digest, photo.ext
+        with self._locks[self._stripe(digest)]:
+            # Same content already stored - nothing to write. The original goes
+            # last, so a save that dies halfway leaves no original behind; missing
+            # thumbnails next to an existing original are written again.
+            if not self.is_stored(digest, ext):
+                os.makedirs(self._dir_for(digest), exist_ok=True)
+                if photo.image is not None:
+                    self._write_thumbnails(photo.image, digest, ext)
+                self._write_atomic(self.path_for(digest, ext), photo.raw)
+        return photo.ref
+
+    def is_stored(self, digest, ext):
+        """True when the original and every thumbnail size are on disk"""
+        paths = [self.path_for(digest, ext)]
+        if Image is not None:
+            paths.extend(self.path_for(digest, ext, size) for size in self.sizes)
+        return all(os.path.exists(path) for path in paths)
+
+    def _open_image(self, raw):
+        if Image is None:
+            return None
+        try:
+            image = Image.open(io.BytesIO(raw))
+            image.load()
+        except Exception:
+            raise PhotoError('Profile photo is not a valid image')
+        return image
+
+    def _write_thumbnails(self, image, digest, ext):
+        if image.mode not in ('RGB', 'L'):
+            # Flatten transparency onto white - thumbnails are JPEG
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            rgba = image.convert('RGBA')
+            background.paste(rgba, mask=rgba.split()[-1])
+            image = background
+
+        for size, edge in self.sizes.items():
+            thumb = image.copy()
+            thumb.thumbnail((edge, edge))
+            buffer = io.BytesIO()
+            thumb.save(buffer, format='JPEG', quality=85, optimize=True)
+            self._write_atomic(self.path_for(digest, ext, size), buffer.getvalue())
+
+    @staticmethod
+    def _write_atomic(path, data):
+        # Unique per thread: two requests may upload the same photo at once
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    # ---------- deletes ----------
+
+    def delete_unused(self, refs, in_use):
+        """Remove the photos in ``refs`` that ``in_use(refs)`` - the subset
+        still referenced by committed rows - leaves out. Returns the removed refs.
+
+        The check and the removal run under the locks store() takes. Registration
+        commits its row before storing the photo, so a registration in this process
+        is either visible to ``in_use`` or writes the files again afterwards. For
+        another process, only the gap between the check and the unlink remains.
+        """
+        parsed = {ref: parse_ref(ref) for ref in refs}
+        parsed = {ref: value for ref, value in parsed.items() if value}
+        if not parsed:
+            return set()
+        with ExitStack() as stack:
+            # Always in stripe order, so two deletes cannot deadlock
+            for stripe in sorted({self._stripe(digest) for digest, _ in parsed.values()}):
+                stack.enter_context(self._locks[stripe])
+            unused = set(parsed) - set(in_use(set(parsed)))
+            for ref in unused:
+                self.delete(ref)
+        return unused
+
+    def delete(self, ref):
+        """Remove a stored photo and its thumbnails. Callers must make sure no
+        other row still references the same digest (see delete_unused)."""
+        parsed = parse_ref(ref)
+        if not parsed:
+            return
+        digest, ext = parsed
+        paths = {self.path_for(digest, ext)}
+        paths.update(self.path_for(digest, ext, size) for size in self.sizes)
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,274 @@
+"""Structured request logging.
+
+Every record is one JSON object per line. Request threads only put records
+on a queue; a listener thread formats and writes them, so a slow terminal or
+log shipper never holds up a response. Each request gets one summary record
+(method, route, status, duration_ms) that the handlers can add fields to with
+``annotate()``. Successful requests are sampled at ``sample_rate``; warnings
+and errors are always kept. Personal data (email, mobile, address, ...) is
+masked before a record is written.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import traceback
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import lru_cache
+
+LOGGER_NAME = 'registration'
+
+# Attributes every LogRecord has; anything else came in through extra= or annotate()
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+# Fields of the request in flight: request_id plus whatever annotate() added
+_context = ContextVar('request_log_context', default=None)
+_sampled = ContextVar('request_log_sampled', default=True)
+
+_sample_rate = 1.0
+
+
+# ---------- PII redaction ----------
+
+EMAIL_PATTERN = re.compile(r'([A-Za-z0-9._%+-])[A-Za-z0-9._%+-]*@([A-Za-z0-9.-]+\.[A-Za-z]{2,})')
+PHONE_PATTERN = re.compile(r'(?<!\d)\d{8}(\d{2})(?!\d)')
+
+
+def mask_email(value):
+    local, _, domain = str(value).partition('@')
+    return f'{local[:1]}***@{domain}' if domain else '***'
+
+
+def mask_phone(value):
+    value = str(value)
+    return '*' * max(len(value) - 2, 0) + value[-2:]
+
+
+def mask_all(value):
+    return '[redacted]'
+
+
+# Normalised field name (lower case, no _ or -) -> masking function
+PII_FIELDS = {
+    'email': mask_email, 'guardianemail': mask_email,
+    'mobile': mask_phone, 'phone': mask_phone, 'guardianphone': mask_phone,
+    'address': mask_all, 'dob': mask_all, 'postalcode': mask_all,
+    'password': mask_all, 'passwordhash': mask_all, 'securityanswer': mask_all,
+}
+
+
+def scrub(text):
+    """Mask email addresses and phone numbers in free text (messages, tracebacks)"""
+    if '@' in text:
+        text = EMAIL_PATTERN.sub(r'\1***@\2', text)
+    return PHONE_PATTERN.sub(lambda match: '*' * (len(match.group(0)) - 2) + match.group(1), text)
+
+
+@lru_cache(maxsize=1024)
+def mask_for(key):
+    return PII_FIELDS.get(key.lower().replace('_', '').replace('-', ''))
+
+
+def redact(fields):
+    """Copy of a dict of log fields with personal data masked"""
+    result = {}
+    for key, value in fields.items():
+        mask = mask_for(key)
+        if value is None:
+            result[key] = None
+        elif mask:
+            result[key] = mask(value)
+        elif isinstance(value, dict):
+            result[key] = redact(value)
+        elif isinstance(value, str):
+            result[key] = scrub(value)
+        else:
+            result[key] = value
+    return result
+
+
+# ---------- formatting ----------
+
+def extra_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RESERVED and not key.startswith('_')}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, message, extra fields, exc"""
+
+    # json.dumps() with options builds a new encoder on every call
+    encoder = json.JSONEncoder(default=str, ensure_ascii=False)
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': scrub(record.getMessage()),
+        }
+        entry.update(redact(extra_fields(record)))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = scrub(record.exc_text)
+        return self.encoder.encode(entry)
+
+
+class TextFormatter(logging.Formatter):
+    """``time LEVEL message key=value ...`` for reading in a terminal"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(message)s')
+
+    def format(self, record):
+        line = scrub(super().format(record))
+        fields = redact(extra_fields(record))
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        return line
+
+    def formatException(self, exc_info):
+        return scrub(super().formatException(exc_info))
+
+
+FORMATTERS = {'json': JsonFormatter, 'text': TextFormatter}
+
+
+# ---------- non-blocking hand-off ----------
+
+class ContextFilter(logging.Filter):
+    """Runs on the calling thread, where the request's context is visible:
+    attaches its fields and drops sub-WARNING records of unsampled requests"""
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING and not _sampled.get():
+            return False
+        context = _context.get()
+        if context:
+            for key, value in context.items():
+                if key not in _RESERVED and not hasattr(record, key):
+                    setattr(record, key, value)
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: when the queue is full the record is
+    dropped and counted instead of waiting for the writer to catch up"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Only the cheap, thread-sensitive work happens here: merge the args
+        # and render the traceback while its frames are still alive.
+        # JSON encoding and redaction are left to the listener thread. The
+        # record is not copied - this is the only handler the loggers have.
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = ''.join(traceback.format_exception(*record.exc_info)).rstrip()
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener = None
+_handler = None
+
+
+def configure(level='INFO', fmt='json', sample_rate=1.0, queue_size=10000, stream=None, loggers=()):
+    """Route the app logger (and any extra named loggers) through a queue to
+    ``stream``. Safe to call again; the previous listener is stopped."""
+    global _listener, _handler, _sample_rate
+    if fmt not in FORMATTERS:
+        raise ValueError(f'Unknown log format {fmt!r} (use {", ".join(FORMATTERS)})')
+    shutdown()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(FORMATTERS[fmt]())
+    log_queue = queue.Queue(maxsize=queue_size)
+    _handler = DroppingQueueHandler(log_queue)
+    _handler.addFilter(ContextFilter())
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+    _sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+
+    for name in (LOGGER_NAME, *loggers):
+        target = logging.getLogger(name)
+        target.handlers[:] = [_handler]
+        target.setLevel(level.upper() if isinstance(level, str) else level)
+        target.propagate = False
+    return _handler
+
+
+def shutdown():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown)
+
+
+def dropped():
+    """Records dropped because the queue was full"""
+    return _handler.dropped if _handler else 0
+
+
+def get_logger(name=None):
+    return logging.getLogger(f'{LOGGER_NAME}.{name}' if name else LOGGER_NAME)
+
+
+# ---------- per-request records ----------
+
+request_logger = get_logger('request')
+
+
+def begin_request(request_id=None):
+    """Start a request's log context and make its sampling decision.
+    Returns the request id (a fresh one unless the caller passed one in)."""
+    request_id = request_id or os.urandom(8).hex()
+    _context.set({'request_id': request_id})
+    _sampled.set(_sample_rate >= 1.0 or random.random() < _sample_rate)
+    return request_id
+
+
+def annotate(**fields):
+    """Add fields to every later record of the current request, including its summary"""
+    context = _context.get()
+    if context is not None:
+        context.update(fields)
+
+
+def log_request(method, route, status, duration_ms, **fields):
+    """The summary record of a request: 5xx are errors, 4xx warnings (both
+    always kept), everything else info (sampled)"""
+    level = logging.ERROR if status >= 500 else logging.WARNING if status >= 400 else logging.INFO
+    if not request_logger.isEnabledFor(level) or (level < logging.WARNING and not _sampled.get()):
+        return
+    # Built directly: Logger.log() would walk the stack to find the caller,
+    # the most expensive part of a record and useless for this one
+    record = request_logger.makeRecord(
+        request_logger.name, level, __file__, 0, f'{method} {route} {status}', None, None,
+        extra=dict(fields, method=method, route=route, status=status,
+                   duration_ms=round(duration_ms, 2), sample_rate=_sample_rate)
+    )
+    request_logger.handle(record)
+
+
+def end_request():
+    _context.set(None)
+    _sampled.set(True)
@@ -385,6 +385,56 @@ const validate = (field, shouldLog = false) => {
     return valid;
 };
 
+// Server-side checks are batched: fields blurred in quick succession are
+// validated together in one POST /api/validate round trip.
+const pendingServerChecks = new Map();
+let serverCheckTimer = null;
+
+const showServerResult = (f, result) => {
+    const err = f.parentElement.querySelector('.error-message') || document.getElementById(f.id + 'Error');
+    if (err) {
+        err.textContent = result.message;
+        err.style.color = result.valid ? '#00E676' : '#FF5252';
+        if (result.valid) console.log(`✅ ${f.id}: ${result.message}`);
+        setTimeout(() => err.style.color = '#FF5252', 3000);
+    }
+};
+
+const flushServerValidation = async () => {
+    serverCheckTimer = null;
+    const batch = new Map(pendingServerChecks);
+    pendingServerChecks.clear();
+    if (!batch.size) return;
+
+    const fields = {};
+    batch.forEach((f, id) => fields[id] = f.value.trim());
+    const payload = { fields };
+    if (batch.has('confirmPassword')) {
+        payload.passwordValue = document.getElementById('password').value;
+    }
+
+    try {
+        const response = await fetch('/api/validate', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(payload)
+        });
+        const { results } = await response.json();
+        Object.entries(results || {}).forEach(([id, result]) => {
+            const f = batch.get(id);
+            if (f) showServerResult(f, result);
+        });
+    } catch (error) {
+        console.error('Validation error:', error);
+    }
+};
+
+const queueServerValidation = f => {
+    pendingServerChecks.set(f.id, f);
+    clearTimeout(serverCheckTimer);
+    serverCheckTimer = setTimeout(flushServerValidation, 400);
+};
+
 // Apply filters and validation
 document.querySelectorAll('[data-rule]').forEach(f => {
     const rule = f.dataset.rule;
@@ -397,35 +447,9 @@ document.querySelectorAll('[data-rule]').forEach(f => {
         f.addEventListener('input', () => validate(f));
     }
     
-    f.addEventListener('blur', async () => { 
+    f.addEventListener('blur', () => { 
         const localValid = validate(f, true);
-        if (f.value.trim()) {
-            try {
-                const payload = { "field": f.id, "value": f.value.trim() };
-                if (f.id === 'confirmPassword') {
-                    payload.passwordValue = document.getElementById('password').value;
-                }
-                
-                const response = await fetch('/api/validate', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(payload)
-                });
-                
-                const result = await response.json();
-                const err = f.parentElement.querySelector('.error-message') || document.getElementById(f.id + 'Error');
-                
-                if (err) {
-                    err.textContent = result.message;
-                    err.style.color = result.valid ? '#00E676' : '#FF5252';
-                    if (result.valid) console.log(`✅ ${f.id}: ${result.message}`);
-                    setTimeout(() => err.style.color = '#FF5252', 3000);
-                }
-                
-            } catch (error) {
-                console.error('Validation error:', error);
-            }
-        }
+        if (f.value.trim()) queueServerValidation(f);
         if (!localValid && f.value.trim()) blockField(f); 
     });
     f.addEventListener('keydown', e => {
@@ -609,13 +633,23 @@ if (form) {
         }
         
         try {
-            const response = await fetch('/register', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(apiData)
-            });
+            let response;
+            for (let attempt = 1; ; attempt++) {
+                response = await fetch('/register', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                    },
+                    body: JSON.stringify(apiData)
+                });
+                // Server busy (hashing pool or registration queue full): wait as asked
+                // and retry a few times. Nothing was saved in that case; any other
+                // failure, like a 504 for a registration that may still complete, is not retried.
+                if (response.status !== 503 || !response.headers.has('Retry-After') || attempt >= 3) break;
+                const retryAfter = parseInt(response.headers.get('Retry-After'), 10) || 2;
+                console.log(`⏳ Server busy, retrying in ${retryAfter}s`);
+                await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+            }
             
             console.log('📡 Response status:', response.status);
             
@@ -693,13 +727,24 @@ if (photoUploadBtn && photoInput) {
     photoUploadBtn.addEventListener('keydown', e => (e.key === 'Enter' || e.key === ' ') && (e.preventDefault(), photoInput.click()));
 }
 
+// Location lists rarely change - reuse responses for the lifetime of the page.
+// The server also sends ETag/Cache-Control, so reloads hit the browser cache.
+const locationResponses = new Map();
+const fetchLocations = url => {
+    if (!locationResponses.has(url)) {
+        const pending = fetch(url).then(response => response.json());
+        pending.catch(() => locationResponses.delete(url));
+        locationResponses.set(url, pending);
+    }
+    return locationResponses.get(url);
+};
+
 // Load Countries
 document.addEventListener('DOMContentLoaded', async () => {
     const countrySelect = document.getElementById('country');
     
     try {
-        const response = await fetch('/api/countries');
-        const countries = await response.json();
+        const countries = await fetchLocations('/api/countries');
         
         if (Array.isArray(countries)) {
             countries.forEach(country => {
@@ -727,8 +772,7 @@ document.getElementById('country').addEventListener('change', async function() {
     if (countryId) {
         stateSelect.innerHTML = '<option value="">Loading...</option>';
         try {
-            const response = await fetch(`/api/states/${countryId}`);
-            const states = await response.json();
+            const states = await fetchLocations(`/api/states/${countryId}`);
             
             stateSelect.innerHTML = '<option value="">Select State</option>';
             if (Array.isArray(states) && states.length > 0) {
@@ -760,8 +804,7 @@ document.getElementById('state').addEventListener('change', async function() {
     if (countryId && stateId) {
         citySelect.innerHTML = '<option value="">Loading...</option>';
         try {
-            const response = await fetch(`/api/cities/${countryId}/${stateId}`);
-            const cities = await response.json();
+            const cities = await fetchLocations(`/api/cities/${countryId}/${stateId}`);
             
             citySelect.innerHTML = '<option value="">Select City</option>';
             if (Array.isArray(cities) && cities.length > 0) {
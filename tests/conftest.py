@@ -0,0 +1,75 @@
+import base64
+import io
+import os
+import sys
+import tempfile
+from datetime import date
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# app.py reads its settings at import time: point everything it writes at a
+# scratch directory before any test imports it
+WORKDIR = tempfile.mkdtemp(prefix='registration-tests-')
+os.chdir(WORKDIR)
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(WORKDIR, 'test.db')
+os.environ['PASSWORD_HASH_WORKERS'] = '0'
+os.environ['ASSETS_BUILD_ON_START'] = '0'
+os.environ['LOG_LEVEL'] = 'WARNING'
+for name in ('ASSETS_DIR', 'PROFILE_DIR', 'PAGE_CACHE_DIR', 'EXPORT_FOLDER'):
+    os.environ[name] = os.path.join(WORKDIR, name.lower())
+os.environ['LOCATION_INDEX_PATH'] = os.path.join(WORKDIR, 'locations.db')
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app
+    app.init_db()
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture(scope='session')
+def photo():
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (200, 10, 10)).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+
+@pytest.fixture
+def registration(photo):
+    """A valid /register payload; pass a number to get distinct username/email"""
+    def make(number=0, **fields):
+        data = dict(firstName='Ravi', lastName='Kumar', username=f'ravik{number}x', email=f'ravi.k{number}@mail.com',
+                    mobile='9845012345', dob='1995-05-17', gender='Male', address='12 MG Road, Bangalore',
+                    postalCode='560001', country='India', state='Karnataka', city='Bangalore',
+                    education='Masters', password='Secure@Pass1', securityQuestion='Pet name?',
+                    securityAnswer='Bruno', profilePhoto=photo)
+        data.update(fields)
+        return data
+    return make
+
+
+@pytest.fixture
+def make_users(app_module):
+    """Insert ``count`` users straight into the table; returns their ids"""
+    def make(prefix, count, profile_photo=None):
+        rows = [dict(first_name='Test', last_name='User', username=f'{prefix}{i}', email=f'{prefix}{i}@mail.com',
+                     mobile='9845012345', dob=date(1995, 5, 17), age=30, gender='Male', address='12 MG Road',
+                     postal_code='560001', country='India', state='Karnataka', city='Bangalore',
+                     education='Masters', profile_photo=profile_photo, security_question='Pet name?',
+                     security_answer='Bruno', password_hash='x')
+                for i in range(count)]
+        with app_module.app.app_context():
+            app_module.insert_users(rows)
+            User = app_module.User
+            return [user_id for user_id, in app_module.db.session.query(User.id)
+                    .filter(User.username.in_([row['username'] for row in rows])).order_by(User.id)]
+    return make
@@ -0,0 +1,114 @@
+import threading
+from datetime import datetime
+
+import pytest
+
+from admin_sessions import AdminIdentity, IdentityCache, WriteCoalescer
+
+
+@pytest.fixture
+def admin(app_module):
+    app, db, Admin = app_module.app, app_module.db, app_module.Admin
+    with app.app_context():
+        row = Admin(admin_username='editor', admin_email='editor@example.com', password_hash='x')
+        db.session.add(row)
+        db.session.commit()
+        admin_id = row.id
+    yield admin_id
+    with app.app_context():
+        db.session.query(Admin).filter_by(id=admin_id).delete()
+        db.session.commit()
+    app_module.admin_identities.clear()
+
+
+def test_identity_is_dropped_when_the_change_commits(app_module, admin):
+    db, Admin, identities = app_module.db, app_module.Admin, app_module.admin_identities
+    with app_module.app.app_context():
+        assert identities.get(admin).admin_username == 'editor'
+
+        row = db.session.get(Admin, admin)
+        row.admin_username = 'editor2'
+        db.session.flush()
+        # Another request reads the old row between the flush and the commit
+        identities.put(AdminIdentity(admin, 'editor', 'editor@example.com'))
+        db.session.commit()
+
+        assert identities.get(admin).admin_username == 'editor2'
+
+
+def test_identity_is_dropped_when_the_change_rolls_back(app_module, admin):
+    db, Admin, identities = app_module.db, app_module.Admin, app_module.admin_identities
+    with app_module.app.app_context():
+        row = db.session.get(Admin, admin)
+        row.admin_username = 'renamed'
+        db.session.flush()
+        # Read inside the transaction: sees the change that is about to be undone
+        assert identities.get(admin).admin_username == 'renamed'
+        db.session.rollback()
+
+        assert identities.get(admin).admin_username == 'editor'
+
+
+def test_load_racing_an_invalidation_is_not_cached():
+    loading = threading.Event()
+    finish = threading.Event()
+    names = iter(['stale', 'fresh'])
+
+    def load(admin_id):
+        name = next(names)
+        if name == 'stale':
+            loading.set()
+            finish.wait(5)
+        return AdminIdentity(admin_id, name, f'{name}@example.com')
+
+    cache = IdentityCache(load, ttl=60)
+    results = []
+    reader = threading.Thread(target=lambda: results.append(cache.get(1)))
+    reader.start()
+    assert loading.wait(5)
+    cache.invalidate(1)
+    finish.set()
+    reader.join(5)
+
+    # The racing request still gets what it read, but nobody else does
+    assert results[0].admin_username == 'stale'
+    assert cache.get(1).admin_username == 'fresh'
+    assert cache.get(1).admin_username == 'fresh'
+    assert cache.stats == {'hits': 1, 'misses': 2, 'invalidations': 1}
+
+
+def test_login_writes_last_login_in_a_batch(app_module, client):
+    Admin, last_logins = app_module.Admin, app_module.last_logins
+    response = client.post('/admin/login', data={'username': 'admin', 'password': 'admin123'})
+    assert response.status_code == 302
+    assert last_logins.pending() == 1
+
+    with app_module.app.app_context():
+        admin_id = Admin.query.filter_by(admin_username='admin').one().id
+    latest = datetime(2030, 1, 2, 3, 4, 5)
+    last_logins.record(admin_id, latest)
+    assert last_logins.flush_now() == 1
+    assert last_logins.pending() == 0
+
+    with app_module.app.app_context():
+        assert app_module.db.session.get(Admin, admin_id).last_login == latest
+
+
+def test_failed_flush_keeps_newer_values():
+    calls = []
+
+    def flush(pending):
+        calls.append(dict(pending))
+        if len(calls) == 1:
+            coalescer.record('a', 2)
+            raise RuntimeError('database is locked')
+
+    coalescer = WriteCoalescer(flush, interval=60)
+    coalescer.record('a', 1)
+    coalescer.record('b', 1)
+    with pytest.raises(RuntimeError):
+        coalescer.flush_now()
+    assert coalescer.flush_now() == 2
+
+    assert calls == [{'a': 1, 'b': 1}, {'a': 2, 'b': 1}]
+    assert coalescer.failures == 1
@@ -0,0 +1,40 @@
+from sqlalchemy import event
+
+
+def count_statements(app_module, run):
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+
+    engine = app_module.db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        run()
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    return len(statements)
+
+
+def test_delete_costs_the_same_statements_per_chunk_at_any_size(app_module, make_users, monkeypatch):
+    chunk_size = 50
+    monkeypatch.setattr(app_module, 'BULK_CHUNK_SIZE', chunk_size)
+    # Every user has a photo, so each chunk also runs the shared-photo check
+    photo = 'blob:' + '0' * 64 + '.png'
+    small = make_users('delsmall', 10, profile_photo=photo)
+    large = make_users('dellarge', 2 * chunk_size, profile_photo=photo)
+
+    with app_module.app.app_context():
+        counts = {}
+        for name, ids in (('small', small), ('large', large)):
+            progress = []
+            counts[name] = count_statements(app_module,
+                                            lambda: progress.extend(app_module.iter_delete_users(ids)))
+            assert progress[-1]['deleted'] == len(ids)
+            assert len(progress) == -(-len(ids) // chunk_size)
+        assert app_module.User.query.filter(app_module.User.id.in_(small + large)).count() == 0
+        # DELETE ... RETURNING (or SELECT then DELETE), the shared-photo SELECT, the counts executemany
+        per_chunk = 3 if app_module.db.engine.dialect.delete_returning else 4
+
+    assert counts['small'] == per_chunk
+    assert counts['large'] == 2 * per_chunk
@@ -0,0 +1,28 @@
+from sqlalchemy import event
+
+
+def test_find_taken_splits_large_chunks(app_module, client, registration):
+    assert client.post('/register', json=registration(50)).status_code == 201
+    rows = [{'username': f'new{i}', 'email': f'new{i}@mail.com'} for i in range(2 * app_module.IMPORT_LOOKUP_ROWS + 100)]
+    rows[-1]['username'] = 'ravik50x'
+    rows[5]['email'] = 'ravi.k50@mail.com'
+
+    selects = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            selects.append(len(parameters))
+
+    with app_module.app.app_context():
+        engine = app_module.db.engine
+        event.listen(engine, 'before_cursor_execute', count)
+        try:
+            usernames, emails = app_module.find_taken(rows)
+        finally:
+            event.remove(engine, 'before_cursor_execute', count)
+
+    assert usernames == {'ravik50x'}
+    assert emails == {'ravi.k50@mail.com'}
+    # Three lookups, none binding more than two values per row of its part
+    assert len(selects) == 3
+    assert max(selects) <= 2 * app_module.IMPORT_LOOKUP_ROWS
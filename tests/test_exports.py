@@ -0,0 +1,98 @@
+import contextlib
+import hashlib
+import json
+import threading
+import time
+
+import pytest
+
+from exports import ExportJob, ExportJobs
+
+
+class Interrupted(BaseException):
+    """Stands in for whatever gets past ``except Exception`` in a worker"""
+
+
+def make_jobs(directory, source, **options):
+    return ExportJobs(str(directory), source, contextlib.nullcontext, headers={'id': 'ID'},
+                      formatters={'id': None}, sql_types={}, **options)
+
+
+def wait_for(jobs, job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while job.active and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return jobs.get(job.id)
+
+
+def test_interrupted_job_is_recorded_as_failed(tmp_path):
+    def source(columns, start, end):
+        yield (1,)
+        raise Interrupted()
+
+    jobs = make_jobs(tmp_path, source)
+    job, _ = jobs.submit('csv', ['id'])
+    job = wait_for(jobs, job)
+
+    assert job.status == 'failed'
+    with open(tmp_path / f'{job.id}.json') as f:
+        assert json.load(f)['status'] == 'failed'
+
+
+def write_status(directory, job_id, status, age, key='key'):
+    job = ExportJob(job_id, key, 'csv', ['id'])
+    job.status = status
+    job.created_at = job.updated_at = time.time() - age
+    with open(directory / f'{job.id}.json', 'w') as f:
+        json.dump(job.to_dict(), f)
+    return job
+
+
+@pytest.mark.parametrize('status', ['queued', 'running'])
+def test_active_job_without_heartbeat_expires(tmp_path, status):
+    job = write_status(tmp_path, 'a' * 32, status, age=3600)
+
+    # Another process looks at it: nobody has touched it for an hour
+    jobs = make_jobs(tmp_path, None, stale_after=600)
+    expired = jobs.get(job.id)
+    assert expired.status == 'failed'
+    assert not expired.active
+    with open(tmp_path / f'{job.id}.json') as f:
+        assert json.load(f)['status'] == 'failed'
+
+    jobs.retention = 0
+    jobs.cleanup()
+    assert jobs.get(job.id) is None
+
+
+def test_heartbeat_covers_slow_and_queued_jobs(tmp_path):
+    release = threading.Event()
+
+    def source(columns, start, end):
+        # A slow query: no rows for a while
+        release.wait(5)
+        yield (1,)
+
+    jobs = make_jobs(tmp_path, source, max_workers=1, heartbeat=0.02, stale_after=0.1)
+    running, _ = jobs.submit('csv', ['id'])
+    queued, _ = jobs.submit('jsonl', ['id'])
+    time.sleep(0.3)
+
+    # Another process sees both as alive, well past stale_after
+    other = make_jobs(tmp_path, None, stale_after=0.1)
+    assert other.get(running.id).status == 'running'
+    assert other.get(queued.id).status == 'queued'
+
+    release.set()
+    assert wait_for(jobs, running).status == 'done'
+    assert wait_for(jobs, queued).status == 'done'
+
+
+def test_identical_export_running_in_another_process_is_reused(tmp_path):
+    jobs = make_jobs(tmp_path, None)
+    key = hashlib.sha1(json.dumps(['csv', ['id'], None, None]).encode()).hexdigest()
+    elsewhere = write_status(tmp_path, 'b' * 32, 'running', age=1, key=key)
+
+    job, started = jobs.submit('csv', ['id'])
+    assert not started
+    assert job.id == elsewhere.id
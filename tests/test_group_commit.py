@@ -0,0 +1,64 @@
+import os
+import threading
+
+from group_commit import GroupCommitQueue, QueueFull
+
+
+def client_retries(response):
+    """The resubmit rule of the registration form in script.js"""
+    return response.status_code == 503 and 'Retry-After' in response.headers
+
+
+def test_form_retry_rule_matches_script():
+    with open(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'script.js'), encoding='utf-8') as f:
+        script = f.read()
+    assert "if (response.status !== 503 || !response.headers.has('Retry-After') || attempt >= 3) break;" in script
+
+
+def test_late_batch_answers_504_that_the_form_does_not_retry(app_module, client, registration, monkeypatch):
+    release = threading.Event()
+    written = []
+
+    def slow_write(rows):
+        release.wait(5)
+        written.extend(rows)
+        return list(range(1, len(rows) + 1))
+
+    queue = GroupCommitQueue(slow_write, max_wait_ms=0)
+    monkeypatch.setattr(app_module, 'registration_queue', queue)
+    monkeypatch.setattr(app_module, 'GROUP_COMMIT_TIMEOUT', 0.2)
+    try:
+        response = client.post('/register', json=registration(1))
+        assert response.status_code == 504
+        assert 'Retry-After' not in response.headers
+        assert not client_retries(response)
+        body = response.get_json()
+        assert body['success'] is False
+        assert 'may still complete' in body['message']
+    finally:
+        release.set()
+        queue.shutdown()
+    # The row was not dropped: it is written once the writer catches up
+    assert [row['username'] for row in written] == ['ravik1x']
+
+
+def test_full_queue_answers_503_that_the_form_retries(app_module, client, registration, monkeypatch):
+    class FullQueue:
+        def submit(self, row):
+            raise QueueFull(retry_after=2)
+
+    monkeypatch.setattr(app_module, 'registration_queue', FullQueue())
+    response = client.post('/register', json=registration(2))
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '2'
+    assert client_retries(response)
+
+
+def test_batch_results_resolve_each_future():
+    queue = GroupCommitQueue(lambda rows: [row * 10 if row else ValueError('zero') for row in rows],
+                             max_wait_ms=20)
+    futures = [queue.submit(row) for row in (1, 0, 2)]
+    assert futures[0].result(1) == 10
+    assert isinstance(futures[1].exception(1), ValueError)
+    assert futures[2].result(1) == 20
+    queue.shutdown()
@@ -0,0 +1,110 @@
+import json
+import threading
+
+from locations import LocationCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeUpstream:
+    """Loader that counts calls and answers with a version number per key"""
+
+    def __init__(self):
+        self.calls = []
+        self.version = 1
+        self.fail = False
+
+    def __call__(self, key):
+        self.calls.append(key)
+        if self.fail:
+            raise ConnectionError('upstream down')
+        return {'key': key, 'version': self.version}
+
+
+def body(entry):
+    return json.loads(entry.body)
+
+
+def make_cache(**options):
+    clock, upstream, spawned = FakeClock(), FakeUpstream(), []
+    cache = LocationCache(upstream, clock=clock, spawn=spawned.append, **options)
+    return cache, clock, upstream, spawned
+
+
+def test_entries_are_fresh_for_ttl_then_reloaded_after_stale_ttl():
+    cache, clock, upstream, spawned = make_cache(ttl=60, stale_ttl=300)
+    assert body(cache.get('countries')) == {'key': 'countries', 'version': 1}
+
+    clock.now += 60
+    cache.get('countries')
+    assert upstream.calls == ['countries']
+    assert spawned == []
+
+    # Past ttl + stale_ttl the entry is dropped and loaded in the request
+    clock.now += 301
+    upstream.version = 2
+    assert body(cache.get('countries'))['version'] == 2
+    assert upstream.calls == ['countries', 'countries']
+    assert cache.stats['misses'] == 2 and cache.stats['hits'] == 1
+
+
+def test_stale_entry_is_served_while_one_refresh_runs():
+    cache, clock, upstream, spawned = make_cache(ttl=60, stale_ttl=300)
+    cache.get('states/101')
+    clock.now += 120
+    upstream.version = 2
+
+    results = []
+    readers = [threading.Thread(target=lambda: results.append(cache.get('states/101'))) for _ in range(8)]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join(5)
+
+    # Every reader got the stale copy straight away; one refresh was started
+    assert [body(entry)['version'] for entry in results] == [1] * 8
+    assert len(spawned) == 1
+    assert cache.stats['stale_hits'] == 8
+
+    spawned.pop()()
+    assert upstream.calls == ['states/101', 'states/101']
+    assert body(cache.get('states/101'))['version'] == 2
+    assert cache.stats['refreshes'] == 1
+
+    # Once that refresh is done, the next stale read may start another
+    clock.now += 120
+    cache.get('states/101')
+    assert len(spawned) == 1
+
+
+def test_failed_refresh_keeps_the_stale_entry():
+    cache, clock, upstream, spawned = make_cache(ttl=60, stale_ttl=300)
+    cache.get('cities/101/4026')
+    clock.now += 120
+    upstream.fail = True
+    cache.get('cities/101/4026')
+    spawned.pop()()
+
+    assert body(cache.get('cities/101/4026'))['version'] == 1
+    assert cache.stats['errors'] == 1
+    assert len(spawned) == 1
+
+
+def test_least_recently_used_entry_is_evicted_at_capacity():
+    cache, clock, upstream, spawned = make_cache(max_entries=2)
+    cache.get('a')
+    cache.get('b')
+    cache.get('a')  # 'b' is now the least recently used
+    cache.get('c')
+
+    assert len(cache) == 2
+    assert cache.stats['evictions'] == 1
+    assert cache.peek('b') is None
+    assert cache.peek('a') is not None and cache.peek('c') is not None
+    assert upstream.calls == ['a', 'b', 'c']
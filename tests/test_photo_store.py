@@ -0,0 +1,86 @@
+import base64
+import hashlib
+import io
+import os
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from photo_store import PhotoStore, parse_ref
+
+
+@pytest.fixture
+def png():
+    buffer = io.BytesIO()
+    Image.new('RGBA', (300, 200), (10, 120, 200, 128)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_missing_thumbnails_are_written_again(tmp_path, png):
+    store = PhotoStore(str(tmp_path))
+    digest, ext = parse_ref(store.save_bytes(png, 'png'))
+    thumb = store.path_for(digest, ext, 'small')
+    os.remove(thumb)
+
+    assert not store.is_stored(digest, ext)
+    store.save_bytes(png, 'png')
+    assert os.path.exists(thumb)
+    assert store.is_stored(digest, ext)
+
+
+def test_original_is_not_published_when_thumbnails_fail(tmp_path, png, monkeypatch):
+    store = PhotoStore(str(tmp_path))
+
+    def broken(*args):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(store, '_write_thumbnails', broken)
+    with pytest.raises(OSError):
+        store.save_bytes(png, 'png')
+
+    assert not os.path.exists(store.path_for(hashlib.sha256(png).hexdigest(), 'png'))
+    monkeypatch.undo()
+    digest, ext = parse_ref(store.save_bytes(png, 'png'))
+    assert store.is_stored(digest, ext)
+
+
+def test_delete_waits_for_a_concurrent_store_of_the_same_photo(tmp_path, png):
+    store = PhotoStore(str(tmp_path))
+    ref = store.save_bytes(png, 'png')
+    photo = store.decode_bytes(png, 'png')
+    storing = threading.Thread(target=store.store, args=(photo,))
+
+    def in_use(refs):
+        # A registration of the same bytes commits its row and stores the photo
+        # just after this check: its store() has to wait for the delete
+        storing.start()
+        time.sleep(0.05)
+        return set()
+
+    assert store.delete_unused({ref}, in_use) == {ref}
+    storing.join(5)
+    assert store.is_stored(*parse_ref(ref))
+
+
+def test_delete_keeps_photos_still_referenced(tmp_path, png):
+    store = PhotoStore(str(tmp_path))
+    ref = store.save_bytes(png, 'png')
+    assert store.delete_unused({ref, 'not-a-ref'}, lambda refs: {ref}) == set()
+    assert store.is_stored(*parse_ref(ref))
+
+
+def test_duplicate_caught_at_insert_leaves_no_photo(app_module, client, registration, monkeypatch):
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 40), (1, 2, 3)).save(buffer, 'PNG')
+    other = 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode()
+    digest = hashlib.sha256(buffer.getvalue()).hexdigest()
+
+    assert client.post('/register', json=registration(70)).status_code == 201
+    # The availability index lost the race, so only the unique constraint catches it
+    monkeypatch.setattr(app_module.availability, 'might_exist', lambda *args: False)
+    response = client.post('/register', json=registration(70, email='other70@mail.com', profilePhoto=other))
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Username or email is already registered'
+    assert not os.path.exists(app_module.photo_store.path_for(digest, 'png'))
@@ -0,0 +1,31 @@
+import itertools
+import random
+
+import pytest
+
+from benchmark import ADVERSARIAL_INPUTS, REALISTIC_INPUTS, random_strings, reference_has_repeated_pattern
+from validators import has_repeated_pattern
+
+EDGE_CASES = [
+    '', 'a', 'ab', 'abc', 'aa', 'aaa', 'aaaaaa', 'abab', 'ababa', 'ababab', 'abcabc', 'abcabcab', 'abcabcabc',
+    'xababab', 'abababx', 'aabaabaab', 'bcdfghjk', 'bcdfghja', 'bcdfgaei', 'BCDFGHJK', '12345678', 'bcd!!!!!',
+    'é' * 8, 'ab' * 50, 'abc' * 50, 'Ravi Kumar',
+]
+
+
+@pytest.mark.parametrize('value', EDGE_CASES + REALISTIC_INPUTS + ADVERSARIAL_INPUTS)
+def test_matches_reference_on_known_inputs(value):
+    assert has_repeated_pattern(value) == reference_has_repeated_pattern(value)
+
+
+@pytest.mark.parametrize('alphabet, max_length', [('ab', 10), ('aB1', 7), ('bcx', 7)])
+def test_matches_reference_on_every_short_string(alphabet, max_length):
+    for length in range(max_length + 1):
+        for letters in itertools.product(alphabet, repeat=length):
+            value = ''.join(letters)
+            assert has_repeated_pattern(value) == reference_has_repeated_pattern(value), value
+
+
+def test_matches_reference_on_random_strings():
+    for value in random_strings(random.Random(1234), 5000):
+        assert has_repeated_pattern(value) == reference_has_repeated_pattern(value), value
@@ -0,0 +1,127 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from locations import CircuitOpenError, UpstreamClient, UpstreamError
+
+
+class StubUpstream(ThreadingHTTPServer):
+    """Local stand-in for the location API: answers every GET with
+    ``status`` after ``delay`` seconds and counts the hits"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.status = 200
+        self.delay = 0
+        self.hits = []
+        self.url = f'http://127.0.0.1:{self.server_port}'
+
+    def handle_error(self, request, client_address):
+        # A client that timed out has hung up before the reply; that is the test
+        pass
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.hits.append(self.path)
+        time.sleep(self.server.delay)
+        body = json.dumps([{'id': 1, 'name': self.path}]).encode()
+        self.send_response(self.server.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def upstream():
+    server = StubUpstream()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_concurrent_identical_requests_share_one_fetch(upstream):
+    upstream.delay = 0.3
+    client = UpstreamClient(upstream.url)
+    futures = [client.submit('/countries') for _ in range(10)]
+    results = [future.result(5) for future in futures]
+
+    assert upstream.hits == ['/countries']
+    assert all(result == [{'id': 1, 'name': '/countries'}] for result in results)
+    assert client.metrics['coalesced'] == 9
+    assert client.metrics['requests'] == 1
+
+
+def test_breaker_opens_after_threshold_and_short_circuits(upstream):
+    upstream.status = 500
+    client = UpstreamClient(upstream.url, failure_threshold=3, reset_timeout=30, clock=FakeClock())
+    for _ in range(3):
+        with pytest.raises(UpstreamError):
+            client.get_json('/countries')
+    assert client.state == UpstreamClient.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        client.get_json('/countries')
+    assert len(upstream.hits) == 3
+    assert client.metrics['short_circuited'] == 1
+    assert client.metrics['breaker_opens'] == 1
+
+
+def test_half_open_probe_closes_the_breaker(upstream):
+    clock = FakeClock()
+    client = UpstreamClient(upstream.url, failure_threshold=2, reset_timeout=30, clock=clock)
+    upstream.status = 500
+    for _ in range(2):
+        with pytest.raises(UpstreamError):
+            client.get_json('/states/1')
+    assert client.state == UpstreamClient.OPEN
+
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        client.get_json('/states/1')
+
+    # Past reset_timeout one trial goes through; other calls still fail fast
+    clock.now += 2
+    upstream.status = 200
+    upstream.delay = 0.3
+    trial = client.submit('/states/1')
+    with pytest.raises(CircuitOpenError):
+        client.submit('/states/2')
+    assert trial.result(5) == [{'id': 1, 'name': '/states/1'}]
+    assert client.state == UpstreamClient.CLOSED
+
+    upstream.delay = 0
+    assert client.get_json('/states/2') == [{'id': 1, 'name': '/states/2'}]
+    assert len(upstream.hits) == 4
+
+
+def test_slow_upstream_counts_as_timeout(upstream):
+    upstream.delay = 0.5
+    outcomes = []
+    client = UpstreamClient(upstream.url, timeout=0.1, observer=lambda seconds, outcome: outcomes.append(outcome))
+    with pytest.raises(UpstreamError):
+        client.get_json('/cities/1/2')
+
+    assert client.metrics['timeouts'] == 1
+    assert client.metrics['failures'] == 1
+    assert outcomes == ['timeout']
+    assert client.stats()['consecutive_failures'] == 1
@@ -0,0 +1,57 @@
+import pytest
+
+from validators import validate_field
+
+NOT_STRINGS = [123, 1.5, True, ['ravi'], {'name': 'ravi'}]
+
+
+@pytest.mark.parametrize('value', NOT_STRINGS)
+def test_rules_reject_values_that_are_not_strings(value):
+    assert validate_field('username', value) == (False, 'Value must be a string')
+    assert validate_field('unknownField', value) == (False, 'Value must be a string')
+
+
+def test_batch_validate_reports_non_string_per_field(client):
+    response = client.post('/api/validate', json={'fields': {'username': 123, 'firstName': 'Ravi'}})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert results['username'] == {'valid': False, 'message': 'Value must be a string'}
+    assert results['firstName']['valid'] is True
+
+
+def test_single_validate_reports_non_string(client):
+    response = client.post('/api/validate', json={'field': 'email', 'value': ['a@b.com']})
+    assert response.status_code == 200
+    assert response.get_json() == {'valid': False, 'message': 'Value must be a string'}
+
+
+@pytest.mark.parametrize('body', [[1, 2], 'text', {'field': ['username'], 'value': 'x'}])
+def test_validate_rejects_malformed_bodies(client, body):
+    assert client.post('/api/validate', json=body).status_code == 400
+
+
+@pytest.mark.parametrize('field, value', [('username', 123), ('gender', {'m': 1}), ('profilePhoto', 5)])
+def test_register_rejects_non_string_fields(client, registration, field, value):
+    response = client.post('/register', json=registration(60, **{field: value}))
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_register_rejects_a_body_that_is_not_an_object(client):
+    assert client.post('/register', json=['username', 'email']).status_code == 400
+
+
+def test_async_validate_reports_non_string(registration):
+    pytest.importorskip('starlette')
+    pytest.importorskip('aiosqlite')
+    from starlette.testclient import TestClient
+    import asgi
+
+    with TestClient(asgi.application) as client:
+        response = client.post('/api/validate', json={'fields': {'username': 123}})
+        assert response.status_code == 200
+        assert response.json()['results']['username'] == {'valid': False, 'message': 'Value must be a string'}
+        assert client.post('/api/validate', json=[1]).status_code == 400
+        response = client.post('/register', json=registration(61, username=5))
+        assert response.status_code == 400
+        assert response.json()['errors'] == {'username': 'Value must be a string'}
@@ -0,0 +1,120 @@
+"""Admin dashboard search over names, username and email.
+
+The dashboard used to OR four ``ILIKE '%q%'`` predicates, which always scans
+the whole users table. Each backend here keeps a real index instead and
+returns ranked matches:
+
+* SQLite - an FTS5 table with the trigram tokenizer (substring matching,
+  case-insensitive, ranked by bm25), kept in sync by triggers.
+* PostgreSQL - pg_trgm GIN indexes on the searched columns, which serve the
+  same ILIKE predicates, ranked by trigram similarity.
+* Anything else - the plain ILIKE scan.
+
+Queries shorter than three characters cannot use a trigram index and fall
+back to the ILIKE scan on every backend.
+"""
+from sqlalchemy import Float, Integer, func, or_, text
+
+SEARCH_COLUMNS = ('first_name', 'last_name', 'username', 'email')
+MIN_INDEXED_LENGTH = 3
+
+
+def ilike_filter(model, query_text):
+    pattern = f'%{query_text}%'
+    return or_(*[getattr(model, column).ilike(pattern) for column in SEARCH_COLUMNS])
+
+
+class LikeSearch:
+    name = 'ilike'
+
+    def __init__(self, model):
+        self.model = model
+
+    def install(self, connection):
+        pass
+
+    def rebuild(self, connection):
+        pass
+
+    def apply(self, query, query_text):
+        """Filter a User query by query_text and order it by relevance"""
+        return query.filter(ilike_filter(self.model, query_text)).order_by(self.model.created_at.desc())
+
+
+class SqliteFtsSearch(LikeSearch):
+    name = 'sqlite-fts5'
+
+    def install(self, connection):
+        columns = ', '.join(SEARCH_COLUMNS)
+        new_values = ', '.join(f'new.{column}' for column in SEARCH_COLUMNS)
+        old_values = ', '.join(f'old.{column}' for column in SEARCH_COLUMNS)
+
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'")).first()
+
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5("
+            f"{columns}, content='users', content_rowid='id', tokenize='trigram')"))
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN "
+            f"INSERT INTO users_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"))
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN "
+            f"INSERT INTO users_fts(users_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"))
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE OF {columns} ON users BEGIN "
+            f"INSERT INTO users_fts(users_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO users_fts(rowid, {columns}) VALUES (new.id, {new_values}); END"))
+
+        if not exists:
+            # Index the rows that were there before the table existed
+            self.rebuild(connection)
+
+    def rebuild(self, connection):
+        connection.execute(text("INSERT INTO users_fts(users_fts) VALUES ('rebuild')"))
+
+    def apply(self, query, query_text):
+        if len(query_text) < MIN_INDEXED_LENGTH:
+            return super().apply(query, query_text)
+
+        # A quoted FTS5 string is a phrase; with the trigram tokenizer that is
+        # a case-insensitive substring match, the same semantics as ILIKE
+        phrase = '"' + query_text.replace('"', '""') + '"'
+        matches = (text("SELECT rowid AS id, bm25(users_fts) AS rank FROM users_fts WHERE users_fts MATCH :phrase")
+                   .bindparams(phrase=phrase)
+                   .columns(id=Integer, rank=Float)
+                   .subquery('fts'))
+        return (query.join(matches, matches.c.id == self.model.id)
+                .order_by(matches.c.rank, self.model.created_at.desc()))
+
+
+class PostgresTrigramSearch(LikeSearch):
+    name = 'postgres-trigram'
+
+    def install(self, connection):
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for column in SEARCH_COLUMNS:
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_users_{column}_trgm ON users USING gin ({column} gin_trgm_ops)"))
+
+    def rebuild(self, connection):
+        for column in SEARCH_COLUMNS:
+            connection.execute(text(f"REINDEX INDEX ix_users_{column}_trgm"))
+
+    def apply(self, query, query_text):
+        if len(query_text) < MIN_INDEXED_LENGTH:
+            return super().apply(query, query_text)
+
+        # The ILIKE predicates are served by the GIN indexes (bitmap OR)
+        rank = func.greatest(*[func.similarity(getattr(self.model, column), query_text)
+                               for column in SEARCH_COLUMNS])
+        return (query.filter(ilike_filter(self.model, query_text))
+                .order_by(rank.desc(), self.model.created_at.desc()))
+
+
+def search_backend(model, dialect_name):
+    if dialect_name == 'sqlite':
+        return SqliteFtsSearch(model)
+    if dialect_name == 'postgresql':
+        return PostgresTrigramSearch(model)
+    return LikeSearch(model)
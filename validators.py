@@ -0,0 +1,255 @@
+"""Field validation rules shared by /api/validate and /register.
+
+Rules are declared in ``validation_rules.json`` (or the file named by
+``VALIDATION_RULES_PATH``): named rule lists made of simple checks, and a
+table mapping each form field id to a rule list and success message. At
+import time every check is compiled into a closure - regexes are compiled
+once and blocklists become frozensets - so validating a field is a dict
+lookup followed by a handful of function calls.
+
+Checks that need the database (username / email uniqueness) are layered on
+top in ``app.py`` so they can be batched.
+"""
+import json
+import os
+import re
+from datetime import datetime
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'validation_rules.json')
+
+
+class RuleConfigError(ValueError):
+    """Raised when the rules file references an unknown check, rule list or blocklist"""
+
+
+def calculate_age(dob):
+    """Calculate age from date of birth"""
+    today = datetime.today()
+    return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+
+
+_ASCII_LETTERS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ')
+_CONSONANTS = frozenset('bcdfghjklmnpqrstvwxyzBCDFGHJKLMNPQRSTVWXYZ')
+
+
+def has_repeated_pattern(value):
+    """Check for repeated patterns and consonant-heavy gibberish.
+
+    1. A substring of length 2 or 3 repeating 3+ times consecutively. A run
+       like "ababab" means value[j] == value[j-2] for 4 positions in a row
+       (6 positions for period 3), so both periods are tracked as run
+       counters in a single pass.
+    2. Strings of 8+ characters where more than 75% of the ASCII letters
+       are consonants.
+    """
+    run2 = run3 = letters = consonants = 0
+    back1 = back2 = back3 = None
+    for ch in value:
+        if ch == back2:
+            run2 += 1
+            if run2 == 4:
+                return True
+        else:
+            run2 = 0
+        if ch == back3:
+            run3 += 1
+            if run3 == 6:
+                return True
+        else:
+            run3 = 0
+        if ch in _ASCII_LETTERS:
+            letters += 1
+            if ch in _CONSONANTS:
+                consonants += 1
+        back3, back2, back1 = back2, back1, ch
+
+    # consonants / letters > 0.75, in integer arithmetic
+    return len(value) >= 8 and letters > 0 and consonants * 4 > letters * 3
+
+
+class NgramScorer:
+    """Optional gibberish heuristic backed by a precomputed n-gram table.
+
+    The table is a JSON object mapping lowercase n-grams to log-probabilities
+    (for example bigram frequencies from a name/address corpus). A value is
+    flagged when the average log-probability of its letter n-grams falls
+    below ``threshold``. Enable it from the rules file::
+
+        "gibberish": [{"type": "ngram", "table": "bigrams.json", "threshold": -4.0}]
+    """
+
+    def __init__(self, table, threshold, n=2, min_length=8, unseen=-10.0):
+        self.table = table
+        self.threshold = threshold
+        self.n = n
+        self.min_length = min_length
+        self.unseen = unseen
+
+    @classmethod
+    def from_file(cls, path, **options):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f), **options)
+
+    def __call__(self, value):
+        letters = ''.join(ch for ch in value.lower() if ch in _ASCII_LETTERS)
+        count = len(letters) - self.n + 1
+        if len(letters) < self.min_length or count <= 0:
+            return False
+        get = self.table.get
+        total = sum(get(letters[i:i + self.n], self.unseen) for i in range(count))
+        return total / count < self.threshold
+
+
+# ==================== CUSTOM CHECKS ====================
+# Checks too specific to express as data. Each returns an error message or None.
+
+_LETTER_RE = re.compile(r'[a-zA-Z]')
+
+
+def check_email_structure(value, context):
+    local, domain = value.split('@')
+    if '..' in local or '..' in domain:
+        return "Enter a valid email address"
+    if local.startswith('.') or local.endswith('.'):
+        return "Enter a valid email address"
+    if not _LETTER_RE.search(local):
+        return "Enter a valid email address"
+
+    # Repeated TLD check - reject if TLD repeats like .comcom
+    tld = domain.split('.')[-1]
+    if domain.endswith(tld + tld) and tld + tld in domain:
+        return "Invalid domain extension"
+    return None
+
+
+def check_confirm_password(value, context):
+    password_value = context.get('passwordValue')
+    if not password_value:
+        return "Password value is required for confirmation"
+    if value != password_value:
+        return "Passwords do not match"
+    return None
+
+
+def check_dob(value, context):
+    try:
+        date_obj = datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return "Enter a valid date (YYYY-MM-DD)"
+    if date_obj > datetime.now().date():
+        return "Date cannot be in the future"
+    if date_obj.year < 1900 or date_obj.year > datetime.now().year:
+        return f"Year must be between 1900 and {datetime.now().year}"
+    if calculate_age(date_obj) < 13:
+        return "Must be at least 13 years old"
+    return None
+
+
+CUSTOM_CHECKS = {
+    'email_structure': check_email_structure,
+    'confirm_password': check_confirm_password,
+    'dob': check_dob,
+}
+
+
+# ==================== RULE COMPILER ====================
+
+def _compile_check(spec, field, blocklists, is_gibberish):
+    """Turn one check spec into ``fn(value, context) -> message | None``"""
+    kind = spec.get('check')
+    message = spec.get('message', '').format(field=field)
+
+    if kind == 'min_len':
+        limit = spec['value']
+        return lambda value, context: message if len(value) < limit else None
+    if kind == 'max_len':
+        limit = spec['value']
+        return lambda value, context: message if len(value) > limit else None
+    if kind == 'len':
+        size = spec['value']
+        return lambda value, context: message if len(value) != size else None
+    if kind == 'required':
+        return lambda value, context: None if value else message
+    if kind == 'match':
+        match = re.compile(spec['pattern']).match
+        return lambda value, context: None if match(value) else message
+    if kind == 'search':
+        search = re.compile(spec['pattern']).search
+        return lambda value, context: None if search(value) else message
+    if kind == 'not_in':
+        if spec['blocklist'] not in blocklists:
+            raise RuleConfigError(f"Unknown blocklist: {spec['blocklist']}")
+        blocked = blocklists[spec['blocklist']]
+        if spec.get('lowercase'):
+            blocked = frozenset(item.lower() for item in blocked)
+            return lambda value, context: message if value.lower() in blocked else None
+        return lambda value, context: message if value in blocked else None
+    if kind == 'not_one_char':
+        return lambda value, context: message if len(set(value)) == 1 else None
+    if kind == 'no_gibberish':
+        return lambda value, context: message if is_gibberish(value) else None
+    if kind == 'custom':
+        if spec.get('name') not in CUSTOM_CHECKS:
+            raise RuleConfigError(f"Unknown custom check: {spec.get('name')}")
+        return CUSTOM_CHECKS[spec['name']]
+    raise RuleConfigError(f"Unknown check type: {kind}")
+
+
+class RuleEngine:
+    """Compiled field -> checks table"""
+
+    def __init__(self, config, base_dir='.'):
+        blocklists = {name: frozenset(values) for name, values in config.get('blocklists', {}).items()}
+        rules = config.get('rules', {})
+
+        # Extra gibberish heuristics run after the built-in pattern check
+        self.gibberish_checks = []
+        for spec in config.get('gibberish', []):
+            if spec.get('type') != 'ngram':
+                raise RuleConfigError(f"Unknown gibberish check: {spec.get('type')}")
+            options = {key: value for key, value in spec.items() if key not in ('type', 'table')}
+            self.gibberish_checks.append(NgramScorer.from_file(os.path.join(base_dir, spec['table']), **options))
+
+        self.fields = {}
+        for field, spec in config.get('fields', {}).items():
+            if spec['rules'] not in rules:
+                raise RuleConfigError(f"Field {field} uses unknown rules: {spec['rules']}")
+            checks = tuple(_compile_check(check, field, blocklists, self.is_gibberish)
+                           for check in rules[spec['rules']])
+            self.fields[field] = (checks, spec.get('success', 'Field accepted'))
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f), base_dir=os.path.dirname(os.path.abspath(path)))
+
+    def is_gibberish(self, value):
+        if has_repeated_pattern(value):
+            return True
+        return any(check(value) for check in self.gibberish_checks)
+
+    def validate(self, field, value, context=None):
+        # Form values are strings; the checks call len(), .lower() and re on them
+        if not isinstance(value, str):
+            return False, "Value must be a string"
+        compiled = self.fields.get(field)
+        if compiled is None:
+            # Default fallback for unknown fields
+            return True, "Field accepted"
+
+        checks, success = compiled
+        context = context or {}
+        for check in checks:
+            message = check(value, context)
+            if message is not None:
+                return False, message
+        return True, success
+
+
+ENGINE = RuleEngine.from_file(os.environ.get('VALIDATION_RULES_PATH', DEFAULT_RULES_PATH))
+
+
+def validate_field(field, value, context=None):
+    """Validate one field. ``context`` carries related values such as the
+    password for ``confirmPassword``."""
+    return ENGINE.validate(field, value, context)